@@ -1,45 +1,27 @@
+import argparse
 import csv
-from datetime import datetime
-import calendar
+from pathlib import Path
 
-# ファイルパス
-order_item_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\ERP\受注伝票_item.csv'
-procurement_item_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\P2P\調達伝票_item.csv'
-transportation_cost_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\TMS\輸送コスト.csv'
-payroll_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\HR\給与テーブル.csv'
-price_condition_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\ERP\条件マスタ.csv'
-order_header_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\ERP\受注伝票_header.csv'
-
-# 受注ヘッダーを読み込み（顧客情報取得用）
-with open(order_header_file, 'r', encoding='utf-8-sig') as f:
-    reader = csv.DictReader(f)
-    order_headers = {row['order_id']: row for row in reader}
+import pandas as pd
 
-# 条件マスタを読み込み（販売価格取得用）
-with open(price_condition_file, 'r', encoding='utf-8-sig') as f:
-    reader = csv.DictReader(f)
-    price_conditions = list(reader)
+from generate_payroll_data import summarize_payroll
+from silver_layer import SilverLayer
 
-# 価格条件のインデックスを作成（product_id + customer_id + 日付範囲）
-def get_price(product_id, customer_id, pricing_date):
-    """指定された商品・顧客・日付に対する販売価格を取得"""
-    pricing_dt = datetime.strptime(pricing_date, '%Y-%m-%d')
-    
-    for condition in price_conditions:
-        if (condition['product_id'] == product_id and 
-            condition['customer_id'] == customer_id):
-            valid_from = datetime.strptime(condition['valid_from'], '%Y-%m-%d')
-            valid_to = datetime.strptime(condition['valid_to'], '%Y-%m-%d')
-            
-            if valid_from <= pricing_dt <= valid_to:
-                return float(condition['selling_price_ex_tax'])
-    
-    return None
+# 既定のBronze層（共有ドライブ）
+DEFAULT_BRONZE_DIR = Path(r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze')
+
+parser = argparse.ArgumentParser(description='輸送コスト分析レポート（売上・原価・販管費と輸送コストの比率）')
+parser.add_argument('--bronze-dir', type=Path, default=DEFAULT_BRONZE_DIR)
+args = parser.parse_args()
+
+# ファイルパス
+procurement_item_file = args.bronze_dir / 'P2P' / '調達伝票_item.csv'
+transportation_cost_file = args.bronze_dir / 'TMS' / '輸送コスト.csv'
+payroll_file = args.bronze_dir / 'HR' / '給与テーブル.csv'
 
 # 受注データを読み込み（売上）
-with open(order_item_file, 'r', encoding='utf-8-sig') as f:
-    reader = csv.DictReader(f)
-    order_items = list(reader)
+# Silver層の受注明細（受注ヘッダー・条件マスタと結合済みで販売価格付き）
+order_lines = SilverLayer(args.bronze_dir).load('受注明細', columns=['quantity', 'selling_price_ex_tax'])
 
 # 調達データを読み込み（原価）
 with open(procurement_item_file, 'r', encoding='utf-8-sig') as f:
@@ -52,9 +34,7 @@ with open(transportation_cost_file, 'r', encoding='utf-8-sig') as f:
     transportation_costs = list(reader)
 
 # 給与データを読み込み（人件費＝販管費の一部）
-with open(payroll_file, 'r', encoding='utf-8-sig') as f:
-    reader = csv.DictReader(f)
-    payroll_data = list(reader)
+payroll_data = pd.read_csv(payroll_file, encoding='utf-8-sig', dtype={'department': str, 'cost_center': str})
 
 print('=' * 80)
 print('輸送コスト分析レポート')
@@ -62,26 +42,11 @@ print('=' * 80)
 print()
 
 # 1. 売上の計算
-total_revenue = 0
 tax_rate = 0.10  # 消費税率10%
 
-for item in order_items:
-    product_id = item['product_id']
-    quantity = int(item['quantity'])
-    pricing_date = item['pricing_date']
-    order_id = item['order_id']
-    
-    # 顧客IDを取得
-    if order_id in order_headers:
-        customer_id = order_headers[order_id]['customer_id']
-        
-        # 販売価格を取得
-        price_ex_tax = get_price(product_id, customer_id, pricing_date)
-        
-        if price_ex_tax:
-            price_incl_tax = price_ex_tax * (1 + tax_rate)
-            revenue = quantity * price_incl_tax
-            total_revenue += revenue
+# 価格が見つからない明細は売上に含めない
+price_incl_tax = order_lines['selling_price_ex_tax'] * (1 + tax_rate)
+total_revenue = (order_lines['quantity'] * price_incl_tax).sum()
 
 print(f'【売上高】')
 print(f'  総売上高（税込）: ¥{total_revenue:,.0f}')
@@ -108,23 +73,19 @@ print(f'  総調達費: ¥{total_procurement:,.0f}')
 print()
 
 # 3. 人件費の計算（販管費の主要項目）
-total_payroll = 0
-manufacturing_payroll = 0
-non_manufacturing_payroll = 0
-
-for record in payroll_data:
-    gross_salary = float(record['base_salary']) + float(record['overtime_pay']) + float(record['allowances'])
-    total_payroll += gross_salary
-    
-    if record['department'] == 'manufacturing':
-        manufacturing_payroll += gross_salary
-    else:
-        non_manufacturing_payroll += gross_salary
+# 総支給額（基本給 + 残業代 + 諸手当）を部門 × コストセンター単位で一括集計
+payroll_summary = summarize_payroll(payroll_data, ['department', 'cost_center'])['gross_salary']
+department_payroll = payroll_summary.groupby(level='department').sum()
+total_payroll = department_payroll.sum()
+manufacturing_payroll = department_payroll.get('manufacturing', 0.0)
+non_manufacturing_payroll = total_payroll - manufacturing_payroll
 
 print(f'【人件費】')
 print(f'  製造部門人件費: ¥{manufacturing_payroll:,.0f}')
 print(f'  非製造部門人件費: ¥{non_manufacturing_payroll:,.0f}')
 print(f'  総人件費: ¥{total_payroll:,.0f}')
+for cost_center, amount in payroll_summary.groupby(level='cost_center').sum().items():
+    print(f'  - {cost_center}: ¥{amount:,.0f}')
 print()
 
 # 4. 輸送コストの計算
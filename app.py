@@ -0,0 +1,192 @@
+"""
+データ可視化ダッシュボード（Streamlit）
+Bronze層・Gold層のテーブルを dashboard_data のParquetスナップショットから表示する
+
+- 起動時に読むのはテーブル一覧・Parquetのメタデータ・先頭行だけで、テーブル全体は絞り込み・集計を行うときに初めて読む
+- 絞り込み・集計は DashboardData.query（絞り込み条件などをキーにキャッシュ）で行い、ウィジェットの処理ではDataFrameを加工しない
+- 表・棒グラフに渡す行数は dashboard_data.MAX_ROWS で打ち切る
+- 折れ線グラフは全行（または全集計結果）をグラフの横幅ごとの最小値・最大値に間引いて描き、点数が多いときはWebGL（Scattergl）で描画する
+- 起動: streamlit run app.py [-- --bronze-dir <Bronzeのパス> --gold-dir <Goldのパス>]
+"""
+
+import argparse
+import datetime
+from pathlib import Path
+
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+
+from bronze_loader import BRONZE_DIR
+from dashboard_data import AGGREGATIONS, CHART_WIDTH, MAX_ROWS, DashboardData
+from gold_kpi import GOLD_DIR
+
+INDEX_AXIS = 'インデックス'
+NO_FILTER = '（なし）'
+
+# 1系列あたりの点数がこれを超えたらWebGLで描画する / マーカーを描かない
+SCATTERGL_POINTS = 1_000
+MARKER_POINTS = 200
+
+LEGEND = dict(
+    orientation='v', yanchor='top', y=1, xanchor='left', x=1.02, font=dict(size=9),
+    bgcolor='rgba(255,255,255,0.8)', bordercolor='rgba(0,0,0,0.2)', borderwidth=1,
+)
+
+
+@st.cache_resource
+def get_data(bronze_dir, gold_dir):
+    """セッションをまたいで共有するデータ層（テーブル・クエリ結果のキャッシュを含む）"""
+    return DashboardData(bronze_dir, gold_dir)
+
+
+def display_name(column):
+    """長い列名はレジェンドでは短縮して表示する"""
+    return column[:12] + '...' if len(column) > 15 else column
+
+
+# ========== 設定 ==========
+parser = argparse.ArgumentParser(description='データ可視化ダッシュボード')
+parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+parser.add_argument('--gold-dir', type=Path, default=GOLD_DIR)
+args, _ = parser.parse_known_args()
+
+st.set_page_config(page_title='データ可視化ダッシュボード', layout='wide')
+st.title('データ可視化ダッシュボード')
+
+data = get_data(args.bronze_dir, args.gold_dir)
+datasets = data.datasets()
+if not datasets:
+    st.warning(f'{args.gold_dir} / {args.bronze_dir} にCSVファイルが見つかりません。')
+    st.stop()
+
+# ========== テーブル選択 ==========
+name = st.sidebar.selectbox('表示するテーブル', datasets)
+numeric_cols = data.numeric_columns(name)
+category_cols = data.category_columns(name)
+temporal_cols = data.temporal_columns(name)
+num_rows = data.num_rows(name)
+
+st.subheader(f'テーブル: {name}')
+st.write(f'行数: {num_rows:,}, 列数: {len(data.schema(name))}')
+
+st.subheader('データプレビュー')
+st.dataframe(data.preview(name))
+
+# ========== 絞り込み ==========
+st.sidebar.subheader('絞り込み')
+filters = []
+filter_col = st.sidebar.selectbox('カテゴリ列', [NO_FILTER] + category_cols)
+if filter_col != NO_FILTER:
+    values = st.sidebar.multiselect('値', data.distinct_values(name, filter_col))
+    if values:
+        filters.append((filter_col, 'in', tuple(values)))
+
+date_col = st.sidebar.selectbox('日時列', [NO_FILTER] + temporal_cols)
+if date_col != NO_FILTER:
+    first, last = data.value_range(name, date_col)
+    if first is not None:
+        period = st.sidebar.date_input('期間', (first.date(), last.date()), min_value=first.date(), max_value=last.date())
+        if len(period) == 2:
+            filters.append((date_col, 'between', (
+                datetime.datetime.combine(period[0], datetime.time.min),
+                datetime.datetime.combine(period[1], datetime.time(23, 59, 59)),
+            )))
+filters = tuple(filters)
+
+# ========== 集計 ==========
+if not numeric_cols:
+    st.warning('数値列が見つかりませんでした。')
+    st.stop()
+
+st.sidebar.subheader('集計')
+x_col = st.sidebar.selectbox('横軸', [INDEX_AXIS] + category_cols + temporal_cols)
+y_cols = st.sidebar.multiselect('数値列', numeric_cols, default=numeric_cols[:3])
+aggregation = st.sidebar.selectbox('集計方法', list(AGGREGATIONS), disabled=x_col == INDEX_AXIS)
+chart_width = st.sidebar.slider('グラフの横幅（ピクセル）', 400, 4_000, CHART_WIDTH, step=100, help='折れ線グラフはこの幅の区間ごとに最小値・最大値の点だけを描画します')
+if not y_cols:
+    st.info('数値列を選択してください。')
+    st.stop()
+
+if x_col == INDEX_AXIS:
+    result, total = data.query(name, filters, columns=tuple(y_cols))
+    x_data, x_title = result.index, INDEX_AXIS
+    series = {col: result[col] for col in y_cols}
+else:
+    metrics = tuple((col, AGGREGATIONS[aggregation]) for col in y_cols)
+    result, total = data.query(name, filters, group_by=(x_col,), metrics=metrics)
+    x_data, x_title = result[x_col], x_col
+    series = {col: result[f'{col}_{AGGREGATIONS[aggregation]}'] for col in y_cols}
+if total > len(result):
+    st.caption(f'棒グラフ・集計テーブル: {total:,}行のうち先頭の{len(result):,}行を表示しています（上限 {MAX_ROWS:,}行）')
+
+st.subheader('数値データの可視化')
+lines, points = data.series(
+    name, tuple(y_cols), None if x_col == INDEX_AXIS else x_col, AGGREGATIONS[aggregation], filters, chart_width
+)
+shown = max((len(values) for _, values in lines.values()), default=0)
+if points > shown:
+    st.caption(f'折れ線グラフ: {points:,}点を区間ごとの最小値・最大値の{shown:,}点に間引いて表示しています')
+if points:
+    min_val = min(np.nanmin(values) for _, values in lines.values())
+    max_val = max(np.nanmax(values) for _, values in lines.values())
+else:
+    min_val, max_val = 0.0, 0.0
+
+col1, col2 = st.columns(2)
+with col1:
+    use_auto_range = st.checkbox('自動範囲調整', value=True, help='データの範囲に基づいて自動で縦軸を調整')
+if use_auto_range:
+    y_min, y_max = min_val * 0.95, max_val * 1.05
+else:
+    with col2:
+        st.write('縦軸の範囲を手動で設定:')
+        y_min = st.number_input('最小値', value=float(min_val), format='%.2f')
+        y_max = st.number_input('最大値', value=float(max_val), format='%.2f')
+
+fig = go.Figure()
+for col, (x_values, values) in lines.items():
+    trace = go.Scattergl if len(values) > SCATTERGL_POINTS else go.Scatter
+    fig.add_trace(trace(
+        x=x_values, y=values, mode='lines+markers' if len(values) <= MARKER_POINTS else 'lines',
+        name=display_name(col), line=dict(width=2),
+        hovertemplate=f'<b>{col}</b><br>{x_title}: %{{x}}<br>値: %{{y}}<extra></extra>',
+    ))
+fig.update_layout(
+    title='数値データの折れ線グラフ', xaxis_title=x_title, yaxis_title='値', yaxis=dict(range=[y_min, y_max]),
+    hovermode='x unified', height=600, legend=LEGEND, margin=dict(l=50, r=200, t=80, b=50), title_x=0.5, title_font_size=16,
+)
+st.plotly_chart(fig, use_container_width=True)
+
+bar_chart_type = st.radio('棒グラフの表示方法:', ['グループ化', '積み上げ'], horizontal=True)
+bar_fig = go.Figure()
+for col, values in series.items():
+    bar_fig.add_trace(go.Bar(
+        x=x_data, y=values, name=display_name(col),
+        hovertemplate=f'<b>{col}</b><br>{x_title}: %{{x}}<br>値: %{{y}}<extra></extra>',
+    ))
+bar_fig.update_layout(
+    title='数値データの棒グラフ', xaxis_title=x_title, yaxis_title='値',
+    barmode='group' if bar_chart_type == 'グループ化' else 'stack',
+    hovermode='x unified', height=500, legend=LEGEND, margin=dict(l=50, r=200, t=80, b=50), title_x=0.5, title_font_size=16,
+)
+st.plotly_chart(bar_fig, use_container_width=True)
+
+st.subheader('集計テーブル')
+st.dataframe(result)
+st.download_button(
+    'CSVをダウンロード', result.to_csv(index=False).encode('utf-8-sig'),
+    file_name=f'{name.rsplit("/", 1)[-1]}.csv', mime='text/csv',
+)
+
+# ========== 統計情報 ==========
+# 統計量・値の分布はテーブル全体を読むため、選択したときだけ計算する
+if st.checkbox('統計情報・カテゴリの分布を表示', value=False):
+    st.subheader('統計情報')
+    st.dataframe(data.describe(name, tuple(y_cols), filters))
+
+    if category_cols:
+        st.subheader('カテゴリデータの可視化')
+        for col in st.multiselect('分布を表示するカテゴリ列', category_cols, default=category_cols[:1]):
+            st.write(f'**{col}** の値の分布:')
+            st.bar_chart(data.value_counts(name, col, filters))
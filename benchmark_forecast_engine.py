@@ -0,0 +1,79 @@
+"""
+需要予測エンジンのスケーリングベンチマーク
+品目 × 拠点 の週次系列の数を 1k ～ 50k まで増やし、forecast_engine.forecast の処理時間を
+従来実装（系列ごと・パラメータ候補ごとのループ）と比較する
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from forecast_engine import ALPHAS, BETAS, DEFAULT_HORIZON, INIT_WEEKS, forecast
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+DEFAULT_WEEKS = 208
+
+
+def make_history(num_series, num_weeks, seed=0):
+    """水準・トレンド・年次季節性の異なる週次系列（ポアソン分布の受注数量）"""
+    rng = np.random.default_rng(seed)
+    weeks = np.arange(num_weeks)
+    level = rng.gamma(2.0, 20.0, size=(num_series, 1))
+    trend = rng.normal(0, 0.002, size=(num_series, 1)) * level
+    season = 1 + rng.uniform(0, 0.3, size=(num_series, 1)) * np.sin(2 * np.pi * (weeks + rng.integers(0, 52, size=(num_series, 1))) / 52)
+    return rng.poisson(np.maximum(level + trend * weeks, 0) * season).astype(np.float64)
+
+
+def forecast_legacy(history, horizon):
+    """系列ごとに全パラメータ候補を順に当てはめる従来のループ（比較用、h期先の平均を返す）"""
+    means = np.empty((len(history), horizon))
+    for i, series in enumerate(history):
+        init_weeks = min(INIT_WEEKS, len(series))
+        best = None
+        for alpha in ALPHAS:
+            for beta in BETAS:
+                level, trend, sse = series[:init_weeks].mean(), 0.0, 0.0
+                for value in series[init_weeks:]:
+                    error = value - (level + trend)
+                    sse += error * error
+                    level += trend + alpha * error
+                    trend += alpha * beta * error
+                if best is None or sse < best[0]:
+                    best = (sse, level, trend)
+        means[i] = best[1] + best[2] * np.arange(1, horizon + 1)
+    return means
+
+
+def run(sizes, num_weeks, horizon, workers, legacy_max, repeat):
+    print(f"{'系列数':>10} {'週数':>5} {'処理時間(秒)':>14} {'従来実装(秒)':>14} {'高速化':>10}")
+    for num_series in sizes:
+        history = make_history(num_series, num_weeks)
+
+        elapsed = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            mean, _ = forecast(history, horizon, workers)
+            elapsed = min(elapsed, time.perf_counter() - start)
+
+        legacy, speedup = '-', '-'
+        if num_series <= legacy_max:
+            start = time.perf_counter()
+            legacy_mean = forecast_legacy(history, horizon)
+            legacy_elapsed = time.perf_counter() - start
+            assert np.allclose(mean, legacy_mean)
+            legacy, speedup = f'{legacy_elapsed:.3f}', f'{legacy_elapsed / elapsed:.1f}x'
+
+        print(f'{num_series:>10,} {num_weeks:>5} {elapsed:>14.3f} {legacy:>14} {speedup:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='需要予測エンジンのスケーリングベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='計測する系列数')
+    parser.add_argument('--weeks', type=int, default=DEFAULT_WEEKS, help='実績の週数')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='予測する週数')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（既定: CPUコア数）')
+    parser.add_argument('--repeat', type=int, default=3, help='ベクトル化実装の計測回数（最短時間を採用）')
+    parser.add_argument('--legacy-max', type=int, default=1_000, help='従来実装を計測する上限の系列数')
+    args = parser.parse_args()
+    run(args.sizes, args.weeks, args.horizon, args.workers, args.legacy_max, args.repeat)
@@ -0,0 +1,105 @@
+"""
+月次在庫シミュレーターのスケーリングベンチマーク
+品目数 × 拠点数 × 月数 を 10k SKU × 500拠点 × 120か月（500万ペア）まで増やし、inventory_simulator.simulate の処理時間を
+従来実装（(品目, 拠点) ごとの辞書による行単位のループ）と比較する
+
+- 需要行列はペアのブロックごとに合成し、ブロック単位で simulate を呼ぶ（全体の行列を保持しないのでメモリは一定）
+- 処理時間は simulate の合計で、需要の合成時間は含めない
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from inventory_simulator import ReplenishmentPolicy, simulate
+
+DEFAULT_SIZES = [(100, 5), (1_000, 50), (10_000, 100), (10_000, 500)]
+DEFAULT_MONTHS = 120
+
+# 一度に合成・計算するペア数
+CHUNK_PAIRS = 250_000
+
+
+def make_demand(num_pairs, num_months, rng):
+    """ペアごとに平均需要の異なるポアソン需要（約3割の月は需要なし）"""
+    mean_demand = rng.gamma(2.0, 10.0, size=(num_pairs, 1))
+    demand = rng.poisson(mean_demand, size=(num_pairs, num_months)).astype(np.int32)
+    demand[rng.random((num_pairs, num_months)) < 0.3] = 0
+    return demand
+
+
+def make_policy(num_pairs, rng):
+    """ペアの半分は30日分カバー、残りは min/max"""
+    use_min_max = rng.random(num_pairs) < 0.5
+    min_level = rng.integers(10, 40, size=num_pairs)
+    return ReplenishmentPolicy(
+        min_level=np.where(use_min_max, min_level, 0),
+        max_level=np.where(use_min_max, min_level * 3, 0),
+        reorder_days=np.where(use_min_max, 0, 30),
+        cover_days=np.where(use_min_max, 0, 30),
+    )
+
+
+def simulate_legacy(demand, policy):
+    """従来の (品目, 拠点) ごとの辞書ループ（比較用、月末在庫の行列を返す）"""
+    num_pairs, num_months = demand.shape
+    current_inventory = {}
+    levels = np.empty_like(demand)
+    for m in range(num_months):
+        for pair in range(num_pairs):
+            month_demand = int(demand[pair, m])
+            min_level = float(policy.min_level[pair]) + month_demand * float(policy.reorder_days[pair]) / 30
+            max_level = float(policy.max_level[pair]) + month_demand * float(policy.cover_days[pair]) / 30
+            if pair not in current_inventory:
+                current_inventory[pair] = int(np.ceil(max_level))
+            after_orders = max(current_inventory[pair] - month_demand, 0)
+            if after_orders < np.ceil(min_level):
+                after_orders = max(int(np.ceil(max_level)), after_orders)
+            current_inventory[pair] = after_orders
+            levels[pair, m] = after_orders
+    return levels
+
+
+def run(sizes, num_months, seed, legacy_max):
+    print(f"{'品目数':>8} {'拠点数':>6} {'ペア数':>12} {'月数':>5} {'処理時間(秒)':>14} {'従来実装(秒)':>14} {'高速化':>10}")
+    for num_products, num_locations in sizes:
+        num_pairs = num_products * num_locations
+        rng = np.random.default_rng(seed)
+
+        elapsed = 0.0
+        legacy, speedup = '-', '-'
+        for start in range(0, num_pairs, CHUNK_PAIRS):
+            chunk_pairs = min(CHUNK_PAIRS, num_pairs - start)
+            demand = make_demand(chunk_pairs, num_months, rng)
+            policy = make_policy(chunk_pairs, rng)
+
+            chunk_start = time.perf_counter()
+            levels = simulate(demand, policy)['inventory']
+            elapsed += time.perf_counter() - chunk_start
+
+            # 従来実装は先頭のチャンクだけで比較する
+            if start == 0 and num_pairs <= legacy_max:
+                legacy_start = time.perf_counter()
+                legacy_levels = simulate_legacy(demand, policy)
+                legacy_elapsed = time.perf_counter() - legacy_start
+                assert np.array_equal(levels, legacy_levels)
+                legacy = f'{legacy_elapsed * num_pairs / chunk_pairs:.3f}'
+
+        if legacy != '-':
+            speedup = f'{float(legacy) / elapsed:.1f}x'
+        print(f'{num_products:>8,} {num_locations:>6,} {num_pairs:>12,} {num_months:>5} {elapsed:>14.3f} {legacy:>14} {speedup:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='月次在庫シミュレーターのスケーリングベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help='計測する 品目数 拠点数 の組（例: --sizes 1000 50 10000 500）')
+    parser.add_argument('--months', type=int, default=DEFAULT_MONTHS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legacy-max', type=int, default=50_000, help='従来実装を計測する上限のペア数')
+    args = parser.parse_args()
+    if args.sizes is not None and len(args.sizes) % 2:
+        parser.error('--sizes は 品目数 拠点数 の組で指定してください')
+    sizes = list(zip(args.sizes[::2], args.sizes[1::2])) if args.sizes else DEFAULT_SIZES
+    run(sizes, args.months, args.seed, args.legacy_max)
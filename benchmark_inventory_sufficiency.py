@@ -0,0 +1,120 @@
+"""
+在庫充足性検証のスケーリングベンチマーク
+受注伝票_itemの明細数を 10k ～ 10M 行まで増やし、validate_inventory_sufficiency の処理時間を
+従来実装（strptime と dict による行単位のループ）と比較する
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from validate_inventory_sufficiency import validate_inventory_sufficiency
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+PRODUCT_IDS = ['FIT-GR3', 'FRD-GB5', 'NOE-JG4', 'SWN-RP6', 'VZL-RV3', 'ZRV-RZ3', 'HDE-ZC1', 'CRV-RT5']
+LOCATION_IDS = ['STM', 'HTB', 'SZK', 'KMM', 'HMM']
+MONTHS = np.arange(np.datetime64('2022-01'), np.datetime64('2026-01'))
+
+
+def make_dataset(num_lines, seed=0):
+    """明細数 num_lines 件の受注伝票 header/item と月次在庫履歴を合成する（1受注あたり平均2明細）"""
+    rng = np.random.default_rng(seed)
+    num_orders = max(num_lines // 2, 1)
+
+    order_ids = pd.Series(np.arange(num_orders)).map('ORD-{:09d}'.format)
+    seconds = rng.integers(0, int((MONTHS[-1] + 1 - MONTHS[0]).astype('timedelta64[s]').astype(np.int64)), size=num_orders)
+    order_headers = pd.DataFrame({
+        'order_id': order_ids,
+        'order_timestamp': MONTHS[0].astype('datetime64[s]') + seconds.astype('timedelta64[s]'),
+        'location_id': rng.choice(LOCATION_IDS, size=num_orders),
+    })
+    order_items = pd.DataFrame({
+        'order_id': order_ids.to_numpy()[rng.integers(0, num_orders, size=num_lines)],
+        'product_id': rng.choice(PRODUCT_IDS, size=num_lines),
+        'quantity': rng.integers(1, 11, size=num_lines),
+    })
+
+    # 月次在庫履歴: 品目 × 拠点 × 年月の全組み合わせ（平均需要の0.5～2.5倍）
+    keys = pd.MultiIndex.from_product(
+        [PRODUCT_IDS, LOCATION_IDS, np.datetime_as_string(MONTHS)], names=['product_id', 'location_id', 'year_month']
+    ).to_frame(index=False)
+    mean_demand = num_lines * 5.5 / len(keys)
+    keys['inventory_quantity'] = (mean_demand * rng.uniform(0.5, 2.5, size=len(keys))).astype(np.int64)
+    return order_headers, order_items, keys
+
+
+def validate_inventory_sufficiency_legacy(order_headers, order_items, inventory):
+    """従来の行単位のループ（比較用）"""
+    headers = {
+        order_id: {'order_timestamp': timestamp, 'location_id': location_id}
+        for order_id, timestamp, location_id in zip(
+            order_headers['order_id'],
+            pd.Series(order_headers['order_timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S'),
+            order_headers['location_id'],
+        )
+    }
+
+    monthly_demand = defaultdict(int)
+    for order_id, product_id, quantity in zip(order_items['order_id'], order_items['product_id'], order_items['quantity']):
+        order_header = headers.get(order_id)
+        if not order_header:
+            continue
+        order_date = datetime.strptime(order_header['order_timestamp'], '%Y-%m-%d %H:%M:%S')
+        year_month = order_date.strftime('%Y-%m')
+        monthly_demand[(product_id, order_header['location_id'], year_month)] += int(quantity)
+
+    records = inventory.to_dict('records')
+    inventory_index = {
+        (record['product_id'], record['location_id'], record['year_month']): int(record['inventory_quantity'])
+        for record in records
+    }
+
+    insufficient = []
+    for key, demand in monthly_demand.items():
+        inventory_quantity = inventory_index.get(key)
+        if inventory_quantity is not None and inventory_quantity < demand:
+            insufficient.append((key, demand, inventory_quantity, demand - inventory_quantity))
+
+    turnover = []
+    for record in records:
+        demand = monthly_demand.get((record['product_id'], record['location_id'], record['year_month']), 0)
+        if demand > 0:
+            turnover.append(int(record['inventory_quantity']) / demand * 30)
+    return insufficient, turnover
+
+
+def run(sizes, seed, legacy_max, repeat):
+    print(f"{'明細数':>12} {'処理時間(秒)':>14} {'従来実装(秒)':>14} {'高速化':>10}")
+    for num_lines in sizes:
+        order_headers, order_items, inventory = make_dataset(num_lines, seed)
+
+        elapsed = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = validate_inventory_sufficiency(order_headers, order_items, inventory)
+            elapsed = min(elapsed, time.perf_counter() - start)
+
+        legacy, speedup = '-', '-'
+        if num_lines <= legacy_max:
+            start = time.perf_counter()
+            insufficient, turnover = validate_inventory_sufficiency_legacy(order_headers, order_items, inventory)
+            legacy_elapsed = time.perf_counter() - start
+            assert len(insufficient) == len(results['insufficient']) and len(turnover) == len(results['turnover'])
+            legacy, speedup = f'{legacy_elapsed:.3f}', f'{legacy_elapsed / elapsed:.1f}x'
+
+        print(f'{num_lines:>12,} {elapsed:>14.3f} {legacy:>14} {speedup:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在庫充足性検証のスケーリングベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='計測する明細数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='ベクトル化実装の計測回数（最短時間を採用）')
+    parser.add_argument('--legacy-max', type=int, default=max(DEFAULT_SIZES), help='従来実装を計測する上限の明細数')
+    args = parser.parse_args()
+    run(args.sizes, args.seed, args.legacy_max, args.repeat)
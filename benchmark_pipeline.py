@@ -0,0 +1,277 @@
+"""
+パイプライン全体のスケーリングベンチマーク
+generate_bronze_data で生成したスケールファクター 1 / 10 / 100 / 1000 のBronze層に対して主要な処理段階を計測し、
+処理時間・ピークメモリ（RSS）・行/秒を履歴CSVに追記する。直近の履歴と比べて閾値を超えて遅く（大きく）なった
+段階があれば終了コード1で終了する
+
+- 計測する段階は STAGES（Bronze層の読み込み、販売価格の解決、輸送コスト分析の損益集計、輸送コストの生成、
+  受注・出荷の整合性検証、在庫充足性検証、ダッシュボードのデータ読み込み）
+- 各段階は別プロセスで1回ずつ実行し、ピークRSSは段階ごとのプロセスの最大常駐メモリ（入力の読み込みを含む）とする
+  （resource モジュールがない環境では記録しない）
+- 処理時間は入力の読み込みを除いた処理部分の時間。ただし bronze_load はCSV → Parquet変換を含む読み込み全体、
+  pnl_rollup は analyze_transportation_cost.py の実行全体（CSVの読み込みを含む）を計測する
+- 生成済みのBronze層（data/Generated/SF<N>/Bronze）は再利用し、Parquetキャッシュは計測前に作っておく
+- 基準値は同じスケールファクター・段階の直近 --baseline-runs 回の中央値
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BronzeCache, get_cache, list_tables, load_table
+from generate_bronze_data import default_output_dir, generate_bronze
+from pipeline_trace import peak_rss_mb
+
+DEFAULT_SCALE_FACTORS = [1, 10, 100, 1000]
+
+HISTORY_PATH = Path(__file__).resolve().parent / 'output' / 'benchmark_pipeline_history.csv'
+HISTORY_COLUMNS = ['run_at', 'commit', 'scale_factor', 'stage', 'rows', 'wall_seconds', 'peak_rss_mb', 'rows_per_second']
+
+# 既定の閾値（基準値に対する増加率）と、誤差とみなす処理時間の差（秒）
+DEFAULT_TIME_THRESHOLD = 0.25
+DEFAULT_RSS_THRESHOLD = 0.25
+MIN_TIME_DELTA = 0.1
+DEFAULT_BASELINE_RUNS = 5
+
+ANALYZE_SCRIPT = Path(__file__).resolve().parent / 'analyze_transportation_cost.py'
+
+
+# ---------- 段階 ----------
+# 各段階は (bronze_dir, work_dir) を受け取り、入力を読み込んだうえで (処理行数, 計測する処理) を返す
+def table_rows(bronze_dir, *tables):
+    manifest = get_cache(bronze_dir).manifest
+    return sum(manifest[table]['rows'] for table in tables)
+
+
+def stage_bronze_load(bronze_dir, work_dir):
+    """全テーブルのCSV → Parquet変換と読み込み（空のキャッシュから）"""
+    cache = BronzeCache(bronze_dir, Path(work_dir) / 'cache')
+    tables = list_tables(bronze_dir)
+    return table_rows(bronze_dir, *(f'{system}/{table}' for system, table in tables)), lambda: [
+        cache.load(system, table) for system, table in tables
+    ]
+
+
+def stage_price_resolution(bronze_dir, work_dir):
+    from price_resolver import PriceResolver
+
+    resolver = PriceResolver(load_table('ERP', '条件マスタ', bronze_dir=bronze_dir))
+    headers = load_table('ERP', '受注伝票_header', ['order_id', 'customer_id'], bronze_dir)
+    items = load_table('ERP', '受注伝票_item', ['order_id', 'product_id', 'pricing_date'], bronze_dir)
+    return len(items), lambda: resolver.price_order_items(items, headers)
+
+
+def stage_pnl_rollup(bronze_dir, work_dir):
+    """analyze_transportation_cost.py の実行（レポートの出力は捨てる）"""
+    def run():
+        argv = sys.argv
+        sys.argv = [str(ANALYZE_SCRIPT), '--bronze-dir', str(bronze_dir)]
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                runpy.run_path(str(ANALYZE_SCRIPT), run_name='__main__')
+        finally:
+            sys.argv = argv
+
+    rows = table_rows(bronze_dir, 'ERP/受注伝票_item', 'P2P/調達伝票_item', 'TMS/輸送コスト', 'HR/給与テーブル')
+    return rows, run
+
+
+def stage_transportation_cost(bronze_dir, work_dir):
+    from generate_transportation_cost import build_transportation_costs
+
+    headers = load_table('MES', '出荷伝票_header', bronze_dir=bronze_dir)
+    items = load_table('MES', '出荷伝票_item', bronze_dir=bronze_dir)
+    return len(items), lambda: build_transportation_costs(headers, items, np.random.default_rng(0))
+
+
+def stage_order_shipment_validation(bronze_dir, work_dir):
+    from validate_order_shipment import OrderShipmentValidator
+
+    validator = OrderShipmentValidator(bronze_dir)
+    rows = table_rows(bronze_dir, 'ERP/受注伝票_header', 'ERP/受注伝票_item', 'MES/出荷伝票_header', 'MES/出荷伝票_item')
+    return rows, validator.validate
+
+
+def stage_inventory_sufficiency(bronze_dir, work_dir):
+    from validate_inventory_sufficiency import validate_inventory_sufficiency
+
+    headers = load_table('ERP', '受注伝票_header', ['order_id', 'order_timestamp', 'location_id'], bronze_dir)
+    items = load_table('ERP', '受注伝票_item', ['order_id', 'product_id', 'quantity'], bronze_dir)
+    inventory = load_table('WMS', '月次在庫履歴', ['product_id', 'location_id', 'year_month', 'inventory_quantity'], bronze_dir)
+    return len(items), lambda: validate_inventory_sufficiency(headers, items, inventory)
+
+
+def stage_dashboard_load(bronze_dir, work_dir):
+    """全テーブルについて、ダッシュボードの初期表示（件数・プレビュー・先頭の数値列のグラフと統計量）を取得"""
+    from dashboard_data import DashboardData
+
+    data = DashboardData(bronze_dir, Path(bronze_dir).parent / 'Gold')
+
+    def run():
+        for name in data.datasets():
+            data.num_rows(name)
+            data.preview(name)
+            numeric = data.numeric_columns(name)[:1]
+            if numeric:
+                data.series(name, numeric)
+                data.describe(name, tuple(numeric))
+
+    return sum(data.num_rows(name) for name in data.datasets()), run
+
+
+STAGES = {
+    'bronze_load': stage_bronze_load,
+    'price_resolution': stage_price_resolution,
+    'pnl_rollup': stage_pnl_rollup,
+    'transportation_cost': stage_transportation_cost,
+    'order_shipment_validation': stage_order_shipment_validation,
+    'inventory_sufficiency': stage_inventory_sufficiency,
+    'dashboard_load': stage_dashboard_load,
+}
+
+
+def run_stage(stage, bronze_dir):
+    """1段階を現在のプロセスで実行し、計測結果を返す"""
+    with tempfile.TemporaryDirectory(prefix=f'benchmark_{stage}_') as work_dir:
+        rows, run = STAGES[stage](bronze_dir, work_dir)
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+    peak_rss = peak_rss_mb()
+    return {'rows': int(rows), 'wall_seconds': elapsed, 'peak_rss_mb': np.nan if peak_rss is None else peak_rss}
+
+
+def measure(stage, bronze_dir):
+    """1段階を別プロセスで実行し、計測結果を返す"""
+    completed = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), '--run-stage', stage, '--bronze-dir', str(bronze_dir)],
+        capture_output=True, text=True, encoding='utf-8',
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'{stage} の実行に失敗しました:\n{completed.stderr}')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# ---------- データ ----------
+def prepare_bronze(scale_factor, seed, workers, regenerate=False):
+    """スケールファクターのBronze層（生成済みなら再利用）を用意し、Parquetキャッシュを作っておく"""
+    bronze_dir = default_output_dir(scale_factor)
+    # 現在在庫は generate_bronze が最後に書き出すテーブル
+    if regenerate or not (bronze_dir / 'WMS' / '現在在庫.csv').exists():
+        print(f'SF{scale_factor:g}: Bronze層を生成中... → {bronze_dir}')
+        start = time.perf_counter()
+        generate_bronze(bronze_dir, scale_factor, seed, workers=workers)
+        print(f'SF{scale_factor:g}: 生成完了 ({time.perf_counter() - start:.1f}秒)')
+    get_cache(bronze_dir).refresh()
+    return bronze_dir
+
+
+# ---------- 履歴 ----------
+def current_commit():
+    try:
+        completed = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=Path(__file__).resolve().parent
+        )
+    except OSError:
+        return ''
+    return completed.stdout.strip() if completed.returncode == 0 else ''
+
+
+def load_history(path=HISTORY_PATH):
+    if not Path(path).exists():
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    return pd.read_csv(path, encoding='utf-8-sig')
+
+
+def append_history(results, path=HISTORY_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results[HISTORY_COLUMNS].to_csv(
+        path, mode='a', header=not path.exists(), index=False, encoding='utf-8' if path.exists() else 'utf-8-sig'
+    )
+
+
+def find_regressions(results, history, time_threshold, rss_threshold, baseline_runs=DEFAULT_BASELINE_RUNS):
+    """基準値（同じスケールファクター・段階の直近 baseline_runs 回の中央値）を閾値を超えて上回った計測値"""
+    regressions = []
+    for row in results.itertuples():
+        past = history[(history['scale_factor'] == row.scale_factor) & (history['stage'] == row.stage)].tail(baseline_runs)
+        if past.empty:
+            continue
+        baseline_time = past['wall_seconds'].median()
+        if (row.wall_seconds > baseline_time * (1 + time_threshold)
+                and row.wall_seconds - baseline_time > MIN_TIME_DELTA):
+            regressions.append((row.scale_factor, row.stage, '処理時間', baseline_time, row.wall_seconds))
+        baseline_rss = past['peak_rss_mb'].median()
+        if row.peak_rss_mb > baseline_rss * (1 + rss_threshold):
+            regressions.append((row.scale_factor, row.stage, 'ピークRSS', baseline_rss, row.peak_rss_mb))
+    return regressions
+
+
+def run(scale_factors, stages, seed, workers, regenerate, history_path, time_threshold, rss_threshold, baseline_runs, record):
+    history = load_history(history_path)
+    run_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    commit = current_commit()
+    results = []
+
+    bronze_dirs = {scale_factor: prepare_bronze(scale_factor, seed, workers, regenerate) for scale_factor in scale_factors}
+    print(f"{'SF':>6} {'段階':<28} {'行数':>14} {'処理時間(秒)':>14} {'ピークRSS(MB)':>14} {'行/秒':>14}")
+    for scale_factor, bronze_dir in bronze_dirs.items():
+        for stage in stages:
+            result = measure(stage, bronze_dir)
+            result.update(run_at=run_at, commit=commit, scale_factor=scale_factor, stage=stage)
+            result['rows_per_second'] = result['rows'] / result['wall_seconds'] if result['wall_seconds'] > 0 else np.nan
+            results.append(result)
+            print(f"{scale_factor:>6g} {stage:<28} {result['rows']:>14,} {result['wall_seconds']:>14.3f} "
+                  f"{result['peak_rss_mb']:>14,.0f} {result['rows_per_second']:>14,.0f}")
+
+    results = pd.DataFrame(results, columns=HISTORY_COLUMNS)
+    regressions = find_regressions(results, history, time_threshold, rss_threshold, baseline_runs)
+    if record:
+        append_history(results, history_path)
+        print(f'\n履歴: {history_path}')
+
+    if regressions:
+        print(f'\n性能劣化を検出しました（処理時間 +{time_threshold:.0%} / ピークRSS +{rss_threshold:.0%} 超）')
+        for scale_factor, stage, metric, baseline, value in regressions:
+            print(f'  SF{scale_factor:g} {stage}: {metric} {baseline:,.3f} → {value:,.3f} ({value / baseline - 1:+.1%})')
+        return 1
+    print('\n性能劣化なし')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='パイプライン全体のスケーリングベンチマーク（履歴との比較で性能劣化を検出）')
+    parser.add_argument('--scale-factors', type=float, nargs='+', default=DEFAULT_SCALE_FACTORS, help='計測するスケールファクター')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES), help='計測する段階')
+    parser.add_argument('--seed', type=int, default=42, help='Bronze層生成の乱数シード')
+    parser.add_argument('--workers', type=int, default=None, help='Bronze層生成の並列プロセス数')
+    parser.add_argument('--regenerate', action='store_true', help='生成済みのBronze層があっても作り直す')
+    parser.add_argument('--history', type=Path, default=HISTORY_PATH, help='計測結果の履歴CSV')
+    parser.add_argument('--time-threshold', type=float, default=DEFAULT_TIME_THRESHOLD, help='処理時間の許容増加率')
+    parser.add_argument('--rss-threshold', type=float, default=DEFAULT_RSS_THRESHOLD, help='ピークRSSの許容増加率')
+    parser.add_argument('--baseline-runs', type=int, default=DEFAULT_BASELINE_RUNS, help='基準値に使う直近の計測回数')
+    parser.add_argument('--no-record', action='store_true', help='計測結果を履歴に追記しない')
+    parser.add_argument('--run-stage', choices=list(STAGES), default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--bronze-dir', type=Path, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        # 段階ごとの子プロセス: 計測結果をJSONで標準出力に書く
+        print(json.dumps(run_stage(args.run_stage, args.bronze_dir)))
+        raise SystemExit
+
+    raise SystemExit(run(
+        args.scale_factors, args.stages, args.seed, args.workers, args.regenerate, args.history,
+        args.time_threshold, args.rss_threshold, args.baseline_runs, not args.no_record,
+    ))
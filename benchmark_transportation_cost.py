@@ -0,0 +1,115 @@
+"""
+輸送コスト生成のスケーリングベンチマーク
+出荷伝票_itemの明細数を 10k ～ 10M 行まで増やし、build_transportation_costs の処理時間と
+輸送モード × 運送会社 × 出荷拠点の料金表による再計算（RateCard.rate）の処理時間を計測する
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from generate_transportation_cost import build_transportation_costs, group_shipment_items
+from rate_card import KEY_COLUMNS, RATE_COLUMNS, RateCard
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+LOCATIONS = ['STM', 'HTB', 'SZK', 'KMM', 'HMM']
+CARRIERS = ['ヤマトロジスティクス', '日本通運', '西濃運輸', 'ホンダロジスティクス', 'ホンダトランスポート']
+MODES = ['road', 'sea', 'air']
+
+# 従来実装（出荷ごとに全明細を走査）を計測する上限の明細数
+LEGACY_MAX_LINES = 10_000
+
+
+def make_shipments(num_lines, seed=0):
+    """明細数 num_lines 件の出荷伝票 header/item を合成する（1出荷あたり平均1.6明細）"""
+    rng = np.random.default_rng(seed)
+    num_shipments = max(int(num_lines / 1.6), 1)
+
+    shipment_ids = pd.Series(np.arange(num_shipments)).map('SHP-{:09d}'.format)
+    days = rng.integers(0, 4 * 365, size=num_shipments)
+    timestamps = np.datetime64('2022-01-01T08:00:00') + days.astype('timedelta64[D]')
+
+    shipment_headers = pd.DataFrame({
+        'shipment_id': shipment_ids,
+        'shipment_timestamp': pd.Series(timestamps).dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'location_id': rng.choice(LOCATIONS, size=num_shipments),
+        'customer_id': rng.choice([f'DEAL-{i:03d}' for i in range(1, 9)], size=num_shipments),
+    })
+
+    # すべての出荷に最低1明細を割り当て、残りはランダムに配分
+    owner = np.concatenate([
+        np.arange(num_shipments),
+        rng.integers(0, num_shipments, size=max(num_lines - num_shipments, 0)),
+    ])[:num_lines]
+    modes = rng.choice(MODES, size=num_shipments)
+    carriers = rng.choice(CARRIERS, size=num_shipments)
+    statuses = np.where(rng.random(num_shipments) < 0.2, 'delayed', 'delivered')
+
+    shipment_items = pd.DataFrame({
+        'shipment_id': shipment_ids.to_numpy()[owner],
+        'quantity': rng.integers(1, 11, size=len(owner)),
+        'transportation_mode': modes[owner],
+        'carrier_name': carriers[owner],
+        'delivery_status': statuses[owner],
+    })
+    return shipment_headers, shipment_items
+
+
+def make_rate_card(seed=0):
+    """輸送モード × 運送会社 × 出荷拠点の全組み合わせ（確定料金）と輸送モード別の既定行からなる料金表"""
+    rng = np.random.default_rng(seed)
+    keys = pd.MultiIndex.from_product([MODES, CARRIERS, LOCATIONS], names=KEY_COLUMNS).to_frame(index=False)
+    keys = pd.concat([keys, pd.DataFrame({'transportation_mode': MODES, 'carrier_name': '*', 'location_id': '*'})])
+    base = rng.integers(50_000, 500_001, size=len(keys))
+    unit = rng.integers(20_000, 30_001, size=len(keys))
+    expedite = rng.uniform(0.3, 0.5, size=len(keys))
+    return RateCard(keys.assign(**dict(zip(RATE_COLUMNS, [base, base, unit, unit, expedite, expedite]))))
+
+
+def build_transportation_costs_legacy(shipment_headers, shipment_items):
+    """従来のリスト内包表記による結合（比較用、O(出荷数 × 明細数)）"""
+    items = shipment_items.to_dict('records')
+    results = []
+    for shipment_id in shipment_headers['shipment_id']:
+        related_items = [item for item in items if item['shipment_id'] == shipment_id]
+        if not related_items:
+            continue
+        results.append(sum(int(item['quantity']) for item in related_items))
+    return results
+
+
+def run(sizes, seed):
+    rate_card = make_rate_card(seed)
+    print(f"{'明細数':>12} {'出荷数':>12} {'処理時間(秒)':>14} {'明細/秒':>14} {'従来実装(秒)':>14} {'再計算(秒)':>12}")
+    for num_lines in sizes:
+        shipment_headers, shipment_items = make_shipments(num_lines, seed)
+
+        start = time.perf_counter()
+        costs = build_transportation_costs(shipment_headers, shipment_items, np.random.default_rng(seed))
+        elapsed = time.perf_counter() - start
+        assert costs['shipment_id'].nunique() == len(shipment_headers)
+
+        legacy = '-'
+        if num_lines <= LEGACY_MAX_LINES:
+            start = time.perf_counter()
+            build_transportation_costs_legacy(shipment_headers, shipment_items)
+            legacy = f'{time.perf_counter() - start:.3f}'
+
+        # 集約済みの出荷に対する料金表の再計算
+        shipments = shipment_headers.join(group_shipment_items(shipment_items), on='shipment_id', how='inner')
+        start = time.perf_counter()
+        rate_card.rate(shipments)
+        rerate = time.perf_counter() - start
+
+        print(f'{num_lines:>12,} {len(shipment_headers):>12,} {elapsed:>14.3f} {num_lines / elapsed:>14,.0f} {legacy:>14} {rerate:>12.3f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='輸送コスト生成のスケーリングベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='計測する明細数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.seed)
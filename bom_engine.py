@@ -0,0 +1,180 @@
+"""
+BOM展開エンジン
+BOMマスタを拠点 × 有効期間ごとの疎行列（親品目 × 構成部品、値は員数）にコンパイルし、
+需要（品目 × 年月の数量）から総所要量を行列積で求める
+
+- 有効期間は eff_start_date / eff_end_date の境界で区切った期間ごとに行列を作る（期間内はBOM構成が変わらない）
+- 多階層展開は単階層の行列 A のべき乗の和 A + A² + A³ + … を A^k が 0 になるまで疎行列積で求める
+  （循環参照がある場合は ValueError）
+- 需要は 年月 × 品目 の疎行列 D にまとめ、総所要量 D @ (A + A² + …) を1回の行列積で求める
+- 需要に site_id がない場合は、品目のBOMが定義されている生産拠点で展開する
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from bronze_loader import BRONZE_DIR, get_cache
+from calendar_dimension import to_year_month
+from master_data import get_store
+from price_resolver import to_day_numbers
+
+# eff_end_date の番兵値（9999-12-31）より後の日付
+_MAX_DAY = to_day_numbers(np.array(['9999-12-31'], dtype='datetime64[D]'))[0] + 1
+
+
+class BomEngine:
+    """BOMマスタの疎行列表現と多階層展開"""
+
+    def __init__(self, bom):
+        bom = bom.reset_index(drop=True)
+        self.bom = bom
+        self.items = pd.Index(np.unique(np.concatenate([
+            bom['product_id'].to_numpy(dtype=object), bom['component_product_id'].to_numpy(dtype=object)
+        ])))
+        self.sites = pd.Index(np.unique(bom['site_id'].to_numpy(dtype=object)))
+
+        self._parents = self.items.get_indexer(bom['product_id'])
+        self._components = self.items.get_indexer(bom['component_product_id'])
+        self._site_codes = self.sites.get_indexer(bom['site_id'])
+        self._quantities = bom['component_quantity_per'].to_numpy(np.float64)
+        self._starts = to_day_numbers(bom['eff_start_date'])
+        self._ends = to_day_numbers(bom['eff_end_date'])
+
+        # 有効期間の境界（この日付で区切った期間内ではBOM構成が変わらない）
+        self.breakpoints = np.unique(np.concatenate([self._starts, self._ends + 1, [_MAX_DAY]]))
+        self._matrices = {}
+
+    @classmethod
+    def from_bronze(cls, system=None, bronze_dir=BRONZE_DIR):
+        """Bronze層のBOMマスタ（ERP / P2P。省略時は master_data の正本）から作成"""
+        return cls(get_store(bronze_dir).table('BOMマスタ', system))
+
+    # ---------- 行列 ----------
+    def period_of(self, dates):
+        """日付が属する有効期間の番号（breakpoints[i-1] <= 日付 < breakpoints[i] なら i）"""
+        return np.searchsorted(self.breakpoints, to_day_numbers(dates), side='right')
+
+    def bom_matrix(self, site_id, period):
+        """単階層のBOM行列 A（A[親品目, 構成部品] = 員数、同じ組み合わせの行は合算）"""
+        day = self.breakpoints[period - 1] if period > 0 else self.breakpoints[0] - 1
+        rows = (
+            (self._site_codes == self.sites.get_loc(site_id))
+            & (self._starts <= day)
+            & (self._ends >= day)
+        )
+        n_items = len(self.items)
+        return sparse.csr_matrix(
+            (self._quantities[rows], (self._parents[rows], self._components[rows])), shape=(n_items, n_items)
+        )
+
+    def explosion_matrix(self, site_id, period):
+        """多階層の総所要量行列 A + A² + A³ + …（拠点 × 有効期間ごとにキャッシュ）"""
+        key = (site_id, period)
+        if key not in self._matrices:
+            single_level = self.bom_matrix(site_id, period)
+            total = single_level.copy()
+            power = single_level
+            for _ in range(len(self.items)):
+                power = power @ single_level
+                power.eliminate_zeros()
+                if power.nnz == 0:
+                    break
+                total = total + power
+            else:
+                raise ValueError(f'BOMマスタに循環参照があります（拠点 {site_id}）')
+            self._matrices[key] = total.tocsr()
+        return self._matrices[key]
+
+    def production_sites(self):
+        """品目 → BOMが定義されている生産拠点（複数拠点にBOMがある品目は除外）"""
+        sites = self.bom[['product_id', 'site_id']].drop_duplicates()
+        return sites.drop_duplicates('product_id', keep=False).set_index('product_id')['site_id']
+
+    # ---------- 展開 ----------
+    def explode(self, demand, as_of=None):
+        """需要（product_id, year_month, quantity[, site_id]）から構成部品の総所要量を求める
+
+        BOMは各年月の月初時点で有効な構成を使う。as_of を指定すると全年月をその日付時点の構成で展開する（what-if用）。
+        戻り値は site_id, year_month, component_product_id, gross_requirement の DataFrame。
+        """
+        columns = ['site_id', 'year_month', 'component_product_id', 'gross_requirement']
+        demand = demand[demand['product_id'].isin(self.items)].copy()
+        if 'site_id' not in demand.columns:
+            sites = self.production_sites()
+            missing = np.setdiff1d(demand['product_id'].unique(), sites.index)
+            ambiguous = np.intersect1d(missing, self.bom['product_id'].unique())
+            if len(ambiguous):
+                raise ValueError(f'複数拠点にBOMがある品目は site_id を指定してください: {", ".join(ambiguous)}')
+            demand['site_id'] = demand['product_id'].map(sites)
+        demand = demand[demand['site_id'].isin(self.sites)]
+        if demand.empty:
+            return pd.DataFrame(columns=columns)
+
+        dates = (
+            np.full(len(demand), np.datetime64(as_of, 'D'))
+            if as_of is not None
+            else demand['year_month'].to_numpy(dtype=str).astype('datetime64[M]').astype('datetime64[D]')
+        )
+        demand['_period'] = self.period_of(dates)
+
+        results = []
+        for (site_id, period), part in demand.groupby(['site_id', '_period'], sort=True):
+            month_codes, months = pd.factorize(part['year_month'], sort=True)
+            requirement = sparse.csr_matrix(
+                (part['quantity'].to_numpy(np.float64), (month_codes, self.items.get_indexer(part['product_id']))),
+                shape=(len(months), len(self.items)),
+            ) @ self.explosion_matrix(site_id, period)
+            requirement = requirement.tocoo()
+            results.append(pd.DataFrame({
+                'site_id': site_id,
+                'year_month': np.asarray(months, dtype=object)[requirement.row],
+                'component_product_id': self.items[requirement.col],
+                'gross_requirement': requirement.data,
+            }))
+        if not results:
+            return pd.DataFrame(columns=columns)
+        result = pd.concat(results, ignore_index=True)
+        result = result[result['gross_requirement'] != 0]
+        return result.sort_values(columns[:3], kind='stable', ignore_index=True)
+
+
+def load_order_demand(bronze_dir=BRONZE_DIR):
+    """受注伝票_item の数量を 品目 × 受注年月 で集計した需要"""
+    bronze = get_cache(bronze_dir)
+    headers = bronze.load('ERP', '受注伝票_header', columns=['order_id', 'order_timestamp']).drop_duplicates('order_id')
+    items = bronze.load('ERP', '受注伝票_item', columns=['order_id', 'product_id', 'quantity'])
+    headers['year_month'] = to_year_month(headers['order_timestamp'])
+    lines = items.merge(headers[['order_id', 'year_month']], on='order_id', how='inner')
+    return lines.groupby(['product_id', 'year_month'], as_index=False)['quantity'].sum()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='BOM展開による部品総所要量の算出')
+    parser.add_argument('--system', choices=['ERP', 'P2P'], default='P2P', help='使用するBOMマスタ')
+    parser.add_argument('--as-of', default=None, help='全年月をこの日付時点のBOM構成で展開する（例: 2025-01-01）')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--output', type=Path, default=None, help='総所要量のCSV出力先')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = BomEngine.from_bronze(args.system, args.bronze_dir)
+    demand = load_order_demand(args.bronze_dir)
+    requirements = engine.explode(demand, as_of=args.as_of)
+    elapsed = time.perf_counter() - start
+
+    print(f'BOM展開完了 ({elapsed:.2f}秒)')
+    print(f'  BOM: {len(engine.bom):,}行, 品目 {len(engine.items):,}, 拠点 {len(engine.sites)}, 有効期間 {len(engine.breakpoints) - 1}')
+    print(f'  需要: {len(demand):,}行（品目 × 年月）, 総所要量: {len(requirements):,}行')
+    if len(requirements):
+        top = requirements.groupby('component_product_id')['gross_requirement'].sum().nlargest(10)
+        print('\n総所要量の多い構成部品（上位10件）')
+        for component, quantity in top.items():
+            print(f'  {component:<28} {quantity:>14,.0f}')
+    if args.output:
+        requirements.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f'\nCSVを出力しました: {args.output}')
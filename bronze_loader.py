@@ -0,0 +1,216 @@
+"""
+Bronze層CSVの共通ローダー
+各テーブルを初回に型付きParquetへ変換してキャッシュし、以降はParquetから読み込む
+元CSVの更新日時・サイズ・ハッシュをマニフェストに記録し、変更されたテーブルだけを再変換する
+CSVは schema_registry のスキーマ（文字コード・区切り文字・列の型）に従って1回で読み込む
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pipeline_trace import span
+from schema_registry import REGISTRY_NAME, SchemaRegistry, TableSchema
+
+# ディレクトリ
+BRONZE_DIR = Path(__file__).resolve().parent / 'data' / 'Bronze'
+CACHE_DIR = Path(__file__).resolve().parent / 'data' / '.cache' / 'Bronze'
+MANIFEST_NAME = 'manifest.json'
+# キャッシュの形式（列の型の決め方を変えたら上げ、古い形式のParquetを作り直す）
+CACHE_FORMAT = 2
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """ファイルのSHA-256を計算"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_dates(values, date_format=None):
+    """日付・日時文字列を datetime64[s] に変換（9999-12-31 などの番兵値もそのまま保持）"""
+    values = values.fillna('NaT')
+    if date_format and '/' in date_format:
+        values = values.str.replace('/', '-', regex=False)
+    return pd.Series(np.array(values.to_numpy(dtype=str), dtype='datetime64[s]'), index=values.index)
+
+
+def read_bronze_csv(path, schema=None):
+    """Bronze層CSVをスキーマの文字コード・区切り文字・列の型で読み込む（schema を省略すると先頭ブロックから判定する）"""
+    schema = schema or TableSchema.sniff(path)
+    df = pd.read_csv(path, encoding=schema.encoding, sep=schema.delimiter, dtype=schema.dtypes())
+    for column, data_type, date_format in schema.columns:
+        if data_type in ('DATE', 'TIMESTAMP'):
+            df[column] = parse_dates(df[column], date_format)
+    return df
+
+
+def list_tables(bronze_dir=BRONZE_DIR):
+    """Bronze層のテーブル一覧を (システム名, テーブル名) のリストで返す"""
+    bronze_dir = Path(bronze_dir)
+    return sorted((path.parent.name, path.stem) for path in bronze_dir.glob('*/*.csv'))
+
+
+class BronzeCache:
+    """Bronze層CSVのParquetキャッシュ"""
+
+    def __init__(self, bronze_dir=BRONZE_DIR, cache_dir=None):
+        self.bronze_dir = Path(bronze_dir)
+        if cache_dir is None:
+            cache_dir = CACHE_DIR if self.bronze_dir == BRONZE_DIR else self.bronze_dir.parent / '.cache' / self.bronze_dir.name
+        self.cache_dir = Path(cache_dir)
+        self.manifest_path = self.cache_dir / MANIFEST_NAME
+        self._manifest = None
+        self.registry = SchemaRegistry(self.bronze_dir, self.cache_dir / REGISTRY_NAME)
+
+    # ---------- マニフェスト ----------
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            if self.manifest_path.exists():
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ---------- パス ----------
+    def source_path(self, system, table):
+        return self.bronze_dir / system / f'{table}.csv'
+
+    def parquet_path(self, system, table):
+        return self.cache_dir / system / f'{table}.parquet'
+
+    # ---------- キャッシュ判定 ----------
+    def is_fresh(self, system, table):
+        """キャッシュが元CSVと一致していれば True（更新日時が変わっていてもハッシュが同じなら有効）"""
+        key = f'{system}/{table}'
+        entry = self.manifest.get(key)
+        source = self.source_path(system, table)
+        if entry is None or entry.get('format') != CACHE_FORMAT or not self.parquet_path(system, table).exists():
+            return False
+
+        stat = source.stat()
+        if entry['source_mtime_ns'] == stat.st_mtime_ns and entry['source_size'] == stat.st_size:
+            return True
+        if entry['source_size'] != stat.st_size or entry['source_sha256'] != file_sha256(source):
+            return False
+
+        # 内容は同じで更新日時だけが変わった場合はマニフェストのみ更新
+        entry['source_mtime_ns'] = stat.st_mtime_ns
+        self._save_manifest()
+        return True
+
+    def build(self, system, table):
+        """元CSVを読み込んでParquetへ変換し、マニフェストを更新する"""
+        source = self.source_path(system, table)
+        stat = source.stat()
+        with span(f'CSV解析 {system}/{table}', 'load', bytes_read=stat.st_size) as current:
+            df = read_bronze_csv(source, self.registry.get(system, table))
+            current.set(rows_out=len(df))
+
+        parquet_path = self.parquet_path(system, table)
+        parquet_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = parquet_path.with_suffix('.parquet.tmp')
+        with span(f'Parquet書き出し {system}/{table}', 'write', rows_in=len(df)) as current:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+            os.replace(tmp_path, parquet_path)
+            current.set(bytes_written=parquet_path.stat().st_size)
+
+        self.manifest[f'{system}/{table}'] = {
+            'source': str(source.relative_to(self.bronze_dir)),
+            'format': CACHE_FORMAT,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_size': stat.st_size,
+            'source_sha256': file_sha256(source),
+            'rows': len(df),
+            'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self._save_manifest()
+        return df
+
+    def refresh(self):
+        """古くなったテーブルだけを再変換し、再変換したテーブル一覧を返す"""
+        rebuilt = []
+        for system, table in list_tables(self.bronze_dir):
+            if not self.is_fresh(system, table):
+                self.build(system, table)
+                rebuilt.append((system, table))
+        return rebuilt
+
+    # ---------- 読み込み ----------
+    def load_arrow(self, system, table, columns=None):
+        """テーブルをArrow Tableとして読み込む"""
+        if not self.is_fresh(system, table):
+            self.build(system, table)
+        path = self.parquet_path(system, table)
+        with span(f'Parquet読み込み {system}/{table}', 'load', bytes_read=path.stat().st_size) as current:
+            arrow = pq.read_table(path, columns=columns)
+            current.set(rows_out=arrow.num_rows)
+        return arrow
+
+    def load(self, system, table, columns=None):
+        """テーブルを型付きのDataFrameとして読み込む"""
+        return self.load_arrow(system, table, columns=columns).to_pandas()
+
+
+_default_cache = None
+
+
+def get_cache(bronze_dir=BRONZE_DIR):
+    """既定のBronzeディレクトリに対するキャッシュを返す"""
+    global _default_cache
+    if Path(bronze_dir) != BRONZE_DIR:
+        return BronzeCache(bronze_dir)
+    if _default_cache is None:
+        _default_cache = BronzeCache()
+    return _default_cache
+
+
+def load_table(system, table, columns=None, bronze_dir=BRONZE_DIR):
+    """Bronze層テーブルをDataFrameで読み込む（例: load_table('ERP', '受注伝票_item')）"""
+    return get_cache(bronze_dir).load(system, table, columns=columns)
+
+
+def load_arrow_table(system, table, columns=None, bronze_dir=BRONZE_DIR):
+    """Bronze層テーブルをArrow Tableで読み込む"""
+    return get_cache(bronze_dir).load_arrow(system, table, columns=columns)
+
+
+if __name__ == '__main__':
+    cache = get_cache()
+
+    start = time.perf_counter()
+    rebuilt = cache.refresh()
+    print(f'Parquet変換: {len(rebuilt)}テーブル ({time.perf_counter() - start:.2f}秒)')
+    for system, table in rebuilt:
+        print(f'  {system}/{table}')
+    print()
+
+    print(f"{'テーブル':<28} {'行数':>10} {'CSV読込(ms)':>12} {'Parquet読込(ms)':>16}")
+    for system, table in list_tables():
+        start = time.perf_counter()
+        read_bronze_csv(cache.source_path(system, table), cache.registry.get(system, table))
+        csv_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        df = cache.load(system, table)
+        parquet_ms = (time.perf_counter() - start) * 1000
+
+        print(f'{system + "/" + table:<28} {len(df):>10,} {csv_ms:>12.1f} {parquet_ms:>16.1f}')
@@ -0,0 +1,251 @@
+"""
+カレンダーディメンション
+2000-01-01 ～ 2100-12-31 の日付ごとに年月・月末日・翌月末日・年度（4月始まり）・四半期・曜日・祝日・営業日を
+1回だけ計算して保持し、伝票側は日付を1970-01-01起点の日数（price_resolver.to_day_numbers）に変換して
+行位置で引く（行ごとの日付の解析・書式化をしない）
+
+- 年度は開始年で表す（2024年度 = 2024-04-01 ～ 2025-03-31）。四半期は 4-6月 が第1四半期
+- 祝日は「国民の祝日に関する法律」に基づいて算出する（ハッピーマンデー、春分・秋分の日の近似式、
+  振替休日、国民の休日、2019年の即位関連・2020/2021年の東京オリンピックによる移動を含む）
+- 営業日は土日・祝日と年末年始（12/31・1/2・1/3）を除いた日（銀行の休業日と同じ）
+- business_day_number は期間の先頭からの営業日の通し番号で、差をとると2日付間の営業日数になる
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from price_resolver import to_day_numbers
+
+CALENDAR_START = '2000-01-01'
+CALENDAR_END = '2100-12-31'
+
+# 営業日から除く年末年始（月, 日）
+YEAR_END_HOLIDAYS = [(12, 31), (1, 2), (1, 3)]
+
+# 祝日が移動・新設された年の例外（年 → {日付: 名称}）
+SPECIAL_HOLIDAYS = {
+    2019: {(4, 30): '国民の休日', (5, 1): '即位の日', (5, 2): '国民の休日', (10, 22): '即位礼正殿の儀'},
+    2020: {(7, 23): '海の日', (7, 24): 'スポーツの日', (8, 10): '山の日'},
+    2021: {(7, 22): '海の日', (7, 23): 'スポーツの日', (8, 8): '山の日'},
+}
+
+
+# ---------- 祝日 ----------
+def nth_monday(year, month, n):
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def equinox_day(year, spring):
+    """春分の日・秋分の日（1980～2150年の近似式）"""
+    if year < 2100:
+        constant = 20.8431 if spring else 23.2488
+    else:
+        constant = 21.8510 if spring else 24.2488
+    return int(constant + 0.242194 * (year - 1980) - (year - 1980) // 4)
+
+
+def statutory_holidays(year):
+    """国民の祝日（振替休日・国民の休日を除く）を {date: 名称} で返す"""
+    holidays = {
+        date(year, 1, 1): '元日',
+        nth_monday(year, 1, 2): '成人の日',
+        date(year, 2, 11): '建国記念の日',
+        date(year, 3, equinox_day(year, spring=True)): '春分の日',
+        date(year, 4, 29): '昭和の日' if year >= 2007 else 'みどりの日',
+        date(year, 5, 3): '憲法記念日',
+        date(year, 5, 5): 'こどもの日',
+        date(year, 9, equinox_day(year, spring=False)): '秋分の日',
+        date(year, 11, 3): '文化の日',
+        date(year, 11, 23): '勤労感謝の日',
+    }
+    if year >= 2007:
+        holidays[date(year, 5, 4)] = 'みどりの日'
+    if year <= 2018:
+        holidays[date(year, 12, 23)] = '天皇誕生日'
+    elif year >= 2020:
+        holidays[date(year, 2, 23)] = '天皇誕生日'
+    if year not in (2020, 2021):
+        holidays[date(year, 7, 20) if year <= 2002 else nth_monday(year, 7, 3)] = '海の日'
+        holidays[nth_monday(year, 10, 2)] = '体育の日' if year <= 2019 else 'スポーツの日'
+        if year >= 2016:
+            holidays[date(year, 8, 11)] = '山の日'
+    holidays[date(year, 9, 15) if year <= 2002 else nth_monday(year, 9, 3)] = '敬老の日'
+    for (month, day), name in SPECIAL_HOLIDAYS.get(year, {}).items():
+        holidays[date(year, month, day)] = name
+    return holidays
+
+
+def japanese_holidays(start_year, end_year):
+    """start_year ～ end_year の祝日（振替休日・国民の休日を含む）を {date: 名称} で返す"""
+    holidays = {}
+    for year in range(start_year, end_year + 1):
+        holidays.update(statutory_holidays(year))
+
+    # 国民の休日: 前日と翌日が祝日の日（日曜・祝日を除く）
+    for day in sorted(holidays):
+        between = day + timedelta(days=2)
+        middle = day + timedelta(days=1)
+        if between in holidays and middle not in holidays and middle.weekday() != 6:
+            holidays[middle] = '国民の休日'
+
+    # 振替休日: 日曜の祝日の後の最初の祝日でない日（2006年までは翌日が祝日でない場合の翌月曜のみ）
+    for day in sorted(holidays):
+        if day.weekday() != 6:
+            continue
+        substitute = day + timedelta(days=1)
+        if day.year >= 2007:
+            while substitute in holidays:
+                substitute += timedelta(days=1)
+        if substitute not in holidays:
+            holidays[substitute] = '振替休日'
+    return holidays
+
+
+# ---------- カレンダー ----------
+def build_calendar(start=CALENDAR_START, end=CALENDAR_END):
+    """start ～ end の日付ごとのカレンダー（行位置 = 日付 - start の日数）"""
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    months = days.astype('datetime64[M]')
+    month_numbers = months.astype(np.int64)
+    year = month_numbers // 12 + 1970
+    month = month_numbers % 12 + 1
+    day = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    # 1970-01-01 は木曜（月曜 = 0）
+    weekday = (days.astype(np.int64) + 3) % 7
+
+    holidays = japanese_holidays(int(year[0]), int(year[-1]))
+    holiday_names = pd.Series(holidays, dtype=object)
+    holiday_names.index = pd.to_datetime(holiday_names.index).to_numpy().astype('datetime64[D]')
+    holiday_name = holiday_names.reindex(days).to_numpy()
+    is_holiday = pd.notna(holiday_name)
+    is_year_end = np.zeros(len(days), dtype=bool)
+    for holiday_month, holiday_day in YEAR_END_HOLIDAYS:
+        is_year_end |= (month == holiday_month) & (day == holiday_day)
+    is_business_day = (weekday < 5) & ~is_holiday & ~is_year_end
+
+    return pd.DataFrame({
+        'date_key': days.astype(np.int64),
+        'date': days,
+        'year': year,
+        'month': month,
+        'day': day,
+        'year_month': np.datetime_as_string(months).astype(object),
+        'month_end': (months + 1).astype('datetime64[D]') - 1,
+        'next_month_end': (months + 2).astype('datetime64[D]') - 1,
+        'fiscal_year': year - (month < 4),
+        'fiscal_quarter': (month - 4) % 12 // 3 + 1,
+        'weekday': weekday,
+        'is_weekend': weekday >= 5,
+        'is_holiday': is_holiday,
+        'holiday_name': holiday_name,
+        'is_business_day': is_business_day,
+        'business_day_number': np.cumsum(is_business_day),
+    })
+
+
+class CalendarDimension:
+    """日付 → カレンダーの行位置の変換と列の参照"""
+
+    def __init__(self, start=CALENDAR_START, end=CALENDAR_END):
+        self.table = build_calendar(start, end)
+        self.start_day = int(self.table['date_key'].iloc[0])
+
+    @staticmethod
+    def _datetimes(values):
+        array = np.asarray(values)
+        if array.dtype.kind != 'M':
+            array = pd.to_datetime(pd.Series(array.ravel())).to_numpy()
+        return array
+
+    def positions(self, values):
+        """日付の配列に対する行位置（欠損値・範囲外は -1）"""
+        array = self._datetimes(values)
+        days = to_day_numbers(array)
+        positions = days - self.start_day
+        invalid = np.isnat(array.astype('datetime64[D]')) | (positions < 0) | (positions >= len(self.table))
+        return np.where(invalid, -1, positions)
+
+    def lookup(self, values, column):
+        """日付の配列に対する column の値（欠損値・範囲外の日付は欠損値）"""
+        positions = self.positions(values)
+        result = self.table[column].take(np.clip(positions, 0, None))
+        if (positions < 0).any():
+            result = result.where(positions >= 0)
+        return result.to_numpy()
+
+    def year_month(self, values):
+        return self.lookup(values, 'year_month')
+
+    def next_month_end(self, values):
+        """翌月末日（カレンダーの範囲外の日付は日付から直接計算する。欠損値は NaT）"""
+        positions = self.positions(values)
+        result = self.table['next_month_end'].to_numpy()[np.clip(positions, 0, None)]
+        outside = positions < 0
+        if outside.any():
+            months = self._datetimes(values)[outside].astype('datetime64[M]')
+            result[outside] = (months + 2).astype('datetime64[D]') - 1
+        return result
+
+    def business_days_between(self, start, end):
+        """start の翌日から end までの営業日数（start・end は日付の配列）"""
+        numbers = self.table['business_day_number'].to_numpy()
+        start_positions, end_positions = self.positions(start), self.positions(end)
+        result = numbers[end_positions] - numbers[start_positions]
+        return np.where((start_positions < 0) | (end_positions < 0), np.nan, result)
+
+
+_calendar = None
+
+
+def get_calendar():
+    """プロセス内で共有するカレンダー"""
+    global _calendar
+    if _calendar is None:
+        _calendar = CalendarDimension()
+    return _calendar
+
+
+def to_year_month(values):
+    """日時の配列を 'YYYY-MM' 形式の年月文字列に変換（カレンダーを引く。範囲外・欠損値は日時から直接変換）"""
+    calendar = get_calendar()
+    positions = calendar.positions(values)
+    year_months = calendar.table['year_month'].to_numpy()[np.clip(positions, 0, None)]
+    outside = positions < 0
+    if outside.any():
+        year_months[outside] = values.to_numpy()[outside].astype('datetime64[M]').astype(str)
+    return pd.Series(year_months, index=values.index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='カレンダーディメンション（年月・年度・祝日・営業日）')
+    parser.add_argument('--output', type=Path, default=None, help='カレンダーの出力先（.csv / .parquet）')
+    parser.add_argument('--year', type=int, default=None, help='祝日・営業日数を表示する年')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    calendar = get_calendar()
+    table = calendar.table
+    print(f'カレンダー作成: {len(table):,}日 ({table["date"].iloc[0].date()} ～ {table["date"].iloc[-1].date()}, '
+          f'{time.perf_counter() - start:.3f}秒)')
+
+    year = args.year or int(np.datetime64('today', 'Y').astype(np.int64)) + 1970
+    days = table[table['year'] == year]
+    print(f'\n{year}年: 祝日 {int(days["is_holiday"].sum())}日, 営業日 {int(days["is_business_day"].sum())}日')
+    for row in days[days['is_holiday']].itertuples():
+        print(f'  {row.date.date()} {"月火水木金土日"[row.weekday]} {row.holiday_name}')
+    print('\n月別営業日数')
+    print(days.groupby('year_month')['is_business_day'].sum().to_string())
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        if args.output.suffix == '.parquet':
+            table.to_parquet(args.output, index=False)
+        else:
+            table.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f'\n出力: {args.output}')
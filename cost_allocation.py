@@ -0,0 +1,221 @@
+"""
+完成品別の間接費配賦エンジン
+間接材（調達伝票_item の material_type = indirect）と人件費（給与テーブル）を配賦基準に応じて
+完成品（product_id）× 年月 に配賦する（完成品別月次EBITDA の完成品別販売管理費）
+
+- コストプールは 間接材（indirect_materials）と部門別の人件費（payroll_<部門>）の年月ごとの合計
+- 配賦基準は 完成品 × 年月 の行列で、受注数量（units）・売上（revenue）・製造工数（manufacturing_hours）を用意する
+  （製造工数は 受注数量 × 品目の標準工数で近似し、標準工数はBOMの構成部品員数の合計（拠点ごとのBOMの平均）とする）
+- 配賦は 基準の構成比（年月ごとに完成品の合計が1）× プールの月額 を（プール × 完成品 × 年月）の配列で1回で求める
+  基準の合計が0の年月の金額は配賦せず、未配賦額（unallocated）として残す
+- コストプール・配賦基準の行列は初回に1回だけ作り、配賦基準を変えた再計算ではBronze層を読み直さない
+- gold_kpi の完成品別月次EBITDA の販売管理費もこのエンジンで配賦する（既定は全プールの基準が revenue）
+"""
+
+import argparse
+import time
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR
+from generate_payroll_data import summarize_payroll
+from gold_kpi import GoldKpiEngine
+from master_data import get_store
+
+DRIVERS = ('units', 'revenue', 'manufacturing_hours')
+DEFAULT_DRIVER = 'revenue'
+
+INDIRECT_POOL = 'indirect_materials'
+PAYROLL_POOL_PREFIX = 'payroll_'
+
+
+class CostAllocator:
+    """コストプール（年月ごとの間接費）を配賦基準の構成比で完成品 × 年月に配賦する"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._custom_drivers = {}
+        self._matrices = {}
+
+    @classmethod
+    def from_bronze(cls, bronze_dir=BRONZE_DIR, months=None):
+        return cls(GoldKpiEngine(bronze_dir, months))
+
+    # ---------- コストプール ----------
+    @cached_property
+    def pool_amounts(self):
+        """年月 × コストプールの金額"""
+        lines = self.engine.procurement_lines
+        indirect = lines[lines['material_type'] == 'indirect'].groupby('year_month')['cost'].sum()
+        payroll = summarize_payroll(self.engine.payroll, ['year_month', 'department'])['gross_salary'].unstack('department')
+        payroll.columns = [f'{PAYROLL_POOL_PREFIX}{department}' for department in payroll.columns]
+        pools = pd.concat([indirect.rename(INDIRECT_POOL), payroll], axis=1).fillna(0).astype(np.float64)
+        return pools.reindex(self.months, fill_value=0.0)
+
+    @property
+    def pools(self):
+        return list(self.pool_amounts.columns)
+
+    # ---------- 配賦基準 ----------
+    @cached_property
+    def units(self):
+        return self.engine.order_lines.groupby(['product_id', 'year_month'])['quantity'].sum().astype(np.float64)
+
+    @cached_property
+    def standard_hours(self):
+        """品目ごとの標準工数（BOMの構成部品員数の合計。BOMのない品目は全品目の平均）"""
+        bom = get_store(self.engine.bronze.bronze_dir).bom
+        hours = bom.groupby(['product_id', 'site_id'])['component_quantity_per'].sum().groupby(level='product_id').mean()
+        products = self.units.index.get_level_values('product_id')
+        return hours.reindex(products.unique()).fillna(hours.mean())
+
+    def driver_values(self, name):
+        """配賦基準の値（(product_id, year_month) の Series）"""
+        if name in self._custom_drivers:
+            return self._custom_drivers[name]
+        if name == 'units':
+            return self.units
+        if name == 'revenue':
+            return self.engine.revenue_by_product_month
+        if name == 'manufacturing_hours':
+            products = self.units.index.get_level_values('product_id')
+            return self.units * self.standard_hours.reindex(products).to_numpy()
+        raise ValueError(f'未定義の配賦基準です: {name}（{", ".join(self.drivers)}）')
+
+    @property
+    def drivers(self):
+        return list(DRIVERS) + [name for name in self._custom_drivers if name not in DRIVERS]
+
+    def add_driver(self, name, values):
+        """独自の配賦基準（(product_id, year_month) をインデックスとする Series）を登録する"""
+        self._custom_drivers[name] = values.astype(np.float64)
+        self._matrices.pop(name, None)
+
+    # ---------- 行列 ----------
+    @cached_property
+    def products(self):
+        return pd.Index(np.unique(self.units.index.get_level_values('product_id').to_numpy(dtype=object)))
+
+    @cached_property
+    def months(self):
+        lines = self.engine.procurement_lines
+        months = np.concatenate([
+            self.units.index.get_level_values('year_month').to_numpy(dtype=object),
+            lines.loc[lines['material_type'] == 'indirect', 'year_month'].to_numpy(dtype=object),
+            self.engine.payroll['year_month'].to_numpy(dtype=object),
+        ])
+        return pd.Index(np.unique(months))
+
+    def driver_matrix(self, name):
+        """配賦基準の 完成品 × 年月 の行列"""
+        if name not in self._matrices:
+            values = self.driver_values(name)
+            rows = self.products.get_indexer(values.index.get_level_values('product_id'))
+            columns = self.months.get_indexer(values.index.get_level_values('year_month'))
+            found = (rows >= 0) & (columns >= 0)
+            matrix = np.zeros((len(self.products), len(self.months)))
+            np.add.at(matrix, (rows[found], columns[found]), np.nan_to_num(values.to_numpy(np.float64)[found]))
+            self._matrices[name] = matrix
+        return self._matrices[name]
+
+    def shares(self, name):
+        """配賦基準の構成比（年月ごとに完成品の合計が1。基準の合計が0の年月は全て0）"""
+        matrix = self.driver_matrix(name)
+        totals = matrix.sum(axis=0)
+        return np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals != 0)
+
+    # ---------- 配賦 ----------
+    def resolve_drivers(self, drivers=None, default=DEFAULT_DRIVER):
+        """コストプール → 配賦基準（drivers にないプールは default）"""
+        drivers = dict(drivers or {})
+        unknown = set(drivers) - set(self.pools)
+        if unknown:
+            raise ValueError(f'未定義のコストプールです: {", ".join(sorted(unknown))}（{", ".join(self.pools)}）')
+        return {pool: drivers.get(pool, default) for pool in self.pools}
+
+    def allocation_cube(self, drivers=None, default=DEFAULT_DRIVER):
+        """（コストプール × 完成品 × 年月）の配賦額"""
+        drivers = self.resolve_drivers(drivers, default)
+        names = list(dict.fromkeys(drivers.values()))
+        shares = np.stack([self.shares(name) for name in names])
+        pool_drivers = [names.index(drivers[pool]) for pool in self.pools]
+        return shares[pool_drivers] * self.pool_amounts.to_numpy().T[:, None, :]
+
+    def allocate(self, drivers=None, default=DEFAULT_DRIVER):
+        """完成品 × 年月 ごとのコストプール別配賦額と合計（operating_expenses）"""
+        cube = self.allocation_cube(drivers, default)
+        product_codes, month_codes = np.nonzero(cube.any(axis=0) | (self.driver_matrix('units') != 0))
+        df = pd.DataFrame({
+            'product_id': self.products[product_codes],
+            'year_month': self.months[month_codes],
+        })
+        for number, pool in enumerate(self.pools):
+            df[pool] = cube[number, product_codes, month_codes]
+        df['operating_expenses'] = cube.sum(axis=0)[product_codes, month_codes]
+        df.insert(1, 'product_name', self.engine.product_names(df['product_id']))
+        return df.sort_values(['year_month', 'product_id'], kind='stable').reset_index(drop=True)
+
+    def unallocated(self, drivers=None, default=DEFAULT_DRIVER):
+        """年月 × コストプールの未配賦額（配賦基準の合計が0の年月の金額）"""
+        cube = self.allocation_cube(drivers, default)
+        unallocated = self.pool_amounts - cube.sum(axis=1).T
+        # 構成比の丸め誤差は0とみなす
+        return unallocated.mask(np.isclose(unallocated, 0, atol=1e-6), 0.0)
+
+    def ebitda_by_product(self, drivers=None, default=DEFAULT_DRIVER):
+        """完成品別月次EBITDA（販売管理費を指定した配賦基準で配賦）"""
+        df = self.engine.gross_margin_by_product()
+        expenses = self.allocate(drivers, default).set_index(['product_id', 'year_month'])['operating_expenses']
+        df['gross_margin_amount'] = df['revenue'] - df['cogs']
+        df['operating_expenses'] = expenses.reindex(pd.MultiIndex.from_frame(df[['product_id', 'year_month']])).fillna(0).to_numpy()
+        df['ebitda'] = df['gross_margin_amount'] - df['operating_expenses']
+        return df
+
+
+def parse_driver_options(options):
+    """['indirect_materials=units', ...] → {コストプール: 配賦基準}"""
+    drivers = {}
+    for option in options:
+        pool, _, driver = option.partition('=')
+        if not driver:
+            raise ValueError(f'配賦基準は <コストプール>=<配賦基準> の形式で指定してください: {option}')
+        drivers[pool] = driver
+    return drivers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='間接材・人件費の完成品 × 年月への配賦')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--driver', action='append', default=[], metavar='POOL=DRIVER',
+                        help=f'コストプールごとの配賦基準（{", ".join(DRIVERS)}。例: payroll_manufacturing=manufacturing_hours）')
+    parser.add_argument('--default-driver', default=DEFAULT_DRIVER, help='--driver で指定しないコストプールの配賦基準')
+    parser.add_argument('--output', type=Path, default=None, help='配賦結果のCSV出力先')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    allocator = CostAllocator.from_bronze(args.bronze_dir)
+    pools = allocator.pool_amounts
+    loaded = time.perf_counter()
+    drivers = allocator.resolve_drivers(parse_driver_options(args.driver), args.default_driver)
+    result = allocator.allocate(drivers)
+    unallocated = allocator.unallocated(drivers)
+    elapsed = time.perf_counter() - loaded
+
+    print(f'配賦完了 (読み込み {loaded - start:.2f}秒, 配賦 {elapsed:.3f}秒)')
+    print(f'  完成品 {len(allocator.products)} × 年月 {len(allocator.months)}, 結果 {len(result):,}行')
+    print(f"\n{'コストプール':<28} {'配賦基準':<20} {'金額':>16} {'未配賦':>14}")
+    for pool in allocator.pools:
+        print(f'{pool:<28} {drivers[pool]:<20} ¥{pools[pool].sum():>15,.0f} ¥{unallocated[pool].sum():>13,.0f}')
+
+    print('\n完成品別の配賦額（全期間）')
+    by_product = result.groupby(['product_id', 'product_name'])['operating_expenses'].sum().sort_values(ascending=False)
+    for (product_id, product_name), amount in by_product.items():
+        print(f'  {product_id} {product_name}: ¥{amount:,.0f}')
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f'\n配賦結果: {args.output}')
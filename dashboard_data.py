@@ -0,0 +1,295 @@
+"""
+ダッシュボード用のデータ層
+Bronze層・Gold層のテーブルをParquetスナップショットからArrow Tableとして読み込み、絞り込み・集計をキャッシュ付きのクエリで提供する
+
+- Bronze層は bronze_loader のParquetキャッシュ、Gold層は data/Gold のCSVを同じ仕組みで data/.cache/Gold に変換したものを使う
+- 行数・列の型はParquetのメタデータから取得し、プレビューは先頭のバッチだけを読む（テーブル全体は読まない）
+- 絞り込み・集計は pyarrow.compute / Table.group_by で行い、結果は (テーブル, 絞り込み条件, 集計キー, 集計方法, 件数上限) を
+  キーにキャッシュする。元CSVが更新されるとキーが変わるため、古い結果は使われない
+- 画面に返す行数は MAX_ROWS で打ち切る（総件数は別に返す）
+- グラフ用の系列はグラフの横幅（ピクセル）ごとの区間に分け、区間ごとの最小値・最大値の点だけを返す
+  （全行を対象にしても、ピークを残したまま点数は横幅の2倍程度に収まる）
+"""
+
+import argparse
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from bronze_loader import BRONZE_DIR, BronzeCache, get_cache, list_tables
+from gold_kpi import GOLD_DIR
+
+# 画面に返す行数の上限
+PREVIEW_ROWS = 10
+MAX_ROWS = 5_000
+MAX_CATEGORIES = 50
+MAX_DISTINCT = 1_000
+
+# グラフの横幅（ピクセル）の既定値
+CHART_WIDTH = 1_000
+
+# メモリに保持する列数・クエリ結果数
+COLUMN_CACHE_SIZE = 64
+QUERY_CACHE_SIZE = 256
+
+AGGREGATIONS = {'合計': 'sum', '平均': 'mean', '最大': 'max', '最小': 'min', '件数': 'count'}
+
+
+class _LruCache(OrderedDict):
+    """件数上限つきのLRUキャッシュ"""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get_or_compute(self, key, compute):
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        value = compute()
+        self[key] = value
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+        return value
+
+
+def minmax_downsample(values, buckets):
+    """values を buckets 個の連続した区間に分け、区間ごとの最小値・最大値の位置を昇順で返す
+
+    先頭・末尾の点は常に含める。欠損値は区間の最小値・最大値に選ばない（区間がすべて欠損なら先頭の位置）。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    blocks = np.full(-(-n // size) * size, np.nan)
+    blocks[:n] = values
+    blocks = blocks.reshape(-1, size)
+    missing = np.isnan(blocks)
+    offsets = np.arange(len(blocks)) * size
+    lows = np.where(missing, np.inf, blocks).argmin(axis=1) + offsets
+    highs = np.where(missing, -np.inf, blocks).argmax(axis=1) + offsets
+    return np.unique(np.concatenate([[0, n - 1], lows, highs[highs < n]]))
+
+
+def _filter_expression(filters, schema):
+    """(列, 'in', 値のタプル) / (列, 'between', (下限, 上限)) の並びをArrowの条件式にする"""
+    expression = None
+    for column, operator, value in filters:
+        field = pc.field(column)
+        if operator == 'in':
+            condition = field.isin(pa.array(list(value), type=schema.field(column).type))
+        elif operator == 'between':
+            low, high = (pa.scalar(bound, type=schema.field(column).type) for bound in value)
+            condition = (field >= low) & (field <= high)
+        else:
+            raise ValueError(f'未対応の絞り込み条件です: {operator}')
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class DashboardData:
+    """ダッシュボードが参照するテーブル（'Gold/<テーブル名>' / 'Bronze/<システム>/<テーブル名>'）のスナップショットとクエリ"""
+
+    def __init__(self, bronze_dir=BRONZE_DIR, gold_dir=GOLD_DIR):
+        self.bronze = get_cache(bronze_dir)
+        self.gold_dir = Path(gold_dir)
+        self.gold = BronzeCache(self.gold_dir.parent, self.bronze.cache_dir.parent)
+        self._columns = _LruCache(COLUMN_CACHE_SIZE)
+        self._queries = _LruCache(QUERY_CACHE_SIZE)
+
+    # ---------- スナップショット ----------
+    def datasets(self):
+        """テーブル名の一覧（Gold層 → Bronze層の順）"""
+        gold = [f'Gold/{path.stem}' for path in sorted(self.gold_dir.glob('*.csv'))]
+        bronze = [f'Bronze/{system}/{table}' for system, table in list_tables(self.bronze.bronze_dir)]
+        return gold + bronze
+
+    def _locate(self, name):
+        """テーブル名 → (キャッシュ, システム名, テーブル名)"""
+        layer, _, rest = name.partition('/')
+        if layer == 'Gold':
+            return self.gold, self.gold_dir.name, rest
+        if layer == 'Bronze':
+            system, _, table = rest.partition('/')
+            return self.bronze, system, table
+        raise KeyError(name)
+
+    def snapshot_path(self, name):
+        """最新のParquetスナップショットのパス（元CSVが更新されていれば作り直す）"""
+        cache, system, table = self._locate(name)
+        if not cache.is_fresh(system, table):
+            cache.build(system, table)
+        return cache.parquet_path(system, table)
+
+    def version(self, name):
+        """元CSVの更新日時とサイズ（クエリ結果のキャッシュキーに使う）"""
+        cache, system, table = self._locate(name)
+        stat = cache.source_path(system, table).stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """全テーブルのスナップショットを作り直し、作り直したテーブル名の一覧を返す"""
+        rebuilt = []
+        for name in self.datasets():
+            cache, system, table = self._locate(name)
+            if not cache.is_fresh(system, table):
+                cache.build(system, table)
+                rebuilt.append(name)
+        return rebuilt
+
+    # ---------- メタデータ ----------
+    def schema(self, name):
+        return pq.read_schema(self.snapshot_path(name))
+
+    def num_rows(self, name):
+        return pq.read_metadata(self.snapshot_path(name)).num_rows
+
+    def numeric_columns(self, name):
+        return [field.name for field in self.schema(name) if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
+
+    def temporal_columns(self, name):
+        return [field.name for field in self.schema(name) if pa.types.is_temporal(field.type)]
+
+    def category_columns(self, name):
+        return [field.name for field in self.schema(name) if pa.types.is_string(field.type) or pa.types.is_large_string(field.type)]
+
+    # ---------- 読み込み ----------
+    def table(self, name, columns, filters=()):
+        """columns の列だけを読んだArrow Table（読んだ列はメモリ上に COLUMN_CACHE_SIZE 列まで保持）
+
+        filters を指定すると、絞り込みに使う列も読んで絞り込んだ後に columns の列を返す。
+        """
+        version, path = self.version(name), self.snapshot_path(name)
+        needed = list(dict.fromkeys([*columns, *(column for column, _, _ in filters)]))
+        table = pa.Table.from_arrays([
+            self._columns.get_or_compute((name, version, column), lambda column=column: pq.read_table(path, columns=[column]).column(0))
+            for column in needed
+        ], names=needed)
+        if filters:
+            table = table.filter(_filter_expression(filters, table.schema))
+        return table.select(list(columns))
+
+    def preview(self, name, rows=PREVIEW_ROWS):
+        """先頭 rows 行（先頭のバッチだけを読む）"""
+        return self._cached(('preview', name, rows), lambda: self._head(name, None, rows).to_pandas())
+
+    def _head(self, name, columns, rows):
+        batches = pq.ParquetFile(self.snapshot_path(name)).iter_batches(batch_size=rows, columns=columns)
+        batch = next(batches, None)
+        if batch is None:
+            return self.schema(name).empty_table().select(columns or self.schema(name).names)
+        return pa.Table.from_batches([batch])
+
+    def _cached(self, key, compute):
+        return self._queries.get_or_compute((self.version(key[1]),) + key, compute)
+
+    # ---------- クエリ ----------
+    def query(self, name, filters=(), group_by=(), metrics=(), columns=None, limit=MAX_ROWS):
+        """絞り込み・集計した結果の先頭 limit 行と、打ち切り前の総件数を返す
+
+        filters は (列, 'in', 値のタプル) / (列, 'between', (下限, 上限)) のタプル。
+        group_by を指定すると metrics（(列, 集計方法) のタプル、集計方法は sum / mean / max / min / count）で集計し、
+        集計キーの昇順に並べる。指定しない場合は columns の列を元の行順で返す。
+        """
+        key = ('query', name, tuple(filters), tuple(group_by), tuple(metrics), tuple(columns or ()), limit)
+        return self._cached(key, lambda: self._query(name, filters, group_by, metrics, columns, limit))
+
+    def _query(self, name, filters, group_by, metrics, columns, limit):
+        if not filters and not group_by:
+            # 絞り込みも集計もなければ先頭だけを読む
+            return self._head(name, list(columns) if columns else None, limit).to_pandas(), self.num_rows(name)
+
+        if group_by:
+            table = self._aggregate(name, filters, group_by, metrics)
+        else:
+            table = self.table(name, list(columns) if columns else self.schema(name).names, filters)
+        return table.slice(0, limit).to_pandas(), table.num_rows
+
+    def _aggregate(self, name, filters, group_by, metrics):
+        """絞り込んだ行を group_by で集計し、集計キーの昇順に並べる（集計結果の列名は <列>_<集計方法>）"""
+        table = self.table(name, list(group_by) + [column for column, _ in metrics], filters)
+        table = table.group_by(list(group_by)).aggregate(list(metrics))
+        table = table.select(list(group_by) + [f'{column}_{aggregation}' for column, aggregation in metrics])
+        return table.sort_by([(column, 'ascending') for column in group_by])
+
+    def series(self, name, columns, x=None, aggregation='sum', filters=(), width=CHART_WIDTH):
+        """グラフ用の系列 {列: (横軸の値, 値)} と、間引く前の点数を返す
+
+        x を指定すると x ごとに aggregation で集計した系列、指定しない場合は行番号を横軸にした全行の系列。
+        各系列は width 個の区間ごとの最小値・最大値の点に間引く（minmax_downsample）。
+        """
+        def compute():
+            if x is None:
+                table = self.table(name, list(columns), filters)
+                x_values = np.arange(table.num_rows)
+                y_columns = list(columns)
+            else:
+                table = self._aggregate(name, filters, (x,), tuple((column, aggregation) for column in columns))
+                x_values = table.column(x).to_numpy()
+                y_columns = [f'{column}_{aggregation}' for column in columns]
+            result = {}
+            for column, y_column in zip(columns, y_columns):
+                values = table.column(y_column).cast(pa.float64()).to_numpy()
+                rows = minmax_downsample(values, width)
+                result[column] = (x_values[rows], values[rows])
+            return result, table.num_rows
+        return self._cached(('series', name, tuple(columns), x, aggregation, tuple(filters), width), compute)
+
+    def value_counts(self, name, column, filters=(), limit=MAX_CATEGORIES):
+        """列の値ごとの件数（多い順に limit 件）"""
+        def compute():
+            counts = self.table(name, [column], filters).group_by(column).aggregate([([], 'count_all')]).sort_by([('count_all', 'descending')])
+            return counts.slice(0, limit).to_pandas().set_index(column)['count_all']
+        return self._cached(('value_counts', name, column, tuple(filters), limit), compute)
+
+    def distinct_values(self, name, column, limit=MAX_DISTINCT):
+        """絞り込み候補にする列の値（昇順に limit 件まで）"""
+        def compute():
+            values = pc.unique(self.table(name, [column]).column(column).drop_null())
+            return values.sort().slice(0, limit).to_pylist()
+        return self._cached(('distinct', name, column, limit), compute)
+
+    def value_range(self, name, column):
+        """列の最小値・最大値"""
+        def compute():
+            result = pc.min_max(self.table(name, [column]).column(column))
+            return result['min'].as_py(), result['max'].as_py()
+        return self._cached(('range', name, column), compute)
+
+    def describe(self, name, columns, filters=()):
+        """数値列の統計量（pandas の describe と同じ行構成）"""
+        def compute():
+            import pandas as pd
+            table = self.table(name, list(columns), filters)
+            stats = {}
+            for column in columns:
+                values = table.column(column)
+                quantiles = pc.quantile(values, q=[0.25, 0.5, 0.75], interpolation='linear').to_pylist() if len(values) else [None] * 3
+                min_max = pc.min_max(values)
+                stats[column] = [
+                    pc.count(values).as_py(), pc.mean(values).as_py(), pc.stddev(values, ddof=1).as_py(),
+                    min_max['min'].as_py(), *quantiles, min_max['max'].as_py(),
+                ]
+            return pd.DataFrame(stats, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+        return self._cached(('describe', name, tuple(columns), tuple(filters)), compute)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ダッシュボード用Parquetスナップショットの事前作成')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--gold-dir', type=Path, default=GOLD_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = DashboardData(args.bronze_dir, args.gold_dir)
+    rebuilt = data.refresh()
+    print(f'スナップショット作成: {len(rebuilt)}テーブル ({time.perf_counter() - start:.2f}秒)')
+    for name in rebuilt:
+        print(f'  {name} ({data.num_rows(name):,}行)')
@@ -0,0 +1,206 @@
+"""
+需要予測エンジン
+受注伝票を 品目 × 拠点 の週次系列に集計し、全系列に対してまとめて指数平滑法（Holt の線形トレンド法）を当てはめ、
+output/Forecast_Records.csv と同じ形式（週ごとの mean / p10 / p50 / p90）で予測を出力する
+（既定の出力先はリポジトリのサンプルを上書きしない output/Forecast_Records_generated.csv）
+
+- 週は日曜始まり（forecast_week = forecast_start_dttm = 週の日曜日、forecast_end_dttm = 土曜日）
+- 平滑化パラメータ (α, β) は候補のグリッド × 系列 の行列で一度に1期先予測誤差を計算し、系列ごとに誤差二乗和が最小のものを選ぶ
+- 予測分布は正規分布とし、h期先の分散は1期先誤差の分散 × (1 + Σ_{j=1}^{h-1} (α + jαβ)²)。分位点は0未満にならないよう切り詰める
+- 系列はシャードに分け、プロセスプールで並列に当てはめる（--workers 1 ではプロセスを使わない）
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR, load_table
+
+FORECAST_PATH = Path(__file__).resolve().parent / 'output' / 'Forecast_Records_generated.csv'
+
+FORECAST_COLUMNS = [
+    'product_id', 'site_id', 'mean', 'p10', 'p50', 'p90', 'forecast_week', 'forecast_start_dttm',
+    'forecast_end_dttm', 'company_id', 'region_id', 'product_group_id', 'snapshot_date',
+]
+COMPANY_ID = 'HND'
+
+# 予測する週数
+DEFAULT_HORIZON = 4
+
+# 平滑化パラメータの候補（β = 0 は単純指数平滑法）
+ALPHAS = np.arange(1, 10) / 10
+BETAS = np.array([0.0, 0.05, 0.1, 0.2])
+
+# 初期水準に使う週数
+INIT_WEEKS = 4
+
+# 1シャードあたりの系列数
+SHARD_SERIES = 5_000
+
+Z_90 = NormalDist().inv_cdf(0.9)
+
+
+# ---------- 週次系列 ----------
+def week_start(days):
+    """datetime64[D] の配列をその週の日曜日にする（1970-01-01 は木曜日）"""
+    day_numbers = np.asarray(days, dtype='datetime64[D]').astype(np.int64)
+    return (day_numbers - (day_numbers + 4) % 7).astype('datetime64[D]')
+
+
+def weekly_demand(order_headers, order_items, as_of=None):
+    """受注数量を 品目 × 拠点 の系列 × 週 の行列に集計する
+
+    受注IDが重複する場合は後のヘッダーを採用し、ヘッダーのない明細は除外する。
+    as_of を含む週の前週までを集計する（既定は最終受注日の翌日、つまり最終受注日を含む週は集計しない）。
+    戻り値は (系列の MultiIndex（product_id, site_id）, 週の開始日の配列, 行列)。
+    """
+    headers = order_headers.drop_duplicates('order_id', keep='last')
+    header_rows = pd.Index(headers['order_id']).get_indexer(order_items['order_id'])
+    matched = header_rows >= 0
+    header_rows = header_rows[matched]
+
+    order_dates = headers['order_timestamp'].to_numpy().astype('datetime64[D]')
+    if as_of is None:
+        as_of = order_dates.max() + 1
+    weeks = week_start(order_dates)[header_rows]
+    last_week = week_start([np.datetime64(as_of, 'D')])[0] - 7
+    in_range = weeks <= last_week
+    first_week = weeks[in_range].min() if in_range.any() else last_week + 7
+    week_codes = ((weeks - first_week).astype(np.int64) // 7)[in_range]
+    week_starts = np.arange(first_week, last_week + 1, 7)
+
+    series = pd.MultiIndex.from_arrays([
+        order_items['product_id'].to_numpy(dtype=object)[matched][in_range],
+        headers['location_id'].to_numpy(dtype=object)[header_rows][in_range],
+    ], names=['product_id', 'site_id'])
+    series_codes, series_index = series.factorize(sort=True)
+    series_index = pd.MultiIndex.from_tuples(series_index, names=['product_id', 'site_id'])
+
+    quantity = order_items['quantity'].to_numpy(np.float64)[matched][in_range]
+    matrix = np.bincount(
+        series_codes * len(week_starts) + week_codes, weights=quantity, minlength=len(series_index) * len(week_starts)
+    ).reshape(len(series_index), len(week_starts))
+    return series_index, week_starts, matrix
+
+
+# ---------- 予測 ----------
+def fit_holt(history, horizon=DEFAULT_HORIZON, alphas=ALPHAS, betas=BETAS):
+    """系列 × 週 の行列に Holt の線形トレンド法を当てはめ、h = 1..horizon 週先の平均と標準偏差を返す
+
+    パラメータの候補数を K、系列数を N とすると、水準・トレンド・誤差二乗和は K × N の行列で週ごとに更新する。
+    戻り値は (mean, std) で、いずれも 系列 × horizon の行列。
+    """
+    history = np.asarray(history, dtype=np.float64)
+    n_series, n_weeks = history.shape
+    alpha, beta = (grid.ravel()[:, np.newaxis] for grid in np.meshgrid(alphas, betas, indexing='ij'))
+
+    init_weeks = min(INIT_WEEKS, n_weeks)
+    level = np.broadcast_to(history[:, :init_weeks].mean(axis=1), (len(alpha), n_series)).copy()
+    trend = np.zeros_like(level)
+    sse = np.zeros_like(level)
+    for t in range(init_weeks, n_weeks):
+        error = history[:, t] - (level + trend)
+        sse += error * error
+        level += trend + alpha * error
+        trend += alpha * beta * error
+
+    # 系列ごとに誤差二乗和が最小のパラメータを選ぶ
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(n_series)
+    level, trend, sse = level[best, columns], trend[best, columns], sse[best, columns]
+    alpha, beta = alpha[best, 0], beta[best, 0]
+
+    steps = np.arange(1, horizon + 1)
+    mean = level[:, np.newaxis] + trend[:, np.newaxis] * steps
+    sigma = np.sqrt(sse / max(n_weeks - init_weeks - 2, 1))
+    weights = (alpha[:, np.newaxis] * (1 + beta[:, np.newaxis] * steps[:-1])) ** 2
+    variance_factor = 1 + np.concatenate([np.zeros((n_series, 1)), np.cumsum(weights, axis=1)], axis=1)
+    return mean, sigma[:, np.newaxis] * np.sqrt(variance_factor)
+
+
+def _forecast_shard(task):
+    history, horizon = task
+    return fit_holt(history, horizon)
+
+
+def forecast(history, horizon=DEFAULT_HORIZON, workers=None, shard_series=SHARD_SERIES):
+    """系列をシャードに分けて fit_holt を並列実行する（戻り値は fit_holt と同じ）"""
+    tasks = [(history[start:start + shard_series], horizon) for start in range(0, len(history), shard_series)]
+    if not tasks:
+        return np.empty((0, horizon)), np.empty((0, horizon))
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers == 1:
+        results = [_forecast_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_forecast_shard, tasks))
+    return np.concatenate([mean for mean, _ in results]), np.concatenate([std for _, std in results])
+
+
+def build_forecast_records(series, last_week, mean, std, snapshot_date, product_groups=None):
+    """予測結果を Forecast_Records の形式（系列 × 週 の縦持ち、数量は小数2桁）にする"""
+    n_series, horizon = mean.shape
+    series_index = np.repeat(np.arange(n_series), horizon)
+    forecast_weeks = np.datetime64(last_week, 'D') + 7 * np.arange(1, horizon + 1)
+    week_index = np.tile(np.arange(horizon), n_series)
+
+    mean = np.maximum(mean, 0).ravel()
+    spread = Z_90 * std.ravel()
+    product_ids = series.get_level_values('product_id').to_numpy(dtype=object)[series_index]
+    records = pd.DataFrame({
+        'product_id': product_ids,
+        'site_id': series.get_level_values('site_id').to_numpy(dtype=object)[series_index],
+        'mean': mean.round(2),
+        'p10': np.maximum(mean - spread, 0).round(2),
+        'p50': mean.round(2),
+        'p90': (mean + spread).round(2),
+        'forecast_week': np.datetime_as_string(forecast_weeks[week_index]),
+        'forecast_start_dttm': np.datetime_as_string(forecast_weeks[week_index]),
+        'forecast_end_dttm': np.datetime_as_string(forecast_weeks[week_index] + 6),
+        'company_id': COMPANY_ID,
+        'region_id': None,
+        'product_group_id': pd.Series(product_ids).map(product_groups).to_numpy() if product_groups is not None else None,
+        'snapshot_date': str(np.datetime64(snapshot_date, 'D')),
+    })
+    return records[FORECAST_COLUMNS]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='受注実績からの週次需要予測（Forecast_Records の出力）')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='予測する週数')
+    parser.add_argument('--as-of', default=None, help='予測時点（この日を含む週の前週までを実績として使う、既定: 最終受注日の翌日）')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（既定: CPUコア数）')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--output', type=Path, default=FORECAST_PATH, help='Forecast_Records のCSV出力先')
+    args = parser.parse_args()
+
+    print('Loading data...')
+    order_headers = load_table('ERP', '受注伝票_header', columns=['order_id', 'order_timestamp', 'location_id'], bronze_dir=args.bronze_dir)
+    order_items = load_table('ERP', '受注伝票_item', columns=['order_id', 'product_id', 'quantity'], bronze_dir=args.bronze_dir)
+    products = load_table('ERP', '品目マスタ', columns=['product_id', 'item_group'], bronze_dir=args.bronze_dir)
+
+    start = time.perf_counter()
+    if args.as_of:
+        as_of = np.datetime64(args.as_of, 'D')
+    else:
+        as_of = np.datetime64(order_headers['order_timestamp'].max(), 'D') + 1
+    series, week_starts, history = weekly_demand(order_headers, order_items, as_of)
+    if not len(week_starts):
+        parser.error('予測に使う週次実績がありません')
+    mean, std = forecast(history, args.horizon, args.workers)
+    records = build_forecast_records(
+        series, week_starts[-1], mean, std, as_of, products.set_index('product_id')['item_group']
+    )
+    elapsed = time.perf_counter() - start
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    records.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f'予測完了 ({elapsed:.2f}秒)')
+    print(f'  系列: {len(series):,}（品目 × 拠点）, 実績: {week_starts[0]}～{week_starts[-1]} ({len(week_starts)}週), 予測: {args.horizon}週')
+    print(f'Forecast records: {args.output} ({len(records):,}行)')
@@ -0,0 +1,950 @@
+"""
+Bronze層サンプルデータの一括生成（スケールファクター対応・並列生成）
+data/backup/scripts の受注・出荷・調達・給与・月次在庫の各生成スクリプトと generate_transportation_cost.py を
+1本にまとめ、NumPyのベクトル演算で生成する
+
+- --scale-factor 1 で現行のBronze層と同程度の件数になり、N を指定すると伝票系テーブルが約N倍になる（1x～1000x）
+- マスタ（品目・取引先・拠点・条件・BOM）は元のBronze層からそのままコピーし、伝票はマスタに存在するIDだけを参照する
+  （受注明細の品目は受注日に条件マスタの価格が有効なものに限る）
+- 伝票は年月 × 拠点（location_id）のパーティション単位でプロセスプールに分配して生成し、
+  各ワーカーはパーティションごとのシャードCSVへ書き出す。最後にパーティション順に連結して1テーブル1ファイルにする
+- 取引先マスタ・拠点マスタ・BOMマスタは master_data のストアから正本を読み、ワーカーには
+  Arrow IPCのスナップショット（メモリマップ）で渡す
+- 乱数はパーティションごとに (seed, 年月, 拠点) から導出するため、同じ --seed と --scale-factor からは
+  ワーカー数に関係なく同じデータが生成される
+- 伝票IDはパーティションIDを含む採番（例: ORD-202201-STM-000001、COST-202201-STM-000001）で、
+  全体で一意かつ年月 → 拠点 → 連番の順に並ぶ
+"""
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from generate_transportation_cost import build_transportation_costs, fieldnames as TRANSPORTATION_COST_COLUMNS
+from inventory_simulator import ReplenishmentPolicy, pivot_demand, simulate
+from master_data import MasterDataStore, get_store
+from price_resolver import PriceResolver
+
+# ディレクトリ
+SOURCE_DIR = Path(__file__).resolve().parent / 'data' / 'Bronze'
+GENERATED_DIR = Path(__file__).resolve().parent / 'data' / 'Generated'
+
+# マスタ（システム名, テーブル名）: 元のBronze層からコピーする
+MASTER_TABLES = [
+    ('ERP', 'BOMマスタ'), ('ERP', '取引先マスタ'), ('ERP', '品目マスタ'), ('ERP', '拠点マスタ'), ('ERP', '条件マスタ'),
+    ('MES', '取引先マスタ'), ('MES', '拠点マスタ'),
+    ('P2P', 'BOMマスタ'), ('P2P', '取引先マスタ'),
+    ('TMS', '取引先マスタ'), ('TMS', '拠点マスタ'),
+    ('WMS', '拠点マスタ'),
+]
+
+# 生成期間
+START_DATE = np.datetime64('2022-01-01')
+ORDER_END_DATE = np.datetime64('2025-12-02')
+PAYROLL_END_MONTH = np.datetime64('2025-12')
+INVENTORY_END_MONTH = np.datetime64('2025-11')
+INVENTORY_UPDATED_TIMESTAMP = '2025-12-15 08:00:00'
+
+# 取引先と受注拠点のマッピング
+DEALER_LOCATION_MAP = {
+    'DEAL-001': 'STM',  # Honda Cars 東京中央
+    'DEAL-002': 'HTB',  # Honda Cars 大阪
+    'DEAL-003': 'SZK',  # Honda Cars 横浜
+    'DEAL-004': 'KMM',  # Honda Cars 名古屋
+    'DEAL-005': 'HMM',  # Honda Cars 福岡
+    'DEAL-006': 'STM',  # Honda of America
+    'DEAL-007': 'HTB',  # Honda Europe
+    'DEAL-008': 'SZK',  # Honda China
+}
+
+# 1ディーラーあたりの年間発注件数（scale factor 1）: 国内は週1回弱、海外は月1回弱
+ORDERS_PER_YEAR = {'domestic': 42, 'overseas': 9}
+# 1受注あたりの明細行数・合計台数の範囲
+ORDER_LINES_RANGE = {'domestic': (1, 3), 'overseas': (1, 4)}
+ORDER_QUANTITY_RANGE = {'domestic': (1, 10), 'overseas': (10, 50)}
+
+# 拠点ごとの納期目安（days）
+DELIVERY_DAYS_BY_LOCATION = {
+    'STM': (7, 14),   # 埼玉製作所: 1～2週間
+    'HTB': (7, 14),   # ホンダオートボディー: 1～2週間
+    'SZK': (10, 21),  # 鈴鹿製作所: 1.5～3週間
+    'KMM': (14, 21),  # 熊本製作所: 2～3週間
+    'HMM': (7, 14),   # 浜松製作所: 1～2週間
+}
+
+# 出荷: 運送会社（名称, コード）と輸送モード
+SHIPMENT_CARRIERS = [
+    ('ホンダロジスティクス', 'HNL'),
+    ('ホンダトランスポート', 'HNT'),
+    ('日本通運', 'NPL'),
+    ('ヤマトロジスティクス', 'YML'),
+    ('西濃運輸', 'SEI'),
+]
+TRANSPORT_MODES = ['road', 'sea', 'air']
+
+# 調達: 部品IDの接頭辞 → (部品カテゴリ, 単価下限, 単価上限)
+COMPONENT_PRICES = {
+    'ENG': ('Engine Parts', 300000, 700000),
+    'TRN': ('Transmission Parts', 80000, 200000),
+    'ECU': ('Electronic Control Units', 30000, 80000),
+    'BAT': ('Battery Components', 30000, 80000),
+    'MTR': ('Motor Components', 100000, 250000),
+    'INV': ('Inverter Components', 50000, 120000),
+    'MAT': ('Raw Materials', 500, 2000),
+    'CMP': ('Electronic Components', 50, 200),
+    'EXH': ('Exhaust Parts', 20000, 50000),
+    'MFL': ('Muffler Parts', 20000, 50000),
+    'ARM': ('Suspension Arms', 20000, 40000),
+    'INT': ('Interior Parts', 20000, 100000),
+    'SUS': ('Suspension Systems', 20000, 50000),
+}
+DEFAULT_COMPONENT_PRICE = ('Other Parts', 20000, 50000)
+
+# 調達: 間接材（MRO）カタログ（品目ID, 品名, カテゴリ, UNSPSC, 単価）
+MRO_ITEMS = [
+    ('MRO-SAFETY-GOGGLES', '保護メガネ 防曇コート 10個セット', 'Safety Equipment', '46181504', 1900),
+    ('MRO-COOLANT-20L', '冷却液 20Lポリタンク', 'Factory Consumables', '15121502', 1902),
+    ('MRO-DRILL-BIT-SET', 'ドリルビットセット HSS鋼 50本組', 'Maintenance Tools', '27112702', 15000),
+    ('MRO-LUBRICANT-5L', '工業用潤滑油 5L缶 6本', 'Factory Supplies', '15121501', 2083),
+    ('MRO-GLOVE-L', '作業用手袋 Lサイズ 50双', 'Safety Equipment', '46181501', 918),
+    ('MRO-TOOL-WRENCH', 'トルクレンチセット 12本組', 'Maintenance Tools', '27112101', 8900),
+    ('MRO-CUTTING-FLUID', '切削油 20L缶', 'Factory Consumables', '15121509', 7800),
+    ('MRO-HELMET', '保護ヘルメット 20個', 'Safety Equipment', '46181601', 28000),
+    ('MRO-WELDING-WIRE', 'MIG溶接ワイヤ 1.2mm 15kg', 'Welding Supplies', '30131501', 18000),
+    ('MRO-GREASE-MP', '万能グリース 16kg缶', 'Lubricants', '15121505', 15000),
+    ('MRO-MICROMETER-SET', 'マイクロメーターセット 0-100mm', 'Measuring Tools', '41111500', 45000),
+    ('MRO-BOLT-SET-M8', '六角ボルト M8 ステンレス 500本', 'Fasteners', '31161500', 8500),
+]
+# 間接材の全拠点合計の月間発注件数（scale factor 1）と1発注あたりの明細行数
+MRO_ORDERS_PER_MONTH = 5.4
+MRO_LINES_RANGE = (1, 4)
+
+PROCUREMENT_CARRIERS = [('ヤマト運輸', 'YM'), ('佐川急便', 'SG'), ('日本通運', 'NT')]
+RECEIVERS = [
+    ('田中太郎', 't.tanaka@example.com'),
+    ('佐藤花子', 'h.sato@example.com'),
+    ('鈴木一郎', 'i.suzuki@example.com'),
+    ('高橋美咲', 'm.takahashi@example.com'),
+    ('山本進', 's.yamamoto@example.com'),
+    ('小林誠', 'm.kobayashi@example.com'),
+]
+APPROVERS = ['田中一郎', '佐藤花子', '山田太郎', '鈴木次郎']
+COST_CENTERS = ['CC-001', 'CC-002', 'CC-003', 'CC-004', 'CC-005', 'CC-006']
+MRO_DEPARTMENTS = ['DEPT-MFG', 'DEPT-MAINT', 'DEPT-QC']
+MRO_PAYMENT_METHODS = ['銀行振込', '手形', '現金']
+TAX_RATE = 0.1
+
+# 給与: 部門 → (コード, 役職, コストセンター, 基本給の範囲)
+DEPARTMENTS = {
+    'manufacturing': ('MAN', ['operator', 'supervisor', 'engineer'], 'CC-005', (280000, 350000)),
+    'sales': ('SAL', ['sales_rep', 'manager'], 'CC-002', (300000, 400000)),
+    'R&D': ('R&D', ['researcher', 'senior_researcher'], 'CC-004', (350000, 450000)),
+    'administration': ('ADM', ['staff', 'manager'], 'CC-001', (320000, 380000)),
+}
+OVERTIME_BASE_RANGE = (30000, 80000)
+JAPANESE_NAMES = [
+    '田中太郎', '鈴木花子', '佐藤健一', '高橋美咲', '渡辺誠',
+    '伊藤陽子', '山本大輔', '中村麻美', '小林優太', '加藤絵里',
+    '吉田拓也', '山田真理子', '佐々木翔', '井上明日香', '木村雄一',
+    '松本由美', '林健太郎', '清水千尋', '森本祐介', '池田愛美',
+]
+
+# 出力CSVの列順
+ORDER_HEADER_COLUMNS = ['order_id', 'order_timestamp', 'location_id', 'customer_id']
+ORDER_ITEM_COLUMNS = ['order_id', 'line_number', 'product_id', 'quantity', 'promised_delivery_date', 'pricing_date']
+SHIPMENT_HEADER_COLUMNS = ['shipment_id', 'shipment_timestamp', 'location_id', 'customer_id']
+SHIPMENT_ITEM_COLUMNS = [
+    'shipment_id', 'order_id', 'line_number', 'product_id', 'product_name', 'quantity', 'carrier_name',
+    'transportation_mode', 'planned_ship_date', 'actual_ship_timestamp', 'expected_ship_date',
+    'actual_arrival_timestamp', 'delivery_status',
+]
+PROCUREMENT_HEADER_COLUMNS = [
+    'purchase_order_id', 'order_date', 'expected_delivery_date', 'supplier_id', 'supplier_name', 'account_group',
+    'location_id', 'purchase_order_number', 'currency', 'order_subtotal_ex_tax', 'shipping_fee_ex_tax', 'tax_amount',
+    'discount_amount_incl_tax', 'order_total_incl_tax', 'order_status', 'approver', 'payment_method',
+    'payment_confirmation_id', 'payment_date', 'payment_amount',
+]
+PROCUREMENT_ITEM_COLUMNS = [
+    'purchase_order_id', 'line_number', 'material_id', 'material_name', 'material_category', 'material_type',
+    'product_id', 'unspsc_code', 'quantity', 'unit_price_ex_tax', 'line_subtotal_incl_tax', 'line_subtotal_ex_tax',
+    'line_tax_amount', 'line_tax_rate', 'line_shipping_fee_incl_tax', 'line_discount_incl_tax', 'line_total_incl_tax',
+    'reference_price_ex_tax', 'purchase_rule', 'ship_date', 'shipping_status', 'carrier_tracking_number',
+    'shipped_quantity', 'carrier_name', 'delivery_address', 'receiving_status', 'received_quantity', 'received_date',
+    'receiver_name', 'receiver_email', 'cost_center', 'project_code', 'department_code', 'account_user', 'user_email',
+]
+PAYROLL_COLUMNS = [
+    'payroll_id', 'employee_id', 'employee_name', 'department', 'position', 'payment_period', 'base_salary',
+    'overtime_pay', 'allowances', 'deductions', 'net_salary', 'payment_date', 'currency', 'employment_type',
+    'cost_center',
+]
+INVENTORY_HISTORY_COLUMNS = [
+    'product_id', 'product_name', 'location_id', 'year_month', 'inventory_quantity', 'inventory_status',
+    'snapshot_date',
+]
+CURRENT_INVENTORY_COLUMNS = [
+    'product_id', 'product_name', 'location_id', 'inventory_quantity', 'inventory_status', 'last_updated_timestamp',
+]
+
+
+# パーティション単位で生成する伝票テーブル（システム名, テーブル名, 列, エンコーディング）: MESは従来どおりBOMなし
+PARTITIONED_TABLES = [
+    ('ERP', '受注伝票_header', ORDER_HEADER_COLUMNS, 'utf-8-sig'),
+    ('ERP', '受注伝票_item', ORDER_ITEM_COLUMNS, 'utf-8-sig'),
+    ('MES', '出荷伝票_header', SHIPMENT_HEADER_COLUMNS, 'utf-8'),
+    ('MES', '出荷伝票_item', SHIPMENT_ITEM_COLUMNS, 'utf-8'),
+    ('TMS', '輸送コスト', TRANSPORTATION_COST_COLUMNS, 'utf-8-sig'),
+    ('P2P', '調達伝票_header', PROCUREMENT_HEADER_COLUMNS, 'utf-8-sig'),
+    ('P2P', '調達伝票_item', PROCUREMENT_ITEM_COLUMNS, 'utf-8-sig'),
+    ('HR', '給与テーブル', PAYROLL_COLUMNS, 'utf-8-sig'),
+]
+
+# パーティションごとのシャードCSVを置く作業ディレクトリ（出力先の直下）
+SHARD_DIR_NAME = '_shards'
+
+# 乱数ストリームの種別（SeedSequence の spawn_key の先頭要素）
+STREAM_PARTITION = 0
+STREAM_EMPLOYEES = 1
+STREAM_INVENTORY = 2
+
+
+# ---------- 共通 ----------
+def read_master(source_dir, system, table):
+    return pd.read_csv(Path(source_dir) / system / f'{table}.csv', encoding='utf-8-sig', dtype=str)
+
+
+def make_rng(seed, *keys):
+    """シードと (ストリーム種別, ...) のキーから独立した乱数生成器を作る"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=keys))
+
+
+def month_ordinal(month):
+    """datetime64[M] を1970-01起点の通し月番号にする"""
+    return int(np.datetime64(month, 'M').astype(np.int64))
+
+
+def partition_id(month, location_id):
+    """パーティションID（例: 202201-STM）"""
+    return f"{str(np.datetime64(month, 'M')).replace('-', '')}-{location_id}"
+
+
+def to_date_strings(values):
+    """datetime64 の配列を YYYY-MM-DD 形式の文字列にする"""
+    return np.datetime_as_string(np.asarray(values).astype('datetime64[D]'))
+
+
+def to_timestamp_strings(values):
+    """datetime64 の配列を YYYY-MM-DD HH:MM:SS 形式の文字列にする"""
+    strings = np.datetime_as_string(np.asarray(values).astype('datetime64[s]'))
+    return pd.Series(strings, dtype=object).str.replace('T', ' ', regex=False).to_numpy()
+
+
+def sequence_ids(prefix, numbers, width):
+    """接頭辞 + ゼロ埋め連番のIDを生成"""
+    return (prefix + pd.Series(np.asarray(numbers)).astype(str).str.zfill(width)).to_numpy()
+
+
+def uniform_integers(rng, low, high):
+    """low～high（両端含む）の整数をサンプリング（low, high は配列可）"""
+    return rng.integers(low, np.asarray(high) + 1)
+
+
+def pick(rng, choices, size):
+    """候補リストから size 件を復元抽出"""
+    return np.asarray(choices, dtype=object)[rng.integers(0, len(choices), size=size)]
+
+
+def group_positions(keys):
+    """同じキー内での出現順（0始まり）を返す"""
+    return pd.Series(keys).groupby(pd.Series(keys), sort=False).cumcount().to_numpy()
+
+
+# ---------- 受注 ----------
+def generate_order_headers(dealers, month, location_id, scale_factor, rng):
+    """受注伝票_header を1パーティション分生成（ディーラーごとの発注件数はポアソン分布）
+
+    dealers は拠点に紐づくディーラーの partner_id → region。
+    """
+    first_day = max(month.astype('datetime64[D]'), START_DATE)
+    last_day = min((month + 1).astype('datetime64[D]') - 1, ORDER_END_DATE)
+    days = max(int((last_day - first_day).astype(np.int64)) + 1, 0)
+    expected = np.array([ORDERS_PER_YEAR[region] for region in dealers], dtype=np.float64) * days / 365.25 * scale_factor
+    customer_ids = np.repeat(dealers.index.to_numpy(dtype=object), rng.poisson(expected))
+
+    # 営業時間内（8:00～17:59）のランダムな日時
+    day_offsets = rng.integers(0, max(days, 1), size=len(customer_ids))
+    seconds = rng.integers(8 * 3600, 18 * 3600, size=len(customer_ids))
+    timestamps = (first_day + day_offsets).astype('datetime64[s]') + seconds
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, customer_ids = timestamps[order], customer_ids[order]
+
+    return pd.DataFrame({
+        'order_id': sequence_ids(f'ORD-{partition_id(month, location_id)}-', np.arange(1, len(order) + 1), 6),
+        'order_timestamp': timestamps,
+        'location_id': location_id,
+        'customer_id': customer_ids,
+        'region': dealers.reindex(customer_ids).to_numpy(),
+    })
+
+
+class OrderItemSampler:
+    """受注伝票_item を生成する（品目は受注日に条件マスタで価格が有効なものから重複なしで選ぶ）"""
+
+    def __init__(self, price_conditions):
+        offered = price_conditions[['customer_id', 'product_id']].drop_duplicates().sort_values(['customer_id', 'product_id'])
+        offered_by_customer = offered.groupby('customer_id')['product_id'].agg(list)
+        self.customers = offered_by_customer.index
+        self.max_offered = offered_by_customer.map(len).max()
+        self.catalog = np.array(
+            [products + [''] * (self.max_offered - len(products)) for products in offered_by_customer], dtype=object
+        )
+        self.resolver = PriceResolver(price_conditions.astype({'selling_price_ex_tax': np.float64}))
+
+    def sample(self, orders, rng):
+        # 受注 × 取扱品目ごとに受注日の価格有無を判定
+        n = len(orders)
+        max_offered = self.max_offered
+        candidates = self.catalog[self.customers.get_indexer(orders['customer_id'])].reshape(n, max_offered)
+        order_timestamps = orders['order_timestamp'].to_numpy()
+        priced = ~np.isnan(self.resolver.resolve(
+            candidates.ravel(),
+            np.repeat(orders['customer_id'].to_numpy(dtype=object), max_offered),
+            np.repeat(order_timestamps.astype('datetime64[D]'), max_offered),
+        )).reshape(n, max_offered)
+
+        domestic = (orders['region'] == 'domestic').to_numpy()
+        line_low = np.where(domestic, ORDER_LINES_RANGE['domestic'][0], ORDER_LINES_RANGE['overseas'][0])
+        line_high = np.where(domestic, ORDER_LINES_RANGE['domestic'][1], ORDER_LINES_RANGE['overseas'][1])
+        qty_low = np.where(domestic, ORDER_QUANTITY_RANGE['domestic'][0], ORDER_QUANTITY_RANGE['overseas'][0])
+        qty_high = np.where(domestic, ORDER_QUANTITY_RANGE['domestic'][1], ORDER_QUANTITY_RANGE['overseas'][1])
+        total_quantity = uniform_integers(rng, qty_low, qty_high)
+        line_counts = np.minimum.reduce([uniform_integers(rng, line_low, line_high), total_quantity, priced.sum(axis=1)])
+
+        # 品目: 乱数キーの昇順で価格のある取扱品目を並べ替え、先頭から明細行数分を採用
+        max_lines = max(high for _, high in ORDER_LINES_RANGE.values())
+        sort_keys = np.where(priced, rng.random((n, max_offered)), 2.0)
+        picks = np.argsort(sort_keys, axis=1)[:, :max_lines]
+
+        # 数量: 各行に1台ずつ割り当て、残りを乱数の重みで按分（端数は1行目へ）
+        active = np.arange(max_lines)[None, :] < line_counts[:, None]
+        weights = rng.random((n, max_lines)) * active
+        remaining = total_quantity - line_counts
+        weight_totals = np.maximum(weights.sum(axis=1, keepdims=True), np.finfo(np.float64).tiny)
+        quantities = np.floor(remaining[:, None] * weights / weight_totals).astype(np.int64)
+        quantities[:, 0] += remaining - quantities.sum(axis=1)
+        quantities += active
+
+        # 納期（拠点ごとの日数範囲）
+        day_low = orders['location_id'].map({loc: r[0] for loc, r in DELIVERY_DAYS_BY_LOCATION.items()}).to_numpy(np.int64)
+        day_high = orders['location_id'].map({loc: r[1] for loc, r in DELIVERY_DAYS_BY_LOCATION.items()}).to_numpy(np.int64)
+        promised = order_timestamps + uniform_integers(rng, day_low, day_high).astype('timedelta64[D]')
+
+        order_index, line_index = np.nonzero(active)
+        return pd.DataFrame({
+            'order_id': orders['order_id'].to_numpy()[order_index],
+            'line_number': line_index + 1,
+            'product_id': candidates[order_index, picks[order_index, line_index]],
+            'quantity': quantities[order_index, line_index],
+            'promised_delivery_date': promised[order_index],
+            'pricing_date': order_timestamps[order_index].astype('datetime64[D]'),
+            '_order_index': order_index,
+        })
+
+
+# ---------- 出荷 ----------
+def generate_shipments(orders, order_items, product_names, shipment_suffix, rng):
+    """出荷伝票_header / 出荷伝票_item を生成（1受注を1～3回に分割出荷）
+
+    shipment_id は「運送会社コード-輸送モード-出荷予定日-{shipment_suffix}-連番」。
+    """
+    n = len(orders)
+    order_timestamps = orders['order_timestamp'].to_numpy()
+    promised = np.full(n, np.datetime64('NaT'), dtype='datetime64[s]')
+    promised[order_items['_order_index'].to_numpy()] = order_items['promised_delivery_date'].to_numpy()
+
+    # 出荷単位の属性
+    split_counts = rng.integers(1, 4, size=n)
+    order_index = np.repeat(np.arange(n), split_counts)
+    split_index = group_positions(order_index)
+    size = len(order_index)
+    carrier = rng.integers(0, len(SHIPMENT_CARRIERS), size=size)
+    mode = rng.integers(0, len(TRANSPORT_MODES), size=size)
+
+    days_between = (promised - order_timestamps).astype('timedelta64[D]').astype(np.int64)
+    days_between = np.where(days_between <= 0, 7, days_between)
+    ship_base = order_timestamps[order_index] + rng.integers(0, days_between[order_index]).astype('timedelta64[D]')
+    actual_ship = (
+        ship_base
+        + rng.integers(8, 17, size=size).astype('timedelta64[h]')
+        + rng.integers(0, 60, size=size).astype('timedelta64[m]')
+    ).astype('datetime64[s]')
+    arrival = (
+        actual_ship
+        + rng.integers(1, 7, size=size).astype('timedelta64[D]')
+        + rng.integers(8, 18, size=size).astype('timedelta64[h]')
+        + rng.integers(0, 60, size=size).astype('timedelta64[m]')
+    ).astype('datetime64[s]')
+    planned = ship_base.astype('datetime64[D]')
+
+    carrier_codes = np.array([code for _, code in SHIPMENT_CARRIERS], dtype=object)[carrier]
+    modes = np.array(TRANSPORT_MODES, dtype=object)[mode]
+    dates = pd.Series(np.datetime_as_string(planned), dtype=object).str.replace('-', '', regex=False).to_numpy()
+    prefixes = carrier_codes + '-' + modes + '-' + dates + f'-{shipment_suffix}'
+    shipment_ids = prefixes + '-' + pd.Series(group_positions(prefixes) + 1).astype(str).str.zfill(3).to_numpy()
+
+    shipment_headers = pd.DataFrame({
+        'shipment_id': shipment_ids,
+        'shipment_timestamp': to_timestamp_strings(actual_ship),
+        'location_id': orders['location_id'].to_numpy()[order_index],
+        'customer_id': orders['customer_id'].to_numpy()[order_index],
+    })
+
+    # 明細: 受注明細 × 分割出荷（最後の出荷に端数を加算、数量0の明細は作らない）
+    shipments = pd.DataFrame({'_order_index': order_index, '_shipment': np.arange(size)})
+    lines = order_items[['_order_index', 'order_id', 'line_number', 'product_id', 'quantity', 'promised_delivery_date']]
+    items = lines.merge(shipments, on='_order_index', how='inner')
+    shipment = items['_shipment'].to_numpy()
+    splits = split_counts[items['_order_index'].to_numpy()]
+    is_last = split_index[shipment] == splits - 1
+    total = items['quantity'].to_numpy()
+    quantity = total // splits + np.where(is_last, total % splits, 0)
+    keep = quantity > 0
+    items, shipment, quantity = items[keep], shipment[keep], quantity[keep]
+
+    shipment_items = pd.DataFrame({
+        'shipment_id': shipment_ids[shipment],
+        'order_id': items['order_id'].to_numpy(),
+        'line_number': items['line_number'].to_numpy(),
+        'product_id': items['product_id'].to_numpy(),
+        'product_name': items['product_id'].map(product_names).to_numpy(),
+        'quantity': quantity,
+        'carrier_name': np.array([name for name, _ in SHIPMENT_CARRIERS], dtype=object)[carrier[shipment]],
+        'transportation_mode': modes[shipment],
+        'planned_ship_date': to_date_strings(planned[shipment]),
+        'actual_ship_timestamp': to_timestamp_strings(actual_ship[shipment]),
+        'expected_ship_date': to_date_strings(planned[shipment]),
+        'actual_arrival_timestamp': to_timestamp_strings(arrival[shipment]),
+        'delivery_status': np.where(arrival[shipment] > items['promised_delivery_date'].to_numpy(), 'delayed', 'delivered'),
+    })
+    return shipment_headers, shipment_items
+
+
+# ---------- 調達 ----------
+class ProcurementGenerator:
+    """調達伝票_header / 調達伝票_item を1パーティション分生成する
+
+    purchase_order_id は「PO-{パーティションID}-連番6桁」で、直接材 → 間接材の順に採番する。
+    """
+
+    def __init__(self, bom, partners, locations, scale_factor):
+        # 部品カテゴリ・単価範囲はBOMの行ごとに一度だけ引いておく
+        prices = bom['component_product_id'].str.split('-').str[0].map(
+            lambda prefix: COMPONENT_PRICES.get(prefix, DEFAULT_COMPONENT_PRICE)
+        )
+        self.bom = bom[['product_id', 'site_id', 'component_product_id', 'bom_name']].assign(
+            component_quantity_per=bom['component_quantity_per'].astype(np.float64),
+            material_category=prices.str[0],
+            price_low=prices.str[1].astype(np.int64),
+            price_high=prices.str[2].astype(np.int64),
+        )
+        self.direct_suppliers = partners[partners['partner_category'] == 'tier1_supplier'][['partner_id', 'partner_name']]
+        self.mro_suppliers = partners[partners['partner_category'] == 'mro_supplier'][['partner_id', 'partner_name']]
+        self.addresses = locations.set_index('location_id').apply(
+            lambda row: f"{row['address']}, {row['city']}, {row['postal_code']}, {row['state_province']}", axis=1
+        )
+        self.mro_orders_per_location = MRO_ORDERS_PER_MONTH / (locations['location_type'] == 'manufacturing_plant').sum()
+        self.scale_factor = scale_factor
+
+    def _build(self, orders, items, account_group, order_status, payment_methods, month, location_id, first_number, rng):
+        """発注単位の属性（orders）と明細（items、_po 列で orders の行位置を参照）から伝票を組み立てる"""
+        n_items = len(items)
+        po = items['_po'].to_numpy()
+        order_dates = orders['order_date'].to_numpy().astype('datetime64[D]')
+
+        # 金額
+        quantity = items['quantity'].to_numpy(np.int64)
+        unit_price = items['unit_price_ex_tax'].to_numpy(np.int64)
+        subtotal = unit_price * quantity
+        tax = (subtotal * TAX_RATE).astype(np.int64)
+        subtotal_incl_tax = subtotal + tax
+        shipping_fee = rng.integers(500, 1501, size=n_items)
+        discount = rng.integers(0, (subtotal_incl_tax * 0.03).astype(np.int64) + 1)
+        total = subtotal_incl_tax + shipping_fee - discount
+
+        # 納期: 発注7日後に納品予定、出荷は2日前、実際の納品は±5日
+        expected_delivery = order_dates + 7
+        carrier = rng.integers(0, len(PROCUREMENT_CARRIERS), size=n_items)
+        receiver = rng.integers(0, len(RECEIVERS), size=n_items)
+        receivers = np.array(RECEIVERS, dtype=object)
+        carrier_prefixes = np.array([code for _, code in PROCUREMENT_CARRIERS], dtype=object)[carrier]
+        year = str(np.datetime64(month, 'Y'))
+
+        # 伝票番号（パーティション内の連番）
+        pid = partition_id(month, location_id)
+        numbers = pd.Series(np.arange(first_number, first_number + len(orders))).astype(str).str.zfill(6).to_numpy()
+        purchase_order_ids = f'PO-{pid}-' + numbers
+
+        procurement_items = pd.DataFrame({
+            'purchase_order_id': purchase_order_ids[po],
+            'line_number': group_positions(po) + 1,
+            'material_id': items['material_id'].to_numpy(),
+            'material_name': items['material_name'].to_numpy(),
+            'material_category': items['material_category'].to_numpy(),
+            'material_type': items['material_type'].to_numpy(),
+            'product_id': items['product_id'].to_numpy(),
+            'unspsc_code': items['unspsc_code'].to_numpy(),
+            'quantity': quantity,
+            'unit_price_ex_tax': unit_price,
+            'line_subtotal_incl_tax': subtotal_incl_tax,
+            'line_subtotal_ex_tax': subtotal,
+            'line_tax_amount': tax,
+            'line_tax_rate': TAX_RATE,
+            'line_shipping_fee_incl_tax': shipping_fee,
+            'line_discount_incl_tax': discount,
+            'line_total_incl_tax': total,
+            'reference_price_ex_tax': np.rint(unit_price * rng.uniform(0.9, 1.1, size=n_items)).astype(np.int64),
+            'purchase_rule': '該当無し',
+            'ship_date': to_date_strings(expected_delivery[po] - 2),
+            'shipping_status': 'delivered',
+            'carrier_tracking_number': carrier_prefixes + pd.Series(rng.integers(10**9, 10**10, size=n_items)).astype(str).to_numpy(),
+            'shipped_quantity': quantity,
+            'carrier_name': np.array([name for name, _ in PROCUREMENT_CARRIERS], dtype=object)[carrier],
+            'delivery_address': self.addresses.reindex(orders['location_id'].to_numpy()[po]).to_numpy(),
+            'receiving_status': 'received',
+            'received_quantity': quantity,
+            'received_date': to_date_strings(expected_delivery[po] + rng.integers(-5, 6, size=n_items)),
+            'receiver_name': receivers[receiver, 0],
+            'receiver_email': receivers[receiver, 1],
+            'cost_center': pick(rng, COST_CENTERS, n_items),
+            'project_code': f'PRJ-{year}-' + pick(rng, list('ABCD'), n_items),
+            'department_code': items['department_code'].to_numpy(),
+            'account_user': receivers[receiver, 0],
+            'user_email': receivers[receiver, 1],
+        })
+
+        # ヘッダー: 明細の金額を発注単位で合計
+        sums = pd.DataFrame({
+            'subtotal': subtotal, 'shipping': shipping_fee, 'tax': tax, 'discount': discount,
+        }).groupby(po).sum().reindex(np.arange(len(orders)), fill_value=0)
+        order_total = (sums['subtotal'] + sums['shipping'] + sums['tax'] - sums['discount']).to_numpy()
+
+        procurement_headers = pd.DataFrame({
+            'purchase_order_id': purchase_order_ids,
+            'order_date': to_date_strings(order_dates),
+            'expected_delivery_date': to_date_strings(expected_delivery),
+            'supplier_id': orders['supplier_id'].to_numpy(),
+            'supplier_name': orders['supplier_name'].to_numpy(),
+            'account_group': account_group,
+            'location_id': orders['location_id'].to_numpy(),
+            'purchase_order_number': f"PO{pid.replace('-', '')}" + numbers,
+            'currency': 'JPY',
+            'order_subtotal_ex_tax': sums['subtotal'].to_numpy(),
+            'shipping_fee_ex_tax': sums['shipping'].to_numpy(),
+            'tax_amount': sums['tax'].to_numpy(),
+            'discount_amount_incl_tax': sums['discount'].to_numpy(),
+            'order_total_incl_tax': order_total,
+            'order_status': order_status,
+            'approver': pick(rng, APPROVERS, len(orders)),
+            'payment_method': pick(rng, payment_methods, len(orders)),
+            'payment_confirmation_id': f'PAY-{pid}-' + numbers,
+            'payment_date': to_date_strings(order_dates + rng.integers(30, 41, size=len(orders))),
+            'payment_amount': order_total,
+        })
+        return procurement_headers, procurement_items
+
+    def direct(self, order_items, order_dates, month, location_id, rng):
+        """直接材: 受注明細1行（× BOMの生産拠点）ごとに1発注、BOMの構成部品を明細とする"""
+        lines = pd.DataFrame({
+            'product_id': order_items['product_id'].to_numpy(),
+            'quantity': order_items['quantity'].to_numpy(),
+            'order_date': order_dates,
+            '_line': np.arange(len(order_items)),
+        })
+        components = lines.merge(self.bom, on='product_id', how='inner')
+        orders = components.drop_duplicates(['_line', 'site_id'])[['_line', 'site_id', 'order_date']].reset_index(drop=True)
+        orders = orders.rename(columns={'site_id': 'location_id'})
+        components['_po'] = pd.MultiIndex.from_frame(orders[['_line', 'location_id']]).get_indexer(
+            pd.MultiIndex.from_frame(components[['_line', 'site_id']])
+        )
+
+        suppliers = self.direct_suppliers.iloc[rng.integers(0, len(self.direct_suppliers), size=len(orders))]
+        orders['supplier_id'] = suppliers['partner_id'].to_numpy()
+        orders['supplier_name'] = suppliers['partner_name'].to_numpy()
+
+        items = pd.DataFrame({
+            '_po': components['_po'].to_numpy(),
+            'material_id': components['component_product_id'].to_numpy(),
+            'material_name': components['bom_name'].to_numpy(),
+            'material_category': components['material_category'].to_numpy(),
+            'material_type': 'direct',
+            'product_id': components['product_id'].to_numpy(),
+            'unspsc_code': '',
+            'quantity': np.maximum((components['quantity'] * components['component_quantity_per']).astype(np.int64), 1),
+            'unit_price_ex_tax': uniform_integers(rng, components['price_low'].to_numpy(), components['price_high'].to_numpy()),
+            'department_code': 'DEPT-MFG',
+        }).sort_values('_po', kind='stable')
+        return self._build(orders, items, 'DIRECT_MATERIAL', 'received', ['bank_transfer'], month, location_id, 1, rng)
+
+    def indirect(self, month, location_id, first_number, rng):
+        """間接材（MRO）: 拠点の月間発注件数をポアソン分布で決め、カタログから1～4品目を発注"""
+        n_orders = rng.poisson(self.mro_orders_per_location * self.scale_factor)
+        days_in_month = int(((month + 1).astype('datetime64[D]') - month.astype('datetime64[D]')).astype(np.int64))
+        suppliers = self.mro_suppliers.iloc[rng.integers(0, len(self.mro_suppliers), size=n_orders)]
+        orders = pd.DataFrame({
+            'order_date': np.sort(month.astype('datetime64[D]') + rng.integers(0, days_in_month, size=n_orders)),
+            'location_id': location_id,
+            'supplier_id': suppliers['partner_id'].to_numpy(),
+            'supplier_name': suppliers['partner_name'].to_numpy(),
+        })
+
+        line_counts = uniform_integers(rng, MRO_LINES_RANGE[0], np.full(n_orders, MRO_LINES_RANGE[1]))
+        po = np.repeat(np.arange(n_orders), line_counts)
+        catalog = pd.DataFrame(MRO_ITEMS, columns=['material_id', 'material_name', 'material_category', 'unspsc_code', 'unit_price_ex_tax'])
+        chosen = catalog.iloc[rng.integers(0, len(catalog), size=len(po))].reset_index(drop=True)
+        items = chosen.assign(
+            _po=po,
+            material_type='indirect',
+            product_id='',
+            quantity=rng.integers(1, 11, size=len(po)),
+            department_code=pick(rng, MRO_DEPARTMENTS, len(po)),
+        )
+        return self._build(orders, items, 'MRO', 'completed', MRO_PAYMENT_METHODS, month, location_id, first_number, rng)
+
+
+# ---------- 給与 ----------
+def generate_employees(location_id, location_number, per_group, rng):
+    """拠点の社員マスタ（各部門 per_group 人）を生成"""
+    department_names = np.repeat(list(DEPARTMENTS), per_group)
+    numbers = np.arange(1, len(department_names) + 1)
+    codes = np.array([DEPARTMENTS[name][0] for name in department_names], dtype=object)
+    salary_low = np.array([DEPARTMENTS[name][3][0] for name in department_names])
+    salary_high = np.array([DEPARTMENTS[name][3][1] for name in department_names])
+    name_offset = location_number * len(department_names)
+    return pd.DataFrame({
+        'employee_id': f'EMP-{location_id}-' + codes + '-' + pd.Series(numbers).astype(str).str.zfill(3).to_numpy(),
+        'employee_name': np.array(JAPANESE_NAMES, dtype=object)[(name_offset + numbers - 1) % len(JAPANESE_NAMES)],
+        'department': department_names,
+        'position': [DEPARTMENTS[name][1][rng.integers(0, len(DEPARTMENTS[name][1]))] for name in department_names],
+        'base_salary': uniform_integers(rng, salary_low, salary_high),
+        'cost_center': [DEPARTMENTS[name][2] for name in department_names],
+    })
+
+
+def generate_payroll(employees, month, location_id, order_count, order_quantity, per_group, rng):
+    """給与テーブルを1パーティション分生成（製造部門の残業代は拠点の月間受注量を1人あたりに換算して連動）"""
+    size = len(employees)
+    overtime = draw_overtime(employees, np.full(size, order_count / per_group), np.full(size, order_quantity / per_group), rng)
+    return build_payroll(employees, month, overtime, f'PAY-{partition_id(month, location_id)}-', rng)
+
+
+def draw_overtime(employees, order_counts, order_quantities, rng):
+    """社員ごとの残業代（製造部門は受注件数・数量に連動し、受注のない月は最低限。他部門は固定範囲）
+
+    order_counts / order_quantities は社員ごとの所属拠点の月間受注件数・受注数量（1人あたり）。
+    乱数は必要な分だけ引く（受注のある社員がいれば連動分、受注のない社員がいれば最低限の分）。
+    """
+    size = len(employees)
+    ordered = order_counts > 0
+    overtime = np.zeros(size, dtype=np.int64)
+    if ordered.any():
+        linked = (
+            order_counts * rng.integers(3000, 5001, size=size)
+            + np.maximum(order_quantities - 50, 0) * rng.integers(300, 601, size=size)
+        )
+        overtime = np.where(ordered, np.clip(linked, 20000, 150000).astype(np.int64), overtime)
+    if not ordered.all():
+        overtime = np.where(ordered, overtime, rng.integers(20000, 40001, size=size))
+    is_manufacturing = (employees['department'] == 'manufacturing').to_numpy()
+    return np.where(is_manufacturing, overtime, rng.integers(OVERTIME_BASE_RANGE[0], OVERTIME_BASE_RANGE[1] + 1, size=size))
+
+
+def build_payroll(employees, month, overtime, id_prefix, rng):
+    """社員ごとの残業代に諸手当・控除を加えて1か月分の給与テーブルを作る"""
+    size = len(employees)
+    period = str(np.datetime64(month, 'M'))
+
+    # 諸手当（通勤・住宅・家族）
+    allowances = (
+        rng.integers(10000, 20001, size=size)
+        + np.where(rng.random(size) > 0.3, rng.integers(20000, 30001, size=size), 0)
+        + np.where(rng.random(size) > 0.4, rng.integers(10000, 20001, size=size), 0)
+    )
+
+    # 控除（健康保険5%・厚生年金9%・雇用保険0.6%・所得税4-8%・住民税5-7%）
+    salary = employees['base_salary'].to_numpy()
+    taxable = salary + overtime
+    deductions = (
+        (taxable * 0.05).astype(np.int64)
+        + (taxable * 0.09).astype(np.int64)
+        + (taxable * 0.006).astype(np.int64)
+        + (taxable * rng.uniform(0.04, 0.08, size=size)).astype(np.int64)
+        + (taxable * rng.uniform(0.05, 0.07, size=size)).astype(np.int64)
+    )
+
+    return pd.DataFrame({
+        'payroll_id': sequence_ids(id_prefix, np.arange(1, size + 1), 5),
+        'employee_id': employees['employee_id'].to_numpy(),
+        'employee_name': employees['employee_name'].to_numpy(),
+        'department': employees['department'].to_numpy(),
+        'position': employees['position'].to_numpy(),
+        'payment_period': period,
+        'base_salary': salary,
+        'overtime_pay': overtime,
+        'allowances': allowances,
+        'deductions': deductions,
+        'net_salary': salary + overtime + allowances - deductions,
+        'payment_date': str(month.astype('datetime64[D]') + 24),
+        'currency': 'JPY',
+        'employment_type': 'full_time',
+        'cost_center': employees['cost_center'].to_numpy(),
+    })
+
+
+# ---------- 在庫 ----------
+def generate_inventory(demand, product_names, rng):
+    """月次在庫履歴・現在在庫を生成（需要のある月は1か月分の在庫に補充、需要のない月は0～2台ずつ減少）
+
+    demand は (product_id, location_id, year_month) ごとの受注数量。
+    """
+    months = np.arange(START_DATE.astype('datetime64[M]'), INVENTORY_END_MONTH + 1)
+    month_labels = np.datetime_as_string(months)
+    pairs, demand_matrix = pivot_demand(demand, month_labels)
+
+    # 期首在庫は初月の需要（需要がなければ10～20台）、需要のない月の減少量は月ごとに全ペア分を引く
+    n_pairs = len(pairs)
+    initial = np.where(demand_matrix[:, 0] > 0, demand_matrix[:, 0], rng.integers(10, 21, size=n_pairs))
+    shrinkage = np.stack([rng.integers(0, 3, size=n_pairs) for _ in months], axis=1)
+    shrinkage[demand_matrix > 0] = 0
+    levels = simulate(demand_matrix, ReplenishmentPolicy.cover(), initial, shrinkage)['inventory']
+
+    pair_index = np.tile(np.arange(n_pairs), len(months))
+    month_index = np.repeat(np.arange(len(months)), n_pairs)
+    product_ids = pairs.get_level_values('product_id').to_numpy()
+    location_ids = pairs.get_level_values('location_id').to_numpy()
+    history = pd.DataFrame({
+        'product_id': product_ids[pair_index],
+        'product_name': pd.Series(product_ids[pair_index]).map(product_names).to_numpy(),
+        'location_id': location_ids[pair_index],
+        'year_month': month_labels[month_index],
+        'inventory_quantity': levels[pair_index, month_index],
+        'inventory_status': 'available',
+        'snapshot_date': to_date_strings((months[month_index] + 1).astype('datetime64[D]') - 1),
+    })
+
+    current_inventory = pd.DataFrame({
+        'product_id': product_ids,
+        'product_name': pd.Series(product_ids).map(product_names).to_numpy(),
+        'location_id': location_ids,
+        'inventory_quantity': levels[:, -1],
+        'inventory_status': 'available',
+        'last_updated_timestamp': INVENTORY_UPDATED_TIMESTAMP,
+    })
+    return history, current_inventory
+
+
+# ---------- パーティション ----------
+class PartitionGenerator:
+    """年月 × 拠点のパーティション単位で伝票を生成し、シャードCSVへ書き出す"""
+
+    def __init__(self, source_dir, shard_dir, scale_factor, seed, masters=None):
+        self.shard_dir = Path(shard_dir)
+        self.scale_factor = scale_factor
+        self.seed = seed
+        self.per_group = max(1, int(round(scale_factor)))
+
+        masters = masters or get_store(source_dir)
+        partners = masters.table('取引先マスタ')
+        locations = masters.table('拠点マスタ')
+        self.location_ids = list_locations(locations)
+        self.product_names = read_master(source_dir, 'ERP', '品目マスタ').set_index('product_id')['product_name']
+        self.dealers = partners[partners['partner_id'].isin(DEALER_LOCATION_MAP.keys())].set_index('partner_id')['region']
+        self.order_items = OrderItemSampler(read_master(source_dir, 'ERP', '条件マスタ'))
+        self.procurement = ProcurementGenerator(masters.bom, partners, locations, scale_factor)
+        self._employees = {}
+
+    def employees(self, location_id):
+        """拠点の社員マスタ（全年月で共通にするため拠点ごとの乱数から生成）"""
+        if location_id not in self._employees:
+            number = self.location_ids.index(location_id)
+            rng = make_rng(self.seed, STREAM_EMPLOYEES, number)
+            self._employees[location_id] = generate_employees(location_id, number, self.per_group, rng)
+        return self._employees[location_id]
+
+    def shard_path(self, system, table, pid):
+        return self.shard_dir / system / table / f'{pid}.csv'
+
+    def _write_shard(self, system, table, pid, df, columns):
+        path = self.shard_path(system, table, pid)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df[columns].to_csv(path, index=False, header=False, encoding='utf-8')
+
+    def generate(self, month, location_id):
+        """1パーティション分を生成して書き出し、テーブルごとの件数と品目別の受注数量を返す"""
+        month = np.datetime64(month, 'M')
+        pid = partition_id(month, location_id)
+        rng = make_rng(self.seed, STREAM_PARTITION, month_ordinal(month), self.location_ids.index(location_id))
+
+        # 受注
+        dealers = self.dealers[self.dealers.index.map(DEALER_LOCATION_MAP) == location_id]
+        orders = generate_order_headers(dealers, month, location_id, self.scale_factor, rng)
+        order_items = self.order_items.sample(orders, rng)
+
+        # 出荷・輸送コスト
+        shipment_headers, shipment_items = generate_shipments(orders, order_items, self.product_names, pid, rng)
+        transportation_costs = build_transportation_costs(
+            shipment_headers, shipment_items, rng, cost_id_prefix=f'COST-{pid}'
+        )
+
+        # 調達（直接材 → 間接材の順に採番）
+        order_dates = orders['order_timestamp'].to_numpy()[order_items['_order_index'].to_numpy()].astype('datetime64[D]')
+        direct_headers, direct_items = self.procurement.direct(order_items, order_dates, month, location_id, rng)
+        mro_headers, mro_items = self.procurement.indirect(month, location_id, len(direct_headers) + 1, rng)
+        procurement_headers = pd.concat([direct_headers, mro_headers], ignore_index=True)
+        procurement_items = pd.concat([direct_items, mro_items], ignore_index=True)
+
+        # 給与
+        payroll = generate_payroll(
+            self.employees(location_id), month, location_id, len(orders), int(order_items['quantity'].sum()), self.per_group, rng
+        )
+
+        tables = {
+            ('ERP', '受注伝票_header'): orders.assign(order_timestamp=to_timestamp_strings(orders['order_timestamp'])),
+            ('ERP', '受注伝票_item'): order_items.assign(
+                promised_delivery_date=to_timestamp_strings(order_items['promised_delivery_date']),
+                pricing_date=to_date_strings(order_items['pricing_date']),
+            ),
+            ('MES', '出荷伝票_header'): shipment_headers,
+            ('MES', '出荷伝票_item'): shipment_items,
+            ('TMS', '輸送コスト'): transportation_costs,
+            ('P2P', '調達伝票_header'): procurement_headers,
+            ('P2P', '調達伝票_item'): procurement_items,
+            ('HR', '給与テーブル'): payroll,
+        }
+        counts = {}
+        for system, table, columns, _ in PARTITIONED_TABLES:
+            df = tables[(system, table)]
+            self._write_shard(system, table, pid, df, columns)
+            counts[f'{system}/{table}'] = len(df)
+
+        demand = pd.DataFrame({
+            'product_id': order_items['product_id'].to_numpy(),
+            'location_id': location_id,
+            'year_month': str(month),
+            'quantity': order_items['quantity'].to_numpy(),
+        }).groupby(['product_id', 'location_id', 'year_month'], as_index=False)['quantity'].sum()
+        return counts, demand
+
+
+def list_locations(locations):
+    """伝票を生成する拠点（製造拠点）の一覧（IDが出力順に昇順となるよう拠点IDでソート）"""
+    return sorted(locations.loc[locations['location_type'] == 'manufacturing_plant', 'location_id'])
+
+
+def list_partitions(locations):
+    """(年月, 拠点) のパーティション一覧（年月 → 拠点IDの順）"""
+    months = np.arange(START_DATE.astype('datetime64[M]'), PAYROLL_END_MONTH + 1)
+    return [(str(month), location_id) for month in months for location_id in list_locations(locations)]
+
+
+_worker = None
+
+
+def _init_worker(source_dir, shard_dir, scale_factor, seed, snapshot_dir=None):
+    global _worker
+    masters = MasterDataStore.attach(snapshot_dir, source_dir) if snapshot_dir else None
+    _worker = PartitionGenerator(source_dir, shard_dir, scale_factor, seed, masters)
+
+
+def _generate_partition(partition):
+    return _worker.generate(*partition)
+
+
+def merge_shards(shard_dir, output_dir, partitions):
+    """シャードCSVをパーティション順に連結し、テーブルごとに1ファイルにする"""
+    for system, table, columns, encoding in PARTITIONED_TABLES:
+        target = Path(output_dir) / system / f'{table}.csv'
+        target.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(columns=columns).to_csv(target, index=False, encoding=encoding)
+        with open(target, 'ab') as out:
+            for month, location_id in partitions:
+                with open(Path(shard_dir) / system / table / f'{partition_id(np.datetime64(month), location_id)}.csv', 'rb') as f:
+                    shutil.copyfileobj(f, out)
+
+
+# ---------- 全体 ----------
+def default_output_dir(scale_factor):
+    return GENERATED_DIR / f'SF{scale_factor:g}' / 'Bronze'
+
+
+def generate_bronze(output_dir, scale_factor=1.0, seed=42, source_dir=SOURCE_DIR, workers=None, keep_shards=False):
+    """Bronze層一式を output_dir に生成し、テーブルごとの件数を返す"""
+    output_dir = Path(output_dir)
+    shard_dir = output_dir / SHARD_DIR_NAME
+    shutil.rmtree(shard_dir, ignore_errors=True)
+
+    # マスタ
+    for system, table in MASTER_TABLES:
+        target = output_dir / system / f'{table}.csv'
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Path(source_dir) / system / f'{table}.csv', target)
+
+    # 伝票（パーティション単位で並列生成）
+    masters = get_store(source_dir)
+    partitions = list_partitions(masters.table('拠点マスタ'))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(source_dir, shard_dir, scale_factor, seed)
+        results = [_generate_partition(partition) for partition in partitions]
+    else:
+        # ワーカーはマスタをCSVから読み直さず、スナップショットをメモリマップで共有する
+        snapshot_dir = masters.export(shard_dir / '_master')
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(source_dir, shard_dir, scale_factor, seed, snapshot_dir)) as executor:
+            results = list(executor.map(_generate_partition, partitions))
+
+    merge_shards(shard_dir, output_dir, partitions)
+    if not keep_shards:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    counts = {f'{system}/{table}': 0 for system, table, _, _ in PARTITIONED_TABLES}
+    for partition_counts, _ in results:
+        for table, count in partition_counts.items():
+            counts[table] += count
+
+    # 在庫（全パーティションの受注数量から拠点×品目ごとに月を順に進める）
+    product_names = read_master(source_dir, 'ERP', '品目マスタ').set_index('product_id')['product_name']
+    demand = pd.concat([partition_demand for _, partition_demand in results], ignore_index=True)
+    inventory_history, current_inventory = generate_inventory(demand, product_names, make_rng(seed, STREAM_INVENTORY))
+    inventory_history[INVENTORY_HISTORY_COLUMNS].to_csv(output_dir / 'WMS' / '月次在庫履歴.csv', index=False, encoding='utf-8-sig')
+    current_inventory[CURRENT_INVENTORY_COLUMNS].to_csv(output_dir / 'WMS' / '現在在庫.csv', index=False, encoding='utf-8-sig')
+    counts['WMS/月次在庫履歴'] = len(inventory_history)
+    counts['WMS/現在在庫'] = len(current_inventory)
+
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bronze層サンプルデータの一括生成（スケールファクター対応・並列生成）')
+    parser.add_argument('--scale-factor', type=float, default=1.0, help='伝票系テーブルの件数倍率（1～1000）')
+    parser.add_argument('--seed', type=int, default=42, help='乱数シード')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（既定: CPUコア数）')
+    parser.add_argument('--output-dir', type=Path, default=None, help='出力先（既定: data/Generated/SF<N>/Bronze）')
+    parser.add_argument('--source-dir', type=Path, default=SOURCE_DIR, help='マスタのコピー元Bronze層')
+    parser.add_argument('--keep-shards', action='store_true', help=f'パーティションごとのシャードCSV（{SHARD_DIR_NAME}/）を残す')
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or default_output_dir(args.scale_factor)
+    print(f'Bronze層データを生成中... (scale factor {args.scale_factor:g}, seed {args.seed})')
+    start = time.perf_counter()
+    counts = generate_bronze(output_dir, args.scale_factor, args.seed, args.source_dir, args.workers, args.keep_shards)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'テーブル':<28} {'行数':>14}")
+    for table, count in counts.items():
+        print(f'{table:<28} {count:>14,}')
+    print(f'\n合計 {sum(counts.values()):,}行 ({elapsed:.2f}秒) → {output_dir}')
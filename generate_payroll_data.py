@@ -0,0 +1,145 @@
+"""
+給与テーブルの生成（data/backup/scripts/generate_payroll_data.py のベクトル化版）
+製造部門の残業代を拠点 × 年月の受注量に連動させて、社員 × 月の給与テーブルを生成する
+
+- 受注量は 受注伝票_header / 受注伝票_item から 拠点 × 年月 の負荷テーブル（受注件数・受注数量）を
+  1回の集計で作り、拠点 × 月の配列として参照する（注文ごとに明細全体を走査しない）
+- 社員マスタ・残業代・諸手当・控除の計算は generate_bronze_data と共通で、同じ --seed と --employees-per-group からは
+  generate_bronze_data と同じ社員マスタになる
+- 給与は月ごとに全社員分をまとめて計算してCSVに追記し、部門・コストセンター別の集計も月ごとの集計を足し合わせて求める
+  （社員10万人 × 10年でも1か月分ずつしか保持しない）
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR, load_table
+from calendar_dimension import to_year_month
+from generate_bronze_data import (
+    PAYROLL_COLUMNS, PAYROLL_END_MONTH, START_DATE, STREAM_EMPLOYEES,
+    build_payroll, draw_overtime, generate_employees, list_locations, make_rng, month_ordinal,
+)
+from master_data import get_store
+
+# 月ごとの給与の乱数ストリーム（generate_bronze_data の STREAM_* と重ならない種別）
+STREAM_PAYROLL = 3
+
+# 給与の金額列（集計対象）
+AMOUNT_COLUMNS = ['base_salary', 'overtime_pay', 'allowances', 'deductions', 'net_salary']
+
+
+# ---------- 負荷テーブル ----------
+def build_workload(order_headers, order_items):
+    """拠点 × 年月の受注件数・受注数量（location_id, year_month, order_count, total_quantity）"""
+    quantities = order_items.groupby('order_id')['quantity'].sum()
+    orders = pd.DataFrame({
+        'location_id': order_headers['location_id'],
+        'year_month': to_year_month(order_headers['order_timestamp']),
+        'quantity': order_headers['order_id'].map(quantities).fillna(0),
+    })
+    return orders.groupby(['location_id', 'year_month'], as_index=False).agg(
+        order_count=('quantity', 'size'), total_quantity=('quantity', 'sum')
+    )
+
+
+def load_workload(bronze_dir=BRONZE_DIR):
+    headers = load_table('ERP', '受注伝票_header', ['order_id', 'order_timestamp', 'location_id'], bronze_dir)
+    items = load_table('ERP', '受注伝票_item', ['order_id', 'quantity'], bronze_dir)
+    return build_workload(headers, items)
+
+
+# ---------- 給与 ----------
+class PayrollGenerator:
+    """社員マスタと負荷テーブルから月ごとの給与テーブルを生成する"""
+
+    def __init__(self, location_ids, workload, months, per_group=1, seed=42):
+        self.location_ids = list(location_ids)
+        self.months = np.asarray(months, dtype='datetime64[M]')
+        self.per_group = per_group
+        self.seed = seed
+        employees = [
+            generate_employees(location_id, number, per_group, make_rng(seed, STREAM_EMPLOYEES, number))
+            for number, location_id in enumerate(self.location_ids)
+        ]
+        self.employees = pd.concat(employees, ignore_index=True)
+        self._locations = np.repeat(np.arange(len(employees)), [len(frame) for frame in employees])
+
+        # 拠点 × 月の受注件数・受注数量（1人あたりに換算）
+        shape = (len(self.location_ids), len(self.months))
+        self.order_counts = np.zeros(shape)
+        self.order_quantities = np.zeros(shape)
+        rows = pd.Index(self.location_ids).get_indexer(workload['location_id'])
+        columns = pd.Index(np.datetime_as_string(self.months)).get_indexer(workload['year_month'])
+        found = (rows >= 0) & (columns >= 0)
+        self.order_counts[rows[found], columns[found]] = workload['order_count'].to_numpy()[found] / per_group
+        self.order_quantities[rows[found], columns[found]] = workload['total_quantity'].to_numpy()[found] / per_group
+
+    def generate_month(self, index):
+        """months[index] の全社員分の給与テーブル"""
+        month = self.months[index]
+        rng = make_rng(self.seed, STREAM_PAYROLL, month_ordinal(month))
+        overtime = draw_overtime(
+            self.employees, self.order_counts[self._locations, index], self.order_quantities[self._locations, index], rng
+        )
+        return build_payroll(self.employees, month, overtime, f'PAY-{month}-', rng)
+
+    def generate(self, output):
+        """全月の給与テーブルを output に書き出し、部門 × コストセンター別の集計を返す"""
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(columns=PAYROLL_COLUMNS).to_csv(output, index=False, encoding='utf-8-sig')
+        summaries = []
+        for index in range(len(self.months)):
+            payroll = self.generate_month(index)
+            payroll[PAYROLL_COLUMNS].to_csv(output, mode='a', header=False, index=False, encoding='utf-8')
+            summaries.append(summarize_payroll(payroll, ['department', 'cost_center']))
+        return pd.concat(summaries).groupby(['department', 'cost_center']).sum()
+
+
+# ---------- 集計 ----------
+def summarize_payroll(payroll, by=('department',)):
+    """給与テーブルを by の列ごとに集計する（金額列の合計・総支給額 gross_salary・件数 records）"""
+    amounts = payroll[AMOUNT_COLUMNS].astype(np.float64)
+    amounts['gross_salary'] = amounts['base_salary'] + amounts['overtime_pay'] + amounts['allowances']
+    amounts['records'] = 1
+    return amounts.groupby([payroll[column] for column in by]).sum()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='給与テーブルの生成（製造部門の残業代は拠点 × 年月の受注量に連動）')
+    parser.add_argument('--output', type=Path, required=True, help='給与テーブルCSVの出力先')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR, help='受注伝票・拠点マスタを読むBronze層')
+    parser.add_argument('--employees-per-group', type=int, default=1, help='拠点 × 部門ごとの社員数')
+    parser.add_argument('--start-month', default=str(START_DATE.astype('datetime64[M]')))
+    parser.add_argument('--end-month', default=str(PAYROLL_END_MONTH))
+    parser.add_argument('--seed', type=int, default=42, help='乱数シード')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    workload = load_workload(args.bronze_dir)
+    location_ids = list_locations(get_store(args.bronze_dir).table('拠点マスタ'))
+    months = np.arange(np.datetime64(args.start_month, 'M'), np.datetime64(args.end_month, 'M') + 1)
+    generator = PayrollGenerator(location_ids, workload, months, args.employees_per_group, args.seed)
+    summary = generator.generate(args.output)
+    elapsed = time.perf_counter() - start
+
+    records = int(summary['records'].sum())
+    total = summary['net_salary'].sum()
+    print(f'給与データ生成完了 ({elapsed:.2f}秒) → {args.output}')
+    print(f'  社員数: {len(generator.employees):,}名（拠点 {len(location_ids)} × 部門 × {args.employees_per_group}名）')
+    print(f'  負荷テーブル: {len(workload):,}行（拠点 × 年月）')
+    print(f'  総レコード数: {records:,}件')
+    print(f'  対象期間: {months[0]} ~ {months[-1]} ({len(months)}ヶ月)')
+    print(f'  総支給額: ¥{total:,.0f}')
+    print(f'  平均手取り額: ¥{total / records:,.0f}')
+
+    print('\n【部門別統計】')
+    for department, row in summary.groupby(level='department').sum().iterrows():
+        print(f"  {department}: 平均¥{row['net_salary'] / row['records']:,.0f}/月 (総支給¥{row['net_salary']:,.0f})")
+    print('\n【コストセンター別統計】')
+    for cost_center, row in summary.groupby(level='cost_center').sum().iterrows():
+        print(f"  {cost_center}: 人件費¥{row['gross_salary']:,.0f} ({int(row['records']):,}件)")
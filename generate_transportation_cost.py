@@ -1,161 +1,153 @@
-import csv
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import random
-import calendar
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calendar_dimension import get_calendar
+from rate_card import DEFAULT_RATE_CARD
 
 # ファイルパス
 shipment_header_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\MES\出荷伝票_header.csv'
 shipment_item_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\MES\出荷伝票_item.csv'
 output_file = r'h:\.shortcut-targets-by-id\1EW-r396_YsvYt5XwQAE9H9pbljJyc7JH\共有\Step2\ForStep2\data\Bronze\TMS\輸送コスト.csv'
 
-# 出荷伝票データを読み込み
-with open(shipment_header_file, 'r', encoding='utf-8-sig') as f:
-    reader = csv.DictReader(f)
-    shipment_headers = list(reader)
-
-with open(shipment_item_file, 'r', encoding='utf-8-sig') as f:
-    reader = csv.DictReader(f)
-    shipment_items = list(reader)
-
-# 輸送モード別の基本料金範囲（JPY）
-transport_cost_ranges = {
-    'road': (50000, 150000),
-    'sea': (100000, 300000),
-    'air': (200000, 500000)
-}
-
-# 1台あたりの追加コスト範囲
-cost_per_unit = (20000, 30000)
-
-# 緊急輸送費率（通常運賃の30～50%）
-expedite_rate_range = (0.30, 0.50)
-
-def get_last_day_of_month(date):
-    """指定された日付の月の最終日を返す"""
-    last_day = calendar.monthrange(date.year, date.month)[1]
-    return datetime(date.year, date.month, last_day)
-
-def calculate_freight_cost(transportation_mode, quantity):
-    """運賃を計算"""
-    base_cost = random.randint(transport_cost_ranges[transportation_mode][0], 
-                                transport_cost_ranges[transportation_mode][1])
-    quantity_cost = int(quantity) * random.randint(cost_per_unit[0], cost_per_unit[1])
-    return base_cost + quantity_cost
-
-def calculate_expedite_cost(freight_cost):
-    """緊急輸送費を計算（通常運賃の30～50%）"""
-    expedite_rate = random.uniform(expedite_rate_range[0], expedite_rate_range[1])
-    return int(freight_cost * expedite_rate)
-
-# 輸送コストレコードを生成
-transportation_costs = []
-cost_counter_by_year = {}
-
-print(f'出荷伝票ヘッダー数: {len(shipment_headers)}')
-print(f'出荷伝票明細数: {len(shipment_items)}')
-print()
-
-# 各出荷伝票について処理
-for shipment_header in shipment_headers:
-    shipment_id = shipment_header['shipment_id']
-    location_id = shipment_header['location_id']
-    shipment_timestamp = datetime.strptime(shipment_header['shipment_timestamp'], '%Y-%m-%d %H:%M:%S')
-    
-    # 請求日は出荷日の翌月末日
-    billing_date = get_last_day_of_month(shipment_timestamp + relativedelta(months=1))
-    billing_year = billing_date.year
-    
-    # 年度別にカウンターを初期化
-    if billing_year not in cost_counter_by_year:
-        cost_counter_by_year[billing_year] = 1
-    
-    # この出荷に紐づく明細を取得
-    related_items = [item for item in shipment_items if item['shipment_id'] == shipment_id]
-    
-    if not related_items:
-        continue
-    
-    # 最初の明細から輸送モードを取得（同一出荷IDは同じ輸送モード）
-    transportation_mode = related_items[0]['transportation_mode']
-    delivery_status = related_items[0]['delivery_status']
-    
-    # 総出荷数量を計算
-    total_quantity = sum(int(item['quantity']) for item in related_items)
-    
-    # 運賃（freight）を計算
-    freight_cost = calculate_freight_cost(transportation_mode, total_quantity)
-    
-    # cost_idを生成
-    cost_id = f'COST-{billing_year}-{cost_counter_by_year[billing_year]:03d}'
-    cost_counter_by_year[billing_year] += 1
-    
-    # freightレコードを追加
-    freight_record = {
-        'cost_id': cost_id,
-        'shipment_id': shipment_id,
-        'location_id': location_id,
+# 輸送コストCSVの列順
+fieldnames = ['cost_id', 'shipment_id', 'location_id', 'cost_type', 'cost_amount', 'currency', 'billing_date']
+
+
+def get_billing_dates(shipment_timestamps):
+    """出荷日時の配列から請求日（出荷日の翌月末日）の配列を返す（カレンダーの next_month_end を引く）"""
+    return get_calendar().next_month_end(shipment_timestamps).astype('datetime64[D]')
+
+
+def group_shipment_items(shipment_items):
+    """出荷伝票_itemを shipment_id 単位に1パスで集約する
+
+    同一出荷IDの明細は同じ輸送モード・運送会社のため、輸送モード・運送会社と配送状況は最初の明細から取得する。
+    """
+    return shipment_items.groupby('shipment_id', sort=False).agg(
+        transportation_mode=('transportation_mode', 'first'),
+        carrier_name=('carrier_name', 'first'),
+        delivery_status=('delivery_status', 'first'),
+        total_quantity=('quantity', 'sum'),
+    )
+
+
+def build_transportation_costs(shipment_headers, shipment_items, rng=None, cost_id_prefix=None, rate_card=DEFAULT_RATE_CARD):
+    """出荷伝票から輸送コストレコードを生成する
+
+    明細は shipment_id で一度だけ集約し、ヘッダーとはハッシュ結合するため出荷件数に対して線形時間で動く。
+    レコード順・cost_id の採番（請求年ごとの連番、freight → expedite の順）は従来と同じ。
+    cost_id_prefix を指定した場合は「{cost_id_prefix}-{連番6桁}」で採番する（パーティション単位の並列生成用）。
+    運賃・緊急輸送費は rate_card（輸送モード × 運送会社 × 出荷拠点の料金表）で出荷全体をまとめて計算する。
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    grouped = group_shipment_items(shipment_items)
+
+    # 明細が存在しない出荷はスキップ（ヘッダー順を維持したまま内部結合）
+    shipments = shipment_headers[['shipment_id', 'location_id', 'shipment_timestamp']].join(
+        grouped, on='shipment_id', how='inner'
+    )
+    shipments = shipments.reset_index(drop=True)
+
+    billing_dates = get_billing_dates(pd.to_datetime(shipments['shipment_timestamp'], format='%Y-%m-%d %H:%M:%S'))
+    freight_costs, expedite_costs = rate_card.rate(shipments, rng)
+
+    freight = pd.DataFrame({
+        'shipment_id': shipments['shipment_id'],
+        'location_id': shipments['location_id'],
         'cost_type': 'freight',
-        'cost_amount': freight_cost,
-        'currency': 'JPY',
-        'billing_date': billing_date.strftime('%Y-%m-%d')
-    }
-    transportation_costs.append(freight_record)
-    
+        'cost_amount': freight_costs,
+        'billing_date': billing_dates,
+        '_position': np.arange(len(shipments)) * 2,
+    })
+
     # delivery_status が delayed の場合、緊急輸送費（expedite）を追加
-    if delivery_status == 'delayed':
-        expedite_cost = calculate_expedite_cost(freight_cost)
-        
-        expedite_cost_id = f'COST-{billing_year}-{cost_counter_by_year[billing_year]:03d}'
-        cost_counter_by_year[billing_year] += 1
-        
-        expedite_record = {
-            'cost_id': expedite_cost_id,
-            'shipment_id': shipment_id,
-            'location_id': location_id,
-            'cost_type': 'expedite',
-            'cost_amount': expedite_cost,
-            'currency': 'JPY',
-            'billing_date': billing_date.strftime('%Y-%m-%d')
-        }
-        transportation_costs.append(expedite_record)
-
-# CSVに書き込み
-with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
-    fieldnames = ['cost_id', 'shipment_id', 'location_id', 'cost_type', 'cost_amount', 'currency', 'billing_date']
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(transportation_costs)
-
-# 統計情報を出力
-print(f'輸送コストデータ生成完了')
-print(f'  総レコード数: {len(transportation_costs):,}件')
-print()
-
-# cost_type別の集計
-freight_records = [r for r in transportation_costs if r['cost_type'] == 'freight']
-expedite_records = [r for r in transportation_costs if r['cost_type'] == 'expedite']
-
-total_freight = sum(r['cost_amount'] for r in freight_records)
-total_expedite = sum(r['cost_amount'] for r in expedite_records)
-total_cost = total_freight + total_expedite
-
-print(f'【コストタイプ別集計】')
-print(f'  freight（運賃）: {len(freight_records):,}件, 合計¥{total_freight:,}')
-print(f'  expedite（緊急輸送費）: {len(expedite_records):,}件, 合計¥{total_expedite:,}')
-print(f'  総輸送コスト: ¥{total_cost:,}')
-print(f'  緊急輸送費率: {(total_expedite / total_cost * 100):.2f}%')
-print()
-
-# 年度別集計
-print(f'【年度別集計】')
-for year in sorted(cost_counter_by_year.keys()):
-    year_records = [r for r in transportation_costs if r['billing_date'].startswith(str(year))]
-    year_total = sum(r['cost_amount'] for r in year_records)
-    print(f'  {year}年: {len(year_records):,}件, 合計¥{year_total:,}')
-print()
-
-# 輸送モード別集計（サンプル）
-print(f'【サンプルデータ（最初の10件）】')
-for i, record in enumerate(transportation_costs[:10]):
-    print(f"  {record['cost_id']}: {record['shipment_id']} - {record['cost_type']} ¥{record['cost_amount']:,} (請求日: {record['billing_date']})")
+    delayed = (shipments['delivery_status'] == 'delayed').to_numpy()
+    expedite = pd.DataFrame({
+        'shipment_id': shipments['shipment_id'].to_numpy()[delayed],
+        'location_id': shipments['location_id'].to_numpy()[delayed],
+        'cost_type': 'expedite',
+        'cost_amount': expedite_costs[delayed],
+        'billing_date': billing_dates[delayed],
+        '_position': np.flatnonzero(delayed) * 2 + 1,
+    })
+
+    costs = pd.concat([freight, expedite], ignore_index=True).sort_values('_position', kind='stable')
+
+    # cost_idを生成（請求年ごとの連番、またはプレフィックス内の連番）
+    if cost_id_prefix is None:
+        billing_year = costs['billing_date'].dt.year.astype(str)
+        sequence = costs.groupby(billing_year, sort=False).cumcount() + 1
+        costs['cost_id'] = 'COST-' + billing_year + '-' + sequence.astype(str).str.zfill(3)
+    else:
+        sequence = pd.Series(np.arange(1, len(costs) + 1), index=costs.index)
+        costs['cost_id'] = cost_id_prefix + '-' + sequence.astype(str).str.zfill(6)
+    costs['currency'] = 'JPY'
+    costs['billing_date'] = costs['billing_date'].dt.strftime('%Y-%m-%d')
+
+    return costs[fieldnames].reset_index(drop=True)
+
+
+def print_summary(transportation_costs):
+    """統計情報を出力"""
+    print(f'輸送コストデータ生成完了')
+    print(f'  総レコード数: {len(transportation_costs):,}件')
+    print()
+
+    # cost_type別の集計
+    by_type = transportation_costs.groupby('cost_type')['cost_amount'].agg(['count', 'sum'])
+    freight_count, total_freight = by_type.loc['freight'] if 'freight' in by_type.index else (0, 0)
+    expedite_count, total_expedite = by_type.loc['expedite'] if 'expedite' in by_type.index else (0, 0)
+    total_cost = total_freight + total_expedite
+
+    print(f'【コストタイプ別集計】')
+    print(f'  freight（運賃）: {freight_count:,}件, 合計¥{total_freight:,}')
+    print(f'  expedite（緊急輸送費）: {expedite_count:,}件, 合計¥{total_expedite:,}')
+    print(f'  総輸送コスト: ¥{total_cost:,}')
+    print(f'  緊急輸送費率: {(total_expedite / total_cost * 100):.2f}%')
+    print()
+
+    # 年度別集計
+    print(f'【年度別集計】')
+    by_year = transportation_costs.groupby(transportation_costs['billing_date'].str[:4])['cost_amount'].agg(['count', 'sum'])
+    for year, row in by_year.iterrows():
+        print(f'  {year}年: {row["count"]:,}件, 合計¥{row["sum"]:,}')
+    print()
+
+    # 輸送モード別集計（サンプル）
+    print(f'【サンプルデータ（最初の10件）】')
+    for record in transportation_costs.head(10).itertuples(index=False):
+        print(f"  {record.cost_id}: {record.shipment_id} - {record.cost_type} ¥{record.cost_amount:,} (請求日: {record.billing_date})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='出荷伝票からの輸送コスト生成')
+    parser.add_argument('--bronze-dir', type=Path, default=None,
+                        help='出荷伝票（MES）を読み、輸送コスト（TMS）を書き出すBronze層（既定: 共有ドライブ）')
+    parser.add_argument('--seed', type=int, default=None, help='乱数シード（既定: 実行ごとに異なる）')
+    args = parser.parse_args()
+    if args.bronze_dir:
+        shipment_header_file = args.bronze_dir / 'MES' / '出荷伝票_header.csv'
+        shipment_item_file = args.bronze_dir / 'MES' / '出荷伝票_item.csv'
+        output_file = args.bronze_dir / 'TMS' / '輸送コスト.csv'
+
+    # 出荷伝票データを読み込み
+    shipment_headers = pd.read_csv(shipment_header_file, encoding='utf-8-sig', dtype=str)
+    shipment_items = pd.read_csv(shipment_item_file, encoding='utf-8-sig', dtype=str)
+    shipment_items['quantity'] = shipment_items['quantity'].astype(np.int64)
+
+    print(f'出荷伝票ヘッダー数: {len(shipment_headers)}')
+    print(f'出荷伝票明細数: {len(shipment_items)}')
+    print()
+
+    # 輸送コストレコードを生成
+    transportation_costs = build_transportation_costs(shipment_headers, shipment_items, np.random.default_rng(args.seed))
+
+    # CSVに書き込み
+    transportation_costs.to_csv(output_file, index=False, encoding='utf-8-sig')
+
+    print_summary(transportation_costs)
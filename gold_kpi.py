@@ -0,0 +1,381 @@
+"""
+Gold層KPIの一括算出エンジン
+Bronze層から data_definition_gold.md に定義された全Goldテーブルを1回の実行で算出する
+受注×価格、調達×製品、出荷×受注×輸送コストの結合はSilver層（silver_layer）の明細ファクトを読み、KPI間で共有する
+
+金額・計上月の前提
+- 売上: 受注数量 × 条件マスタの selling_price_ex_tax（税抜）。計上月は受注日時の年月
+- 売上原価: 調達伝票_item の直接材 line_subtotal_ex_tax。計上月は調達伝票_header の発注日の年月
+- 販売管理費: 間接材 line_subtotal_ex_tax + 給与（基本給 + 残業代 + 諸手当）。給与の計上月は payment_period
+- 在庫金額: 月次在庫履歴の月末在庫数量 × 月末時点の list_price_ex_tax
+- 完成品別の販売管理費は cost_allocation の配賦エンジンで配賦する（既定は全コストプールを当月の売上構成比で配賦）
+"""
+
+import argparse
+import re
+import time
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR
+from calendar_dimension import to_year_month
+from pipeline_trace import span, traced
+from price_resolver import PriceResolver
+from silver_layer import COST_COLUMNS, get_silver
+
+GOLD_DIR = Path(__file__).resolve().parent / 'data' / 'Gold'
+# 算出したGoldテーブルの既定の出力先（data/Gold のサンプルCSVは上書きしない）
+GENERATED_GOLD_DIR = Path(__file__).resolve().parent / 'data' / 'Generated' / 'Gold'
+GOLD_DEFINITION_FILE = Path(__file__).resolve().parent / 'data_definition' / 'data_definition_gold.md'
+
+# Goldテーブル名 → 算出メソッド名
+GOLD_TABLES = {
+    '月次商品別粗利率': 'gross_margin_by_product',
+    '月次EV販売率': 'ev_sales_share',
+    '月次エリア別EV販売率': 'ev_sales_share_by_location',
+    '月次先進安全装置適用率': 'safety_equipment_adoption',
+    '月次エリア別先進安全装置適用率': 'safety_equipment_adoption_by_location',
+    '棚卸資産回転期間': 'inventory_rotation',
+    '完成品別棚卸資産回転期間': 'inventory_rotation_by_product',
+    '月次EBITDA': 'ebitda',
+    '完成品別月次EBITDA': 'ebitda_by_product',
+    '完成品出荷リードタイム遵守率': 'delivery_lead_time_compliance',
+    '取引先別部品入荷リードタイム遵守率': 'inbound_lead_time_compliance',
+    '緊急輸送費率': 'emergency_transportation_cost_share',
+}
+
+# 比率列は小数6桁で丸めて保存する
+RATIO_DECIMALS = 6
+
+# 出力時の並び順に使うキー列
+SORT_KEYS = ('year_month', 'location_id', 'supplier_id', 'part_id', 'product_id')
+
+
+def load_gold_schemas(path=GOLD_DEFINITION_FILE):
+    """data_definition_gold.md からテーブル名 → [(カラム名, 型)] の定義を読み込む"""
+    schemas = {}
+    current = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            # 型名に混入しているゼロ幅文字を除去
+            line = line.replace('\u200c', '').strip()
+            heading = re.match(r'^#+\s*(.+?)テーブル\s*$', line)
+            if heading:
+                current = heading.group(1)
+                schemas[current] = []
+                continue
+            if current is None or not line.startswith('|'):
+                continue
+            cells = [cell.strip() for cell in line.strip('|').split('|')]
+            if len(cells) < 2 or cells[0] in ('カラム名', '') or set(cells[0]) <= {'-'}:
+                continue
+            schemas[current].append((cells[0], cells[1].upper()))
+    return schemas
+
+
+def safe_ratio(numerator, denominator):
+    """分母が0の場合は NULL（NaN）となる比率"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+def apply_schema(df, schema):
+    """定義書の列順・型に合わせる（比率列は小数6桁で丸め）"""
+    result = pd.DataFrame(index=df.index)
+    for column, column_type in schema:
+        values = df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+        if column_type == 'DECIMAL':
+            values = values.astype(np.float64)
+            if column.endswith(('_rate', '_share', '_adoption_rate')):
+                values = values.round(RATIO_DECIMALS)
+        else:
+            values = values.astype(object).where(values.notna(), None)
+        result[column] = values
+    return result.reset_index(drop=True)
+
+
+class GoldKpiEngine:
+    """Silver層の明細ファクトとBronze層のマスタ・給与・在庫からGold層KPIを算出する
+
+    各結合結果は cached_property として1回だけ読み込まれ、複数のKPIで共有される。
+    months を指定すると、計上月がその年月に含まれる行だけを読み込み・集計する（差分更新用）。
+    drivers（コストプール → 配賦基準）は完成品別月次EBITDA の販売管理費の配賦基準（省略したプールは売上）。
+    """
+
+    def __init__(self, bronze_dir=BRONZE_DIR, months=None, drivers=None):
+        self.silver = get_silver(bronze_dir)
+        self.bronze = self.silver.bronze
+        self.months = None if months is None else set(months)
+        self.drivers = drivers
+
+    def _load(self, system, table):
+        return self.bronze.load(system, table)
+
+    def _filter_months(self, df, year_month):
+        """対象年月の行だけに絞り込む"""
+        if self.months is None:
+            return df.assign(year_month=year_month)
+        mask = year_month.isin(self.months).to_numpy()
+        return df[mask].assign(year_month=year_month[mask])
+
+    # ---------- マスタ ----------
+    @cached_property
+    def products(self):
+        return self._load('ERP', '品目マスタ').set_index('product_id')
+
+    @cached_property
+    def price_conditions(self):
+        return self._load('ERP', '条件マスタ')
+
+    @cached_property
+    def list_price_resolver(self):
+        """顧客に依らない完成車別の定価（在庫評価用）"""
+        return PriceResolver(self.price_conditions.assign(customer_id=''), price_column='list_price_ex_tax')
+
+    def product_names(self, product_ids):
+        return product_ids.map(self.products['product_name'])
+
+    # ---------- 共有する結合結果 ----------
+    @cached_property
+    @traced('join')
+    def order_lines(self):
+        """受注明細 × 受注ヘッダー × 条件マスタ × 品目マスタ（Silver層の受注明細）"""
+        return self.silver.load('受注明細', self.months)
+
+    @cached_property
+    @traced('join')
+    def procurement_lines(self):
+        """調達明細 × 調達ヘッダー（Silver層の調達明細）"""
+        return self.silver.load('調達明細', self.months)
+
+    @cached_property
+    @traced('aggregate')
+    def revenue_by_product_month(self):
+        return self.order_lines.groupby(['product_id', 'year_month'])['revenue'].sum()
+
+    @cached_property
+    @traced('aggregate')
+    def revenue_by_month(self):
+        return self.revenue_by_product_month.groupby(level='year_month').sum()
+
+    @cached_property
+    @traced('aggregate')
+    def direct_cost_by_product_month(self):
+        direct = self.procurement_lines[self.procurement_lines['material_type'] == 'direct']
+        return direct.groupby(['product_id', 'year_month'])['cost'].sum()
+
+    @cached_property
+    @traced('aggregate')
+    def direct_cost_by_month(self):
+        return self.direct_cost_by_product_month.groupby(level='year_month').sum()
+
+    @cached_property
+    @traced('aggregate')
+    def operating_expenses_by_month(self):
+        """販売管理費（間接材 + 人件費）の月次合計"""
+        indirect = self.procurement_lines[self.procurement_lines['material_type'] == 'indirect']
+        indirect_cost = indirect.groupby('year_month')['cost'].sum()
+
+        payroll = self.payroll
+        payroll_cost = (payroll['base_salary'] + payroll['overtime_pay'] + payroll['allowances']).groupby(
+            payroll['year_month']
+        ).sum()
+        return indirect_cost.add(payroll_cost, fill_value=0).astype(np.float64)
+
+    @cached_property
+    def cost_allocator(self):
+        """販売管理費の完成品 × 年月への配賦（cost_allocation は gold_kpi を import するため、ここで import する）"""
+        from cost_allocation import CostAllocator
+        return CostAllocator(self)
+
+    @cached_property
+    @traced('join')
+    def payroll(self):
+        """給与テーブル（計上月付き）"""
+        payroll = self._load('HR', '給与テーブル')
+        return self._filter_months(payroll, payroll['payment_period'])
+
+    @cached_property
+    @traced('aggregate')
+    def inventory_value_by_product_month(self):
+        """月末在庫数量 × 月末時点の定価"""
+        inventory = self._load('WMS', '月次在庫履歴')
+        inventory = self._filter_months(inventory, to_year_month(inventory['snapshot_date']))
+        prices = self.list_price_resolver.resolve(
+            inventory['product_id'], np.full(len(inventory), ''), inventory['snapshot_date']
+        )
+        inventory['inventory_value'] = inventory['inventory_quantity'] * np.nan_to_num(prices)
+        return inventory.groupby(['product_id', 'year_month'])['inventory_value'].sum()
+
+    @cached_property
+    @traced('join')
+    def shipped_order_lines(self):
+        """受注明細ごとの最終出荷日時と納期遵守フラグ（出荷明細 × 受注明細）"""
+        keys = ['order_id', 'line_number', 'product_id']
+        shipment_lines = self.silver.load('出荷明細', self.months, columns=keys + ['actual_ship_timestamp'])
+        last_ship = shipment_lines.groupby(keys)['actual_ship_timestamp'].max()
+        lines = self.order_lines.join(last_ship, on=['order_id', 'line_number', 'product_id'])
+        lines['on_time'] = (lines['actual_ship_timestamp'] <= lines['promised_delivery_date']).to_numpy(bool)
+        return lines
+
+    @cached_property
+    @traced('join')
+    def transportation_costs(self):
+        """出荷明細に按分した費目別の輸送コスト（請求月付き。輸送コストのない出荷は除く）"""
+        costs = self.silver.load('出荷明細', columns=['billing_year_month', *COST_COLUMNS.values()])
+        costs = costs[costs['billing_year_month'].notna()]
+        return self._filter_months(costs.drop(columns='billing_year_month'), costs['billing_year_month'])
+
+    # ---------- 収益性指標 ----------
+    def gross_margin_by_product(self):
+        df = pd.concat(
+            [self.revenue_by_product_month.rename('revenue'), self.direct_cost_by_product_month.rename('cogs')], axis=1
+        ).fillna(0).reset_index()
+        df['product_name'] = self.product_names(df['product_id'])
+        df['gross_margin_rate'] = safe_ratio(df['revenue'] - df['cogs'], df['revenue'])
+        return df
+
+    def ebitda(self):
+        df = pd.concat([
+            self.revenue_by_month.rename('revenue'),
+            self.direct_cost_by_month.rename('cogs'),
+            self.operating_expenses_by_month.rename('operating_expenses'),
+        ], axis=1).fillna(0)
+        df.index.name = 'year_month'
+        df = df.reset_index()
+        df['gross_margin_amount'] = df['revenue'] - df['cogs']
+        df['ebitda'] = df['gross_margin_amount'] - df['operating_expenses']
+        return df
+
+    def ebitda_by_product(self):
+        return self.cost_allocator.ebitda_by_product(self.drivers)
+
+    # ---------- 運転資本効率指標 ----------
+    def inventory_rotation(self):
+        inventory_value = self.inventory_value_by_product_month.groupby(level='year_month').sum()
+        df = pd.concat(
+            [self.direct_cost_by_month.rename('monthly_cogs'), inventory_value.rename('inventory_value')], axis=1
+        ).fillna(0)
+        df.index.name = 'year_month'
+        df = df.reset_index()
+        df['inventory_rotation_period'] = safe_ratio(df['inventory_value'], df['monthly_cogs']) * 30
+        return df
+
+    def inventory_rotation_by_product(self):
+        df = pd.concat([
+            self.direct_cost_by_product_month.rename('monthly_cogs'),
+            self.inventory_value_by_product_month.rename('inventory_value'),
+        ], axis=1).fillna(0).reset_index()
+        df['product_name'] = self.product_names(df['product_id'])
+        df['inventory_rotation_period'] = safe_ratio(df['inventory_value'], df['monthly_cogs']) * 30
+        return df
+
+    # ---------- 製品戦略指標 ----------
+    def _revenue_share(self, flag, keys, value_column, share_column):
+        lines = self.order_lines
+        df = pd.DataFrame({
+            'total_revenue': lines['revenue'],
+            value_column: lines['revenue'].where(lines[flag], 0),
+        }).groupby([lines[key] for key in keys]).sum().reset_index()
+        df[share_column] = safe_ratio(df[value_column], df['total_revenue'])
+        return df
+
+    def ev_sales_share(self):
+        return self._revenue_share('is_ev', ['year_month'], 'ev_revenue', 'ev_sales_share')
+
+    def ev_sales_share_by_location(self):
+        return self._revenue_share('is_ev', ['year_month', 'location_id'], 'ev_revenue', 'ev_sales_share')
+
+    def safety_equipment_adoption(self):
+        return self._revenue_share(
+            'is_safety_equipped', ['year_month'], 'safety_equipped_revenue', 'safety_equipment_adoption_rate'
+        )
+
+    def safety_equipment_adoption_by_location(self):
+        return self._revenue_share(
+            'is_safety_equipped', ['year_month', 'location_id'], 'safety_equipped_revenue', 'safety_equipment_adoption_rate'
+        )
+
+    # ---------- サプライチェーン効率指標 ----------
+    def delivery_lead_time_compliance(self):
+        lines = self.shipped_order_lines
+        df = lines.groupby(['product_id', 'year_month']).agg(
+            orders_received=('on_time', 'size'),
+            orders_shipped=('on_time', 'sum'),
+        ).reset_index()
+        df['product_name'] = self.product_names(df['product_id'])
+        df['on_time_delivery_rate'] = safe_ratio(df['orders_shipped'], df['orders_received'])
+        return df
+
+    def inbound_lead_time_compliance(self):
+        lines = self.procurement_lines
+        on_time = (lines['received_date'] <= lines['expected_delivery_date']).to_numpy(bool)
+        df = lines.assign(on_time=on_time).groupby(
+            ['supplier_id', 'supplier_name', 'material_id', 'material_name', 'product_id', 'year_month'], dropna=False
+        ).agg(
+            purchase_orders_count=('on_time', 'size'),
+            receipts_count=('on_time', 'sum'),
+        ).reset_index()
+        df = df.rename(columns={'material_id': 'part_id', 'material_name': 'part_name'})
+        df['product_name'] = self.product_names(df['product_id'])
+        df['inbound_lead_time_compliance_rate'] = safe_ratio(df['receipts_count'], df['purchase_orders_count'])
+        return df
+
+    # ---------- 物流コスト指標 ----------
+    def emergency_transportation_cost_share(self):
+        costs = self.transportation_costs
+        df = pd.DataFrame({
+            'transportation_cost_total': costs[list(COST_COLUMNS.values())].sum(axis=1).astype(np.float64),
+            'emergency_transportation_cost_total': costs[COST_COLUMNS['expedite']].astype(np.float64),
+        }).groupby(costs['year_month']).sum().reset_index()
+        df['emergency_transportation_cost_share'] = safe_ratio(
+            df['emergency_transportation_cost_total'], df['transportation_cost_total']
+        )
+        return df
+
+    # ---------- 一括算出 ----------
+    def compute_all(self, tables=None, schemas=None):
+        """全Goldテーブルを算出し、テーブル名 → DataFrame（定義書のスキーマ準拠）を返す"""
+        if schemas is None:
+            schemas = load_gold_schemas()
+        results = {}
+        for name in tables or GOLD_TABLES:
+            with span(name, 'aggregate') as current:
+                df = getattr(self, GOLD_TABLES[name])()
+                df = df.sort_values([key for key in SORT_KEYS if key in df.columns], kind='stable')
+                results[name] = apply_schema(df, schemas[name])
+                current.set(rows_out=len(results[name]))
+        return results
+
+
+def write_gold_tables(tables, gold_dir=GENERATED_GOLD_DIR):
+    """Goldテーブルを CSV（UTF-8 BOM付き）で出力"""
+    gold_dir = Path(gold_dir)
+    gold_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in tables.items():
+        path = gold_dir / f'{name}.csv'
+        with span(name, 'write', rows_in=len(df)) as current:
+            df.to_csv(path, index=False, encoding='utf-8-sig')
+            current.set(bytes_written=path.stat().st_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bronze層からのGold層KPIの一括算出')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--gold-dir', type=Path, default=GENERATED_GOLD_DIR,
+                        help='Goldテーブル（CSV）の出力先（既定: data/Generated/Gold）')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = GoldKpiEngine(args.bronze_dir)
+    tables = engine.compute_all()
+    write_gold_tables(tables, args.gold_dir)
+
+    print(f'Gold層KPI算出完了 ({time.perf_counter() - start:.2f}秒)')
+    for name, df in tables.items():
+        print(f'  {name}: {len(df):,}行')
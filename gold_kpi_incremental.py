@@ -0,0 +1,231 @@
+"""
+Gold層KPIの年月パーティション単位の差分更新
+Gold出力を year_month ごとのParquetに分割して保存し、Bronze層で変更のあった年月だけを再計算する
+
+変更検知
+- 伝票系テーブルは計上月（受注: order_timestamp、調達: order_date、輸送コスト: billing_date、
+  給与: payment_period、月次在庫: snapshot_date）ごとに行ハッシュの合計と件数を指紋として記録する
+- 明細テーブル（受注伝票_item、調達伝票_item、出荷伝票_item）はヘッダー・受注の計上月に帰属させる
+- 条件マスタ・品目マスタは全月に影響するため、変更があれば全件再計算する
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from bronze_loader import BRONZE_DIR, get_cache
+from calendar_dimension import to_year_month
+from gold_kpi import GENERATED_GOLD_DIR, GOLD_DIR, GOLD_TABLES, GoldKpiEngine, load_gold_schemas, write_gold_tables
+
+PARTITION_DIR = GOLD_DIR / 'partitions'
+STATE_NAME = '_state.json'
+
+# 全月に影響するマスタ（変更時は全件再計算）
+GLOBAL_SOURCES = [('ERP', '品目マスタ'), ('ERP', '条件マスタ')]
+
+# 年月単位で変更を追跡する伝票系テーブル
+MONTHLY_SOURCES = [
+    ('ERP', '受注伝票_header'),
+    ('ERP', '受注伝票_item'),
+    ('P2P', '調達伝票_header'),
+    ('P2P', '調達伝票_item'),
+    ('MES', '出荷伝票_item'),
+    ('TMS', '輸送コスト'),
+    ('HR', '給与テーブル'),
+    ('WMS', '月次在庫履歴'),
+]
+
+
+def month_fingerprints(df, year_month):
+    """年月ごとの行ハッシュ合計（2^64 を法とする）と件数を返す"""
+    if len(df) == 0:
+        return {}
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy(np.uint64)
+    codes, months = pd.factorize(year_month.fillna('').to_numpy(), sort=True)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sums = np.add.reduceat(row_hashes[order], starts)
+    counts = np.diff(np.r_[starts, len(order)])
+    return {
+        str(months[sorted_codes[start]]): [int(count), f'{int(total):016x}']
+        for start, total, count in zip(starts, sums, counts)
+    }
+
+
+class IncrementalGoldRefresh:
+    """年月パーティション化したGold層の差分更新"""
+
+    def __init__(self, bronze_dir=BRONZE_DIR, partition_dir=None):
+        self.bronze_dir = Path(bronze_dir)
+        self.bronze = get_cache(bronze_dir)
+        if partition_dir is None:
+            partition_dir = PARTITION_DIR if self.bronze_dir == BRONZE_DIR else self.bronze_dir.parent / 'Gold' / 'partitions'
+        self.partition_dir = Path(partition_dir)
+        self.state_path = self.partition_dir / STATE_NAME
+        self.schemas = load_gold_schemas()
+
+    # ---------- 状態 ----------
+    def load_state(self):
+        if not self.state_path.exists():
+            return None
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    # ---------- 変更検知 ----------
+    def _source_hash(self, system, table):
+        if not self.bronze.is_fresh(system, table):
+            self.bronze.build(system, table)
+        return self.bronze.manifest[f'{system}/{table}']['source_sha256']
+
+    def _header_months(self, system, table, key, date_column):
+        """ヘッダーの伝票ID → 計上月（IDが重複する場合は先頭のヘッダーを採用）"""
+        headers = self.bronze.load(system, table, columns=[key, date_column]).drop_duplicates(key)
+        return pd.Series(to_year_month(headers[date_column]).to_numpy(), index=headers[key])
+
+    def _month_keys(self, system, table, df):
+        """伝票系テーブルの各行が帰属する計上月"""
+        if table == '受注伝票_header':
+            return to_year_month(df['order_timestamp'])
+        if table in ('受注伝票_item', '出荷伝票_item'):
+            return df['order_id'].map(self._header_months('ERP', '受注伝票_header', 'order_id', 'order_timestamp'))
+        if table == '調達伝票_header':
+            return to_year_month(df['order_date'])
+        if table == '調達伝票_item':
+            return df['purchase_order_id'].map(self._header_months('P2P', '調達伝票_header', 'purchase_order_id', 'order_date'))
+        if table == '輸送コスト':
+            return to_year_month(df['billing_date'])
+        if table == '給与テーブル':
+            return df['payment_period'].astype(str)
+        if table == '月次在庫履歴':
+            return to_year_month(df['snapshot_date'])
+        raise KeyError(f'{system}/{table}')
+
+    def collect_state(self, previous=None):
+        """現在のBronze層の指紋を集める（ファイルハッシュが前回と同じテーブルは再計算しない）"""
+        previous_sources = (previous or {}).get('sources', {})
+        sources = {}
+        for system, table in GLOBAL_SOURCES + MONTHLY_SOURCES:
+            key = f'{system}/{table}'
+            sha256 = self._source_hash(system, table)
+            if previous_sources.get(key, {}).get('sha256') == sha256:
+                sources[key] = previous_sources[key]
+                continue
+            entry = {'sha256': sha256}
+            if (system, table) in MONTHLY_SOURCES:
+                df = self.bronze.load(system, table)
+                entry['months'] = month_fingerprints(df, self._month_keys(system, table, df))
+            sources[key] = entry
+        return {'sources': sources}
+
+    @staticmethod
+    def changed_months(previous, current):
+        """前回から変更のあった年月の集合を返す（全件再計算が必要な場合は None）"""
+        if previous is None:
+            return None
+        for system, table in GLOBAL_SOURCES:
+            key = f'{system}/{table}'
+            if previous['sources'].get(key, {}).get('sha256') != current['sources'][key]['sha256']:
+                return None
+
+        months = set()
+        for system, table in MONTHLY_SOURCES:
+            key = f'{system}/{table}'
+            before = previous['sources'].get(key, {}).get('months', {})
+            after = current['sources'][key]['months']
+            for month in before.keys() | after.keys():
+                if before.get(month) != after.get(month):
+                    months.add(month)
+        months.discard('')
+        return months
+
+    # ---------- パーティション ----------
+    def _partition_path(self, name, year_month):
+        return self.partition_dir / name / f'year_month={year_month}' / 'part.parquet'
+
+    def _existing_months(self, name):
+        table_dir = self.partition_dir / name
+        if not table_dir.exists():
+            return set()
+        return {path.name.split('=', 1)[1] for path in table_dir.glob('year_month=*')}
+
+    def write_partitions(self, name, df, months):
+        """対象年月のパーティションを書き換える（結果に現れなくなった年月は削除）"""
+        written = set()
+        for year_month, part in df.groupby('year_month', sort=True):
+            path = self._partition_path(name, year_month)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.parquet.tmp')
+            pq.write_table(pa.Table.from_pandas(part.reset_index(drop=True), preserve_index=False), tmp_path)
+            os.replace(tmp_path, path)
+            written.add(year_month)
+
+        stale = (self._existing_months(name) if months is None else set(months)) - written
+        for year_month in stale:
+            shutil.rmtree(self._partition_path(name, year_month).parent, ignore_errors=True)
+
+    def read_table(self, name):
+        """パーティションを結合してGoldテーブル全体を返す"""
+        paths = [self._partition_path(name, month) for month in sorted(self._existing_months(name))]
+        columns = [column for column, _ in self.schemas[name]]
+        if not paths:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat([pq.read_table(path).to_pandas() for path in paths], ignore_index=True)
+        return df[columns]
+
+    def read_all(self):
+        return {name: self.read_table(name) for name in GOLD_TABLES}
+
+    # ---------- 更新 ----------
+    def refresh(self, full=False):
+        """変更のあった年月だけを再計算する。再計算した年月（全件の場合は None）を返す"""
+        previous = None if full else self.load_state()
+        current = self.collect_state(previous)
+        months = self.changed_months(previous, current)
+
+        if months is None or months:
+            engine = GoldKpiEngine(self.bronze_dir, months=months)
+            tables = engine.compute_all(schemas=self.schemas)
+            for name, df in tables.items():
+                self.write_partitions(name, df, months)
+
+        self.save_state(current)
+        return months
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gold層KPIの差分更新')
+    parser.add_argument('--full', action='store_true', help='全年月を再計算する')
+    parser.add_argument('--export-csv', action='store_true', help='更新後に data/Generated/Gold へCSVを書き出す')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    refresher = IncrementalGoldRefresh()
+    months = refresher.refresh(full=args.full)
+    elapsed = time.perf_counter() - start
+
+    if months is None:
+        print(f'全年月を再計算しました ({elapsed:.2f}秒)')
+    elif months:
+        print(f'{len(months)}か月分を再計算しました: {", ".join(sorted(months))} ({elapsed:.2f}秒)')
+    else:
+        print(f'Bronze層に変更はありません ({elapsed:.2f}秒)')
+
+    if args.export_csv:
+        write_gold_tables(refresher.read_all())
+        print(f'CSVを出力しました: {GENERATED_GOLD_DIR}')
@@ -0,0 +1,321 @@
+"""
+在庫方針の最適化
+品目 × 拠点 ごとに、受注伝票の週次需要のばらつき・調達伝票のリードタイム（発注日 → 入荷日）・欠品許容率の候補から
+安全在庫と最大在庫を求め、InventoryPolicy_Records（output/InventoryPolicy_Records_*.csv と同じ列構成）を出力する
+（既定の出力先はリポジトリのサンプル（_optimized / _updated）を上書きしない output/InventoryPolicy_Records_generated.csv）
+
+- 補充は repl_interval 日ごとの定期発注とし、保護期間 P = 平均リードタイム + 発注間隔 の需要の標準偏差
+  σ_P = √(P σ_d² + μ_d² σ_L²) から 安全在庫 = z(1 - 欠品許容率) × σ_P、最大在庫 = μ_d × P + 安全在庫 とする
+- 欠品許容率は data_definition の4候補（0.1% / 5% / 10% / 30%）から、在庫コスト（最大在庫 × 単位原価 × 年間保管費率）と
+  欠品コスト（1発注サイクルの期待欠品数 σ_P × G(z) × 年間サイクル数 × 1台あたり粗利）の合計が最小のものを選ぶ
+  （期待欠品数は正規分布の損失関数で求め、試行のシミュレーションは行わない）
+- 単価・単位原価は品目ごとの 売上 / 受注数量、直接材費 / 受注数量（Gold層の粗利と同じ計上方法）
+- 全方針 × 全候補のコストを1つの行列で計算する
+- --incremental では前回の入力（需要・リードタイム・単価）を状態ファイルと比較し、許容差を超えて変わった方針と
+  新しい方針だけを再最適化する（他の行は前回の値と db_updation_dttm をそのまま残す）
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from bronze_loader import BRONZE_DIR, load_table
+from forecast_engine import weekly_demand
+from gold_kpi import GoldKpiEngine
+
+OUTPUT_DIR = Path(__file__).resolve().parent / 'output'
+POLICY_PATH = OUTPUT_DIR / 'InventoryPolicy_Records_generated.csv'
+STATE_SUFFIX = '.state.json'
+
+POLICY_COLUMNS = [
+    'id', 'site_id', 'product_id', 'product_group_id', 'dest_geo_id', 'vendor_tpartner_id', 'eff_start_date',
+    'eff_end_date', 'company_id', 'ss_policy', 'fallback_policy_1', 'repl_interval', 'target_inventory_qty',
+    'min_safety_stock', 'max_stock', 'stockout_tolerance_rate', 'stockout_tolerance_rate.1', 'woc_limit',
+    'permitted_var', 'min_sl', 'max_sl', 'db_creation_dttm', 'db_updation_dttm', 'target_doc_limit',
+    'max_doc_limit', 'min_doc_limit',
+]
+PAIR_KEY = ['product_id', 'site_id']
+INPUT_COLUMNS = ['demand_mean', 'demand_std', 'lead_time_mean', 'lead_time_std', 'unit_price', 'unit_cost']
+
+COMPANY_ID = 'HND'
+NO_VALUE = 'SCN_RESERVED_NO_VALUE_PROVIDED'
+EFF_END_DATE = '9999-12-31T23:59:59Z'
+
+# 欠品許容率の候補（data_definition の補足事項）
+STOCKOUT_TOLERANCE_RATES = np.array([0.001, 0.05, 0.10, 0.30])
+
+# 既定のパラメータ
+DEFAULT_REVIEW_DAYS = 7
+DEFAULT_HOLDING_RATE = 0.25     # 年間保管コスト（単位原価に対する比率）
+DEFAULT_LEAD_TIME_DAYS = 14     # 調達実績のない拠点に使うリードタイム
+DEFAULT_TOLERANCE = 0.05        # --incremental で入力が変わったとみなす相対差
+
+
+# ---------- 入力 ----------
+def demand_statistics(order_headers, order_items, as_of=None):
+    """品目 × 拠点 ごとの週次需要の平均と標準偏差"""
+    series, _, history = weekly_demand(order_headers, order_items, as_of)
+    return pd.DataFrame({
+        'demand_mean': history.mean(axis=1) if history.size else np.zeros(len(series)),
+        'demand_std': history.std(axis=1, ddof=1) if history.shape[1] > 1 else np.zeros(len(series)),
+    }, index=series)
+
+
+def lead_time_statistics(procurement_headers, procurement_items):
+    """品目 × 拠点 ごとの調達リードタイム（発注日 → 入荷日、日数）の平均・標準偏差と主な仕入先
+
+    直接材の明細で入荷日のあるものだけを使う（入荷日がなければ納入予定日）。
+    """
+    # 伝票IDが重複するヘッダーは先頭を採用（gold_kpi と同じ）
+    headers = procurement_headers.drop_duplicates('purchase_order_id').set_index('purchase_order_id')
+    lines = procurement_items[procurement_items['material_type'] == 'direct']
+    lines = lines.join(headers[['order_date', 'expected_delivery_date', 'location_id', 'supplier_id']], on='purchase_order_id', how='inner')
+    received = lines['received_date'].fillna(lines['expected_delivery_date'])
+    lines = lines.assign(
+        site_id=lines['location_id'],
+        lead_time=(received - lines['order_date']).dt.days,
+    ).dropna(subset=['lead_time'])
+
+    grouped = lines.groupby(PAIR_KEY)
+    statistics = pd.DataFrame({
+        'lead_time_mean': grouped['lead_time'].mean(),
+        'lead_time_std': grouped['lead_time'].std(ddof=1).fillna(0),
+        'vendor_tpartner_id': grouped['supplier_id'].agg(lambda suppliers: suppliers.mode().iloc[0]),
+    })
+    site_means = lines.groupby('site_id')['lead_time'].agg(['mean', 'std'])
+    return statistics, site_means
+
+
+def unit_economics(engine):
+    """品目ごとの単価（売上 / 受注数量）と単位原価（直接材費 / 受注数量）"""
+    quantity = engine.order_lines.groupby('product_id')['quantity'].sum()
+    revenue = engine.revenue_by_product_month.groupby(level='product_id').sum()
+    cost = engine.direct_cost_by_product_month.groupby(level='product_id').sum().reindex(quantity.index)
+    return pd.DataFrame({
+        'unit_price': revenue.reindex(quantity.index) / quantity,
+        'unit_cost': cost / quantity,
+    })
+
+
+def policy_inputs(demand, lead_times, site_lead_times, economics):
+    """需要・リードタイム・単価をペアごとに揃える
+
+    リードタイムのないペアは拠点平均（拠点にもなければ既定値）、単価のない品目は全品目の中央値、
+    単位原価のない品目は単価 × 全品目の中央値の原価率を使う。
+    """
+    inputs = demand.join(lead_times, how='left')
+    sites = inputs.index.get_level_values('site_id')
+    inputs['lead_time_mean'] = inputs['lead_time_mean'].fillna(
+        pd.Series(sites.map(site_lead_times['mean']), index=inputs.index)
+    ).fillna(DEFAULT_LEAD_TIME_DAYS)
+    inputs['lead_time_std'] = inputs['lead_time_std'].fillna(
+        pd.Series(sites.map(site_lead_times['std']), index=inputs.index)
+    ).fillna(0)
+    products = inputs.index.get_level_values('product_id')
+    unit_price = pd.Series(products.map(economics['unit_price']), index=inputs.index, dtype=np.float64)
+    unit_cost = pd.Series(products.map(economics['unit_cost']), index=inputs.index, dtype=np.float64)
+    inputs['unit_price'] = unit_price.fillna(economics['unit_price'].median()).fillna(0)
+    cost_rate = (economics['unit_cost'] / economics['unit_price']).median()
+    inputs['unit_cost'] = unit_cost.fillna(inputs['unit_price'] * (0 if np.isnan(cost_rate) else cost_rate))
+    return inputs
+
+
+# ---------- 最適化 ----------
+def optimize_policies(inputs, review_days=DEFAULT_REVIEW_DAYS, holding_rate=DEFAULT_HOLDING_RATE,
+                      rates=STOCKOUT_TOLERANCE_RATES):
+    """全方針 × 欠品許容率の候補のコストを行列で計算し、方針ごとに最小コストの候補を選ぶ
+
+    inputs は INPUT_COLUMNS を持つ DataFrame（需要は週あたり、リードタイムは日数）。
+    粗利が0以下の品目は欠品コストが0になるため、最も大きい欠品許容率が選ばれる。
+    """
+    demand_mean = inputs['demand_mean'].to_numpy(np.float64)[:, np.newaxis]
+    demand_std = inputs['demand_std'].to_numpy(np.float64)[:, np.newaxis]
+    protection_weeks = (inputs['lead_time_mean'].to_numpy(np.float64)[:, np.newaxis] + review_days) / 7
+    lead_time_std_weeks = inputs['lead_time_std'].to_numpy(np.float64)[:, np.newaxis] / 7
+    unit_cost = inputs['unit_cost'].to_numpy(np.float64)[:, np.newaxis]
+    unit_margin = np.maximum(inputs['unit_price'].to_numpy(np.float64)[:, np.newaxis] - unit_cost, 0)
+
+    # 方針 × 候補
+    z = norm.isf(rates)[np.newaxis, :]
+    sigma = np.sqrt(protection_weeks * demand_std ** 2 + (demand_mean * lead_time_std_weeks) ** 2)
+    safety_stock = np.maximum(z * sigma, 0)
+    max_stock = demand_mean * protection_weeks + safety_stock
+    expected_shortage = sigma * (norm.pdf(z) - z * norm.sf(z))
+    holding_cost = max_stock * unit_cost * holding_rate
+    stockout_cost = expected_shortage * (365 / review_days) * unit_margin
+    total_cost = holding_cost + stockout_cost
+
+    best = np.argmin(total_cost, axis=1)
+    rows = np.arange(len(inputs))
+    safety_stock, max_stock = safety_stock[rows, best], max_stock[rows, best]
+    daily_demand = demand_mean[:, 0] / 7
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of = lambda quantity: np.where(daily_demand > 0, quantity / daily_demand, np.nan).round(1)
+        return pd.DataFrame({
+            'min_safety_stock': safety_stock,
+            'max_stock': max_stock,
+            'stockout_tolerance_rate': rates[best],
+            'repl_interval': float(review_days),
+            'target_doc_limit': days_of(safety_stock + demand_mean[:, 0] * review_days / 7 / 2),
+            'max_doc_limit': days_of(max_stock),
+            'min_doc_limit': days_of(safety_stock),
+            'annual_cost': total_cost[rows, best],
+        }, index=inputs.index)
+
+
+def build_policy_records(policies, product_groups, vendors, as_of, timestamp, first_id=0):
+    """最適化結果を InventoryPolicy_Records の列構成にする"""
+    n_policies = len(policies)
+    records = pd.DataFrame({
+        'id': [f'InventoryPolicy_{number}' for number in range(first_id, first_id + n_policies)],
+        'site_id': policies.index.get_level_values('site_id'),
+        'product_id': policies.index.get_level_values('product_id'),
+        'product_group_id': policies.index.get_level_values('product_id').map(product_groups),
+        'dest_geo_id': NO_VALUE,
+        'vendor_tpartner_id': pd.Series(vendors.reindex(policies.index).to_numpy()),
+        'eff_start_date': f'{np.datetime64(as_of, "D")}T00:00:00Z',
+        'eff_end_date': EFF_END_DATE,
+        'company_id': COMPANY_ID,
+        'ss_policy': 'abs_level',
+        'db_creation_dttm': timestamp,
+        'db_updation_dttm': timestamp,
+    })
+    for column in ['repl_interval', 'min_safety_stock', 'max_stock', 'stockout_tolerance_rate',
+                   'target_doc_limit', 'max_doc_limit', 'min_doc_limit']:
+        records[column] = policies[column].to_numpy()
+    return records.reindex(columns=POLICY_COLUMNS)
+
+
+# ---------- 差分更新 ----------
+def state_path(policy_path):
+    return Path(policy_path).with_name(Path(policy_path).name + STATE_SUFFIX)
+
+
+def load_state(path):
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path, inputs, settings):
+    state = {
+        'settings': settings,
+        'inputs': {f'{product_id}|{site_id}': values for (product_id, site_id), values in zip(inputs.index, inputs[INPUT_COLUMNS].to_numpy().tolist())},
+    }
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def changed_policies(previous, inputs, settings, tolerance=DEFAULT_TOLERANCE):
+    """前回の入力から相対差 tolerance を超えて変わったペア（と新しいペア）のマスク。設定が変わった場合は全件"""
+    if previous is None or previous.get('settings') != settings:
+        return np.ones(len(inputs), dtype=bool)
+    keys = [f'{product_id}|{site_id}' for product_id, site_id in inputs.index]
+    before = pd.DataFrame.from_dict(previous['inputs'], orient='index', columns=INPUT_COLUMNS).reindex(keys).to_numpy(np.float64)
+    after = inputs[INPUT_COLUMNS].to_numpy(np.float64)
+    changed = np.abs(after - before) > tolerance * np.abs(before)
+    return np.isnan(before).any(axis=1) | changed.any(axis=1)
+
+
+def run(bronze_dir, output, as_of=None, review_days=DEFAULT_REVIEW_DAYS, holding_rate=DEFAULT_HOLDING_RATE,
+        incremental=False, tolerance=DEFAULT_TOLERANCE):
+    """Bronze層から在庫方針を最適化して output に書き出す
+
+    戻り値は (全方針数, 再最適化した方針数, 再最適化した方針の最適化結果)。
+    """
+    order_headers = load_table('ERP', '受注伝票_header', columns=['order_id', 'order_timestamp', 'location_id'], bronze_dir=bronze_dir)
+    order_items = load_table('ERP', '受注伝票_item', columns=['order_id', 'product_id', 'quantity'], bronze_dir=bronze_dir)
+    procurement_headers = load_table(
+        'P2P', '調達伝票_header', columns=['purchase_order_id', 'order_date', 'expected_delivery_date', 'location_id', 'supplier_id'],
+        bronze_dir=bronze_dir,
+    )
+    procurement_items = load_table(
+        'P2P', '調達伝票_item', columns=['purchase_order_id', 'material_type', 'product_id', 'received_date'], bronze_dir=bronze_dir
+    )
+    products = load_table('ERP', '品目マスタ', columns=['product_id', 'item_group'], bronze_dir=bronze_dir)
+
+    if as_of is None:
+        as_of = np.datetime64(order_headers['order_timestamp'].max(), 'D') + 1
+    lead_times, site_lead_times = lead_time_statistics(procurement_headers, procurement_items)
+    inputs = policy_inputs(
+        demand_statistics(order_headers, order_items, as_of),
+        lead_times[['lead_time_mean', 'lead_time_std']],
+        site_lead_times,
+        unit_economics(GoldKpiEngine(bronze_dir)),
+    )
+    settings = {'review_days': review_days, 'holding_rate': holding_rate}
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    product_groups = products.set_index('product_id')['item_group']
+
+    output = Path(output)
+    previous_records = None
+    changed = np.ones(len(inputs), dtype=bool)
+    if incremental and output.exists():
+        # 再最適化しない行を書き戻したときに値が変わらないよう、小数は丸めずに読む
+        previous_records = pd.read_csv(
+            output, encoding='utf-8-sig', dtype={'id': str, 'site_id': str, 'product_id': str}, float_precision='round_trip'
+        )
+        changed = changed_policies(load_state(state_path(output)), inputs, settings, tolerance)
+        previous_keys = pd.MultiIndex.from_frame(previous_records[PAIR_KEY])
+        # 前回のファイルにない方針は入力が同じでも作成する
+        changed |= ~inputs.index.isin(previous_keys)
+
+    policies = optimize_policies(inputs[changed], review_days, holding_rate)
+    vendors = lead_times['vendor_tpartner_id']
+    if previous_records is None:
+        records = build_policy_records(policies, product_groups, vendors, as_of, timestamp)
+    else:
+        # 再最適化した方針は id と db_creation_dttm を引き継いで置き換え、新しい方針は続きの番号で末尾に追加する
+        previous_records = previous_records.set_index(pd.MultiIndex.from_frame(previous_records[PAIR_KEY]))
+        existing = policies.index.isin(previous_records.index)
+        numbers = previous_records['id'].str.extract(r'(\d+)$', expand=False).astype(float)
+        first_id = int(numbers.max()) + 1 if numbers.notna().any() else 0
+
+        replaced = build_policy_records(policies[existing], product_groups, vendors, as_of, timestamp)
+        replaced.index = policies.index[existing]
+        replaced[['id', 'db_creation_dttm']] = previous_records.loc[replaced.index, ['id', 'db_creation_dttm']].to_numpy()
+        previous_records = previous_records[POLICY_COLUMNS].astype(object)
+        previous_records.loc[replaced.index] = replaced[POLICY_COLUMNS].astype(object)
+        added = build_policy_records(policies[~existing], product_groups, vendors, as_of, timestamp, first_id)
+        records = pd.concat([previous_records, added], ignore_index=True)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    records.to_csv(output, index=False, encoding='utf-8-sig')
+    save_state(state_path(output), inputs, settings)
+    return len(records), int(changed.sum()), policies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在庫方針（InventoryPolicy_Records）の最適化')
+    parser.add_argument('--as-of', default=None, help='需要の集計時点（この日を含む週の前週まで、既定: 最終受注日の翌日）')
+    parser.add_argument('--review-days', type=int, default=DEFAULT_REVIEW_DAYS, help='発注間隔（日）')
+    parser.add_argument('--holding-rate', type=float, default=DEFAULT_HOLDING_RATE, help='年間保管コスト（単位原価に対する比率）')
+    parser.add_argument('--incremental', action='store_true', help='入力が変わった方針だけを再最適化する')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='--incremental で入力が変わったとみなす相対差')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--output', type=Path, default=POLICY_PATH, help='InventoryPolicy_Records のCSV出力先')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_policies, n_changed, policies = run(
+        args.bronze_dir, args.output, args.as_of, args.review_days, args.holding_rate, args.incremental, args.tolerance,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f'在庫方針の最適化完了 ({elapsed:.2f}秒)')
+    print(f'  方針: {n_policies:,}件（再最適化 {n_changed:,}件）')
+    if len(policies):
+        rates = policies['stockout_tolerance_rate'].value_counts().sort_index()
+        print('  欠品許容率: ' + ', '.join(f'{rate:g} → {count}件' for rate, count in rates.items()))
+        print(f'  年間コスト合計（再最適化分）: {policies["annual_cost"].sum():,.0f}円')
+    print(f'Policy records: {args.output}')
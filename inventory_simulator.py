@@ -0,0 +1,224 @@
+"""
+月次在庫シミュレーター
+data/backup/scripts/generate_monthly_inventory.py の (品目, 拠点) ごとの辞書ループを、
+品目×拠点ペア × 年月 の行列に対するベクトル演算に置き換えたもの
+
+- 需要は受注伝票の (品目, 拠点, 年月) 集計をピボットした 品目×拠点ペア × 年月 の行列
+- 在庫は全ペアの配列として保持し、月を順に進める（1か月分の処理は全ペアに対する配列演算）
+- 補充方針は発注点 s と補充上限 S の (s, S) 方式に統一し、ペアごとの絶対量と需要の日数分を組み合わせて表す
+  （30日分カバー: s = S = 当月需要 × 30 / 30、min/max: s = 下限, S = 上限、
+  InventoryPolicy_Records の ss_policy = abs_level: s = min_safety_stock, S = max_stock）
+- 需要を満たせない分は欠品（受注残にしない）とし、補充は月末に即時入庫する
+- ペアは互いに独立なので、行ブロックごとに月を進めてキャッシュ効率を上げる
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR, load_table
+from validate_inventory_sufficiency import calculate_monthly_demand
+
+PAIR_KEY = ['product_id', 'location_id']
+
+# 既定の補充方針（元スクリプトと同じ、当月需要の30日分）
+DEFAULT_COVER_DAYS = 30
+
+# 1回に月を進めるペア数（需要・在庫のブロックがL2キャッシュに収まる程度）
+BLOCK_ROWS = 1 << 12
+
+
+class ReplenishmentPolicy:
+    """(s, S) 方式の補充方針（各パラメータはスカラーまたはペアごとの配列）
+
+    発注点 s = min_level + 当月需要 × reorder_days / 30、補充上限 S = max_level + 当月需要 × cover_days / 30。
+    月末在庫（出荷後）が s を下回ったら S まで補充する。
+    """
+
+    def __init__(self, min_level=0, max_level=0, reorder_days=0, cover_days=0):
+        self.min_level = min_level
+        self.max_level = max_level
+        self.reorder_days = reorder_days
+        self.cover_days = cover_days
+
+    @classmethod
+    def cover(cls, days=DEFAULT_COVER_DAYS):
+        """当月需要の days 日分まで補充"""
+        return cls(reorder_days=days, cover_days=days)
+
+    @classmethod
+    def min_max(cls, min_level, max_level):
+        """在庫が min_level を下回ったら max_level まで補充"""
+        return cls(min_level=min_level, max_level=max_level)
+
+    @classmethod
+    def from_records(cls, records, pairs, default=None):
+        """InventoryPolicy_Records（site_id = 拠点, product_id = 品目）からペアごとの方針を作る
+
+        ss_policy = abs_level の行は min_safety_stock / max_stock を発注点 / 補充上限にする
+        （max_stock がない行は target_inventory_qty を上限にする）。該当する行がないペアは default（既定: 30日分カバー）。
+        """
+        default = default or cls.cover()
+        n_pairs = len(pairs)
+        params = {
+            name: np.broadcast_to(np.asarray(getattr(default, name), dtype=np.float64), n_pairs).copy()
+            for name in ['min_level', 'max_level', 'reorder_days', 'cover_days']
+        }
+
+        records = records[records['ss_policy'] == 'abs_level']
+        records = records.assign(max_level=records['max_stock'].fillna(records['target_inventory_qty']))
+        records = records.dropna(subset=['max_level']).drop_duplicates(['site_id', 'product_id'], keep='last')
+        rows = pd.MultiIndex.from_frame(records[['product_id', 'site_id']]).get_indexer(pairs)
+        matched = rows >= 0
+        records = records.iloc[rows[matched]]
+        params['min_level'][matched] = records['min_safety_stock'].fillna(0).to_numpy(np.float64)
+        params['max_level'][matched] = records['max_level'].to_numpy(np.float64)
+        params['reorder_days'][matched] = 0
+        params['cover_days'][matched] = 0
+        return cls(**params)
+
+    def for_rows(self, rows):
+        """rows のペアだけを取り出した方針（スカラーのパラメータはそのまま）"""
+        return ReplenishmentPolicy(**{
+            name: value[rows] if np.ndim(value) else value
+            for name, value in vars(self).items()
+        })
+
+    def thresholds(self, demand):
+        """需要（年月 × ペア、または当月のペアごとの配列）から発注点 s と補充上限 S を求める（端数は切り上げ）"""
+        def level(base, days):
+            values = np.multiply(demand, np.asarray(days) / 30, dtype=np.float64)
+            values += base
+            return np.ceil(values, out=values).astype(demand.dtype)
+
+        return level(self.min_level, self.reorder_days), level(self.max_level, self.cover_days)
+
+
+def pivot_demand(demand, months):
+    """(product_id, location_id, year_month, quantity) の需要を 品目×拠点ペア × 年月 の行列にする
+
+    ペアは (品目, 拠点) の昇順、months は 'YYYY-MM' の配列。範囲外の年月の需要は除外する。
+    """
+    demand = demand.groupby(PAIR_KEY + ['year_month'])['quantity'].sum()
+    pairs = demand.index.droplevel('year_month').unique().sort_values()
+    matrix = np.zeros((len(pairs), len(months)), dtype=np.int64)
+    pair_codes = pairs.get_indexer(demand.index.droplevel('year_month'))
+    month_codes = pd.Index(months).get_indexer(demand.index.get_level_values('year_month'))
+    in_range = month_codes >= 0
+    matrix[pair_codes[in_range], month_codes[in_range]] = demand.to_numpy(np.int64)[in_range]
+    return pairs, matrix
+
+
+def simulate(demand, policy, initial=None, shrinkage=None, block_rows=BLOCK_ROWS):
+    """品目×拠点ペア × 年月 の需要行列に対して月次在庫を計算する
+
+    initial は期首在庫（スカラーまたはペアごとの配列、既定は初月の補充上限 S）。
+    shrinkage は補充しなかった月に在庫から差し引く減耗量の行列（在庫は0未満にならない）。
+    戻り値は月末在庫 inventory、補充量 replenishment、欠品数 shortage（いずれも需要と同じ形・型）の辞書。
+    """
+    demand = np.asarray(demand)
+    n_pairs, n_months = demand.shape
+    inventory = np.empty_like(demand)
+    replenishment = np.empty_like(demand)
+    shortage = np.empty_like(demand)
+
+    for start in range(0, n_pairs, block_rows):
+        rows = slice(start, min(start + block_rows, n_pairs))
+        # 月ごとの処理で連続したメモリを読み書きするよう、ブロックは 年月 × ペア に転置して持つ
+        block_demand = np.ascontiguousarray(demand[rows].T)
+        block_shrinkage = np.ascontiguousarray(shrinkage[rows].T) if shrinkage is not None else None
+        # 発注点・補充上限は在庫に依存しないので、ブロックの全月分をまとめて求める
+        reorder_points, order_up_tos = policy.for_rows(rows).thresholds(block_demand)
+        if initial is None:
+            opening = order_up_tos[0]
+        else:
+            opening = np.broadcast_to(initial[rows] if np.ndim(initial) else initial, block_demand.shape[1])
+        opening = opening.astype(demand.dtype)
+
+        # 月末在庫だけを漸化式で進める: 出荷後在庫が s を下回れば S まで補充、補充しない月は減耗を引く
+        block_inventory = np.empty_like(block_demand)
+        level = opening
+        for m in range(n_months):
+            after_orders = np.maximum(level - block_demand[m], 0)
+            reorder = after_orders < reorder_points[m]
+            if block_shrinkage is None:
+                level = np.maximum(after_orders, np.where(reorder, order_up_tos[m], 0), out=block_inventory[m])
+            else:
+                level = np.where(
+                    reorder,
+                    np.maximum(after_orders, order_up_tos[m]),
+                    np.maximum(after_orders - block_shrinkage[m], 0),
+                )
+                block_inventory[m] = level
+
+        # 欠品・補充量は前月末在庫と当月末在庫からまとめて求める
+        previous = np.concatenate([opening[np.newaxis], block_inventory[:-1]])
+        block_shortage = np.maximum(block_demand - previous, 0)
+        after_orders = previous - block_demand + block_shortage
+        inventory[rows] = block_inventory.T
+        replenishment[rows] = np.maximum(block_inventory - after_orders, 0).T
+        shortage[rows] = block_shortage.T
+
+    return {'inventory': inventory, 'replenishment': replenishment, 'shortage': shortage}
+
+
+def load_policy(args, pairs):
+    """コマンドライン引数から補充方針を作る"""
+    if args.policy == 'minmax':
+        return ReplenishmentPolicy.min_max(args.min_level, args.max_level)
+    if args.policy == 'records':
+        records = pd.read_csv(args.policy_file, encoding='utf-8-sig')
+        return ReplenishmentPolicy.from_records(records, pairs, default=ReplenishmentPolicy.cover(args.cover_days))
+    return ReplenishmentPolicy.cover(args.cover_days)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='受注実績に対する月次在庫シミュレーション')
+    parser.add_argument('--policy', choices=['cover', 'minmax', 'records'], default='cover', help='補充方針')
+    parser.add_argument('--cover-days', type=float, default=DEFAULT_COVER_DAYS, help='cover: 補充する需要の日数')
+    parser.add_argument('--min-level', type=float, default=0, help='minmax: 発注点')
+    parser.add_argument('--max-level', type=float, default=0, help='minmax: 補充上限')
+    parser.add_argument('--policy-file', type=Path, default=None, help='records: InventoryPolicy_Records のCSV')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--output', type=Path, default=None, help='月次在庫（品目, 拠点, 年月ごと）のCSV出力先')
+    args = parser.parse_args()
+    if args.policy == 'records' and args.policy_file is None:
+        parser.error('--policy records には --policy-file が必要です')
+
+    print('Loading data...')
+    order_headers = load_table('ERP', '受注伝票_header', columns=['order_id', 'order_timestamp', 'location_id'], bronze_dir=args.bronze_dir)
+    order_items = load_table('ERP', '受注伝票_item', columns=['order_id', 'product_id', 'quantity'], bronze_dir=args.bronze_dir)
+
+    start = time.perf_counter()
+    demand = calculate_monthly_demand(order_headers, order_items).rename(columns={'demand': 'quantity'})
+    months = np.datetime_as_string(np.arange(
+        np.datetime64(demand['year_month'].min(), 'M'), np.datetime64(demand['year_month'].max(), 'M') + 1
+    ))
+    pairs, demand_matrix = pivot_demand(demand, months)
+    policy = load_policy(args, pairs)
+    results = simulate(demand_matrix, policy)
+    elapsed = time.perf_counter() - start
+
+    total_demand = demand_matrix.sum()
+    print(f'シミュレーション完了 ({elapsed:.2f}秒)')
+    print(f'  品目×拠点: {len(pairs):,}, 期間: {months[0]}～{months[-1]} ({len(months)}か月)')
+    print(f'  総需要: {total_demand:,}, 欠品: {results["shortage"].sum():,} '
+          f'(充足率 {(1 - results["shortage"].sum() / total_demand) * 100 if total_demand else 100:.2f}%)')
+    print(f'  補充: {results["replenishment"].sum():,}, 平均月末在庫: {results["inventory"].mean():,.1f}')
+
+    if args.output:
+        pair_index = np.repeat(np.arange(len(pairs)), len(months))
+        month_index = np.tile(np.arange(len(months)), len(pairs))
+        pd.DataFrame({
+            'product_id': pairs.get_level_values('product_id').to_numpy()[pair_index],
+            'location_id': pairs.get_level_values('location_id').to_numpy()[pair_index],
+            'year_month': months[month_index],
+            'demand': demand_matrix.ravel(),
+            'inventory_quantity': results['inventory'].ravel(),
+            'replenishment_quantity': results['replenishment'].ravel(),
+            'shortage_quantity': results['shortage'].ravel(),
+        }).to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f'\nCSVを出力しました: {args.output}')
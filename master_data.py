@@ -0,0 +1,231 @@
+"""
+マスタデータストア
+ERP / MES / P2P / TMS / WMS に複製されている取引先マスタ・拠点マスタ・BOMマスタを正本から1回だけ読み込み、
+プロセス内で共有する。複製との食い違いも検出する
+
+- 正本は MASTER_TABLES の先頭のシステム（取引先マスタ・拠点マスタは ERP、BOMマスタは P2P。ERPのBOMマスタはP2Pの一部）
+- 複製との比較は元CSVのハッシュが一致すれば読み込まずに済ませ、異なる場合だけキー単位で行・列を突き合わせる
+- 取引先は partner_id、拠点は location_id をキーに、valid_from <= 基準日 <= valid_to の行を二分探索で引く
+  （valid_to が空の行は現在も有効として扱う）
+- プロセスプールのワーカー向けに、正本をArrow IPCファイルに書き出し、ワーカーはメモリマップで読む
+  （export → attach。ページキャッシュを全ワーカーで共有し、CSV・Parquetの解析をワーカーごとに繰り返さない）
+"""
+
+import argparse
+import os
+import time
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from bronze_loader import BRONZE_DIR, file_sha256, get_cache
+from price_resolver import day_keys, to_day_numbers
+
+# マスタ名 → (キー列, 複製を持つシステム（先頭が正本）)
+MASTER_TABLES = {
+    '取引先マスタ': (('partner_id',), ('ERP', 'MES', 'P2P', 'TMS')),
+    '拠点マスタ': (('location_id',), ('ERP', 'MES', 'TMS', 'WMS')),
+    'BOMマスタ': (('bom_id',), ('P2P', 'ERP')),
+}
+
+SNAPSHOT_DIR_NAME = 'master'
+
+# 有効期間が空の行の下限・上限
+_MIN_DAY = to_day_numbers(np.array(['1900-01-01'], dtype='datetime64[D]'))[0]
+_MAX_DAY = to_day_numbers(np.array(['9999-12-31'], dtype='datetime64[D]'))[0]
+
+
+class MasterLookup:
+    """キー列 + 有効期間（valid_from / valid_to）でマスタの行を引く索引
+
+    同じキーに有効期間の異なる複数の行がある場合は、基準日を含む行を返す。
+    基準日を省略した場合は valid_from が最も新しい行を返す。
+    """
+
+    def __init__(self, frame, key, valid_from='valid_from', valid_to='valid_to'):
+        self.frame = frame.reset_index(drop=True)
+        self.key = key
+        self.keys = pd.Index(self.frame[key].unique())
+        codes = self.keys.get_indexer(self.frame[key]).astype(np.int64)
+        starts = self._days(valid_from, _MIN_DAY)
+        ends = self._days(valid_to, _MAX_DAY)
+
+        order = np.lexsort((starts, codes))
+        self._rows = order
+        self._codes = codes[order]
+        self._ends = ends[order]
+        self._search_keys = day_keys(self._codes, starts[order])
+        # キーごとの最新行（valid_from が最大の行）
+        last = np.r_[self._codes[1:] != self._codes[:-1], True]
+        self._latest = np.full(len(self.keys), -1, dtype=np.int64)
+        self._latest[self._codes[last]] = self._rows[last]
+
+    def _days(self, column, default):
+        if column not in self.frame:
+            return np.full(len(self.frame), default, dtype=np.int64)
+        values = self.frame[column].to_numpy().astype('datetime64[D]')
+        days = values.astype(np.int64)
+        return np.where(np.isnat(values), default, days)
+
+    def rows(self, keys, as_of=None):
+        """キーの配列に対する frame の行位置（該当する行がなければ -1）"""
+        codes = self.keys.get_indexer(pd.Index(np.asarray(keys, dtype=object))).astype(np.int64)
+        if as_of is None:
+            return np.where(codes >= 0, self._latest[np.clip(codes, 0, None)], -1)
+
+        days = np.broadcast_to(to_day_numbers(np.atleast_1d(as_of)), codes.shape)
+        positions = np.searchsorted(self._search_keys, day_keys(codes, days), side='right') - 1
+        candidates = np.clip(positions, 0, None)
+        found = (codes >= 0) & (positions >= 0) & (self._codes[candidates] == codes) & (days <= self._ends[candidates])
+        return np.where(found, self._rows[candidates], -1)
+
+    def lookup(self, keys, column, as_of=None):
+        """キーの配列に対する column の値（該当する行がなければ欠損値）"""
+        rows = self.rows(keys, as_of)
+        values = self.frame[column].iloc[np.clip(rows, 0, None)].reset_index(drop=True)
+        return values.where(pd.Series(rows >= 0)).to_numpy()
+
+    def get(self, key, as_of=None):
+        """1件分の行（該当する行がなければ None）"""
+        row = self.rows([key], as_of)[0]
+        return None if row < 0 else self.frame.iloc[row]
+
+
+class MasterDataStore:
+    """Bronze層のマスタの正本を1回だけ読み込んで共有するストア"""
+
+    def __init__(self, bronze_dir=BRONZE_DIR, snapshot_dir=None):
+        self.cache = get_cache(bronze_dir)
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self._tables = {}
+
+    @classmethod
+    def attach(cls, snapshot_dir, bronze_dir=BRONZE_DIR):
+        """export したスナップショットをメモリマップで読むストア（プロセスプールのワーカー用）"""
+        return cls(bronze_dir, snapshot_dir)
+
+    # ---------- 読み込み ----------
+    def systems(self, table):
+        """マスタの複製を持つシステム（先頭が正本、元CSVがないシステムは除く）"""
+        return [system for system in MASTER_TABLES[table][1] if self.cache.source_path(system, table).exists()]
+
+    def arrow(self, table, system=None):
+        """マスタをArrow Tableで返す（system を省略すると正本）"""
+        primary = self.systems(table)[0]
+        system = system or primary
+        if (table, system) not in self._tables:
+            if self.snapshot_dir is not None and system == primary:
+                with pa.memory_map(str(self.snapshot_dir / f'{table}.arrow')) as source:
+                    self._tables[(table, system)] = pa.ipc.open_file(source).read_all()
+            else:
+                self._tables[(table, system)] = self.cache.load_arrow(system, table)
+        return self._tables[(table, system)]
+
+    def table(self, table, system=None):
+        """マスタをDataFrameで返す（system を省略すると正本）"""
+        return self.arrow(table, system).to_pandas()
+
+    @cached_property
+    def partners(self):
+        return MasterLookup(self.table('取引先マスタ'), 'partner_id')
+
+    @cached_property
+    def locations(self):
+        return MasterLookup(self.table('拠点マスタ'), 'location_id')
+
+    @cached_property
+    def bom(self):
+        return self.table('BOMマスタ')
+
+    # ---------- 共有 ----------
+    def export(self, directory=None):
+        """正本をArrow IPCファイル（<マスタ名>.arrow）に書き出し、書き出し先を返す"""
+        directory = Path(directory) if directory else self.cache.cache_dir / SNAPSHOT_DIR_NAME
+        directory.mkdir(parents=True, exist_ok=True)
+        for table in MASTER_TABLES:
+            if not self.systems(table):
+                continue
+            path = directory / f'{table}.arrow'
+            tmp_path = path.with_suffix('.arrow.tmp')
+            arrow = self.arrow(table)
+            with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, arrow.schema) as writer:
+                writer.write_table(arrow)
+            os.replace(tmp_path, path)
+        return directory
+
+    # ---------- 食い違いの検出 ----------
+    def divergence(self):
+        """複製ごとの正本との食い違い（正本にない行・複製にない行・値が異なる行と列）"""
+        results = []
+        for table, (key, _) in MASTER_TABLES.items():
+            systems = self.systems(table)
+            if not systems:
+                continue
+            primary, copies = systems[0], systems[1:]
+            primary_hash = file_sha256(self.cache.source_path(primary, table))
+            for system in copies:
+                result = {'table': table, 'system': system, 'primary': primary,
+                          'missing_rows': 0, 'extra_rows': 0, 'changed_rows': 0, 'changed_columns': ''}
+                if file_sha256(self.cache.source_path(system, table)) != primary_hash:
+                    result.update(compare_copies(self.table(table), self.table(table, system), list(key)))
+                results.append(result)
+        return pd.DataFrame(results)
+
+
+def compare_copies(primary, copy, key):
+    """正本と複製をキーで突き合わせ、複製にない行数・正本にない行数・値が異なる行数と列を返す"""
+    merged = primary.merge(copy, on=key, how='outer', suffixes=('', '_copy'), indicator=True)
+    both = merged[merged['_merge'] == 'both']
+    common = [column for column in primary.columns if column in copy.columns and column not in key]
+    differs = pd.DataFrame({
+        column: ~(both[column].eq(both[f'{column}_copy']) | (both[column].isna() & both[f'{column}_copy'].isna()))
+        for column in common
+    }, index=both.index)
+    changed_columns = [column for column in common if differs[column].any()]
+    changed_columns += [column for column in primary.columns.symmetric_difference(copy.columns)]
+    return {
+        'missing_rows': int((merged['_merge'] == 'left_only').sum()),
+        'extra_rows': int((merged['_merge'] == 'right_only').sum()),
+        'changed_rows': int(differs.any(axis=1).sum()) if common else 0,
+        'changed_columns': ', '.join(changed_columns),
+    }
+
+
+_stores = {}
+
+
+def get_store(bronze_dir=BRONZE_DIR):
+    """Bronzeディレクトリごとのストア（同じプロセス内の処理で共有する）"""
+    bronze_dir = Path(bronze_dir)
+    if bronze_dir not in _stores:
+        _stores[bronze_dir] = MasterDataStore(bronze_dir)
+    return _stores[bronze_dir]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='マスタの複製間の食い違いチェック')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--export', action='store_true', help='正本をワーカー共有用のArrow IPCファイルに書き出す')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = get_store(args.bronze_dir)
+    divergence = store.divergence()
+    print(f'マスタの食い違いチェック ({time.perf_counter() - start:.2f}秒)')
+    for table in MASTER_TABLES:
+        systems = store.systems(table)
+        if systems:
+            print(f'  {table}: 正本 {systems[0]} ({len(store.arrow(table)):,}行), 複製 {", ".join(systems[1:]) or "-"}')
+    print()
+    for row in divergence.itertuples():
+        if row.missing_rows or row.extra_rows or row.changed_rows or row.changed_columns:
+            print(f'  {row.system}/{row.table}: 複製にない行 {row.missing_rows}, 正本にない行 {row.extra_rows}, '
+                  f'値が異なる行 {row.changed_rows}' + (f' ({row.changed_columns})' if row.changed_columns else ''))
+        else:
+            print(f'  {row.system}/{row.table}: 一致')
+
+    if args.export:
+        print(f'\nスナップショット: {store.export()}')
@@ -0,0 +1,437 @@
+"""
+パイプラインランナー
+Bronze層の派生テーブルの生成・検証・分析・Gold層KPIの各スクリプトを、入力と出力のファイルを宣言した段階（Stage）として
+依存関係のグラフ（DAG）にまとめ、依存しない段階をプロセスプールで並列に実行する
+
+    python pipeline_runner.py --bronze-dir data/Generated/SF10/Bronze --gold-dir data/Generated/SF10/Gold
+    python pipeline_runner.py --stages gold_kpi --dry-run    # gold_kpi とその上流の実行計画だけを表示
+
+- 段階の依存関係は、ある段階の入力ファイルを別の段階が出力することから決める
+  （例: 出荷伝票 → 輸送コスト → Silver層 → Gold KPI、受注伝票 → 給与テーブル → Gold KPI / 輸送コスト分析 / 原価配賦）
+- Silver層の明細ファクトはマニフェスト（元テーブルのハッシュと行数）を出力として扱い、Silver層を読む段階より先に作る
+- 受注伝票・出荷伝票・調達伝票・マスタは generate_bronze_data がまとめて作る元データとして扱う
+- 入力ファイル（スクリプト自身と、スクリプトが直接・間接にimportするリポジトリ内のモジュールを含む）の内容と引数が
+  前回の成功時と同じで、出力がそろっている段階は実行しない
+  （更新日時とサイズが同じならハッシュは計算しない。上流を再実行しても出力の内容が同じなら下流は実行しない）
+- 予測・在庫方針は output/ のサンプル（Forecast_Records.csv・InventoryPolicy_Records_optimized.csv）を上書きせず、
+  *_generated.csv に出力する
+- リポジトリのサンプルデータは既定では上書きしない。Gold層KPIの既定の出力先は data/Generated/Gold で、
+  data/Bronze に出力する段階（輸送コスト・給与テーブル）を実行する場合は --bronze-dir の指定が必要
+- 各段階は1回ごとに新しいワーカープロセスでスクリプトを実行し、標準出力を <output-dir>/logs/<段階>.log に書く
+  （POSIXではこのプロセスを fork するため、import済みのモジュールを読み込み直さない）
+- 段階の処理時間はワーカーへの投入から完了まで（プロセスの起動を含む）。スクリプト自体の処理時間は補足に表示する
+- Bronze層のParquetキャッシュは、段階どうしが同時に作らないように、開始時と Bronze層に出力する段階の完了時に
+  このプロセスで更新する
+- 全段階を実行した場合の処理時間は、依存関係上最も長い経路（クリティカルパス）の処理時間に近くなる
+"""
+
+import argparse
+import ast
+import contextlib
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
+
+from bronze_loader import BRONZE_DIR, file_sha256, get_cache
+from forecast_engine import FORECAST_PATH
+from gold_kpi import GENERATED_GOLD_DIR, GOLD_TABLES
+from inventory_policy_optimizer import POLICY_PATH
+from silver_layer import SilverLayer
+
+ROOT_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = ROOT_DIR / 'output'
+MANIFEST_NAME = 'pipeline_manifest.json'
+LOG_DIR_NAME = 'logs'
+
+# 段階の状態
+DONE, SKIPPED, FAILED, BLOCKED = '実行', 'スキップ', '失敗', '未実行'
+
+# ワーカープロセスの開始方法（spawn ではワーカーごとにこのモジュールと依存モジュールを import し直すため、POSIXでは fork）
+MP_CONTEXT = multiprocessing.get_context('fork') if os.name == 'posix' else None
+
+
+@lru_cache(maxsize=None)
+def local_modules(script):
+    """script と、script が直接・間接にimportするリポジトリ内のモジュールのパス（関数内のimportを含む）"""
+    found, stack = set(), [Path(script)]
+    while stack:
+        path = stack.pop()
+        if path in found or not path.exists():
+            continue
+        found.add(path)
+        for node in ast.walk(ast.parse(path.read_text(encoding='utf-8'))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            stack.extend(ROOT_DIR / f"{name.split('.')[0]}.py" for name in names)
+    return sorted(found)
+
+
+class Stage:
+    """パイプラインの段階（script を args で実行し、inputs のファイルから outputs のファイルを作る）
+
+    stdout を指定すると、スクリプトの標準出力をログではなくそのファイルに書く（レポートを標準出力に書くスクリプト用）。
+    """
+
+    def __init__(self, name, description, script, args, inputs, outputs, stdout=None):
+        self.name = name
+        self.description = description
+        self.script = ROOT_DIR / script
+        self.args = [str(arg) for arg in args]
+        self.inputs = [Path(path) for path in inputs] + local_modules(self.script)
+        self.outputs = [Path(path) for path in outputs]
+        self.stdout = Path(stdout) if stdout else None
+
+    @property
+    def signature(self):
+        return json.dumps([self.script.name, self.args], ensure_ascii=False)
+
+
+def build_stages(bronze_dir=BRONZE_DIR, gold_dir=GENERATED_GOLD_DIR, output_dir=OUTPUT_DIR, seed=42):
+    """このリポジトリのパイプラインの段階"""
+    bronze_dir, gold_dir, output_dir = Path(bronze_dir), Path(gold_dir), Path(output_dir)
+
+    def bronze(*tables):
+        return [bronze_dir / f'{table}.csv' for table in tables]
+
+    orders = bronze('ERP/受注伝票_header', 'ERP/受注伝票_item')
+    shipments = bronze('MES/出荷伝票_header', 'MES/出荷伝票_item')
+    procurement = bronze('P2P/調達伝票_header', 'P2P/調達伝票_item')
+    transportation_costs = bronze('TMS/輸送コスト')
+    payroll = bronze('HR/給与テーブル')
+    silver = [SilverLayer(bronze_dir).manifest_path]
+    return [
+        Stage('transportation_cost', '出荷伝票 → 輸送コスト', 'generate_transportation_cost.py',
+              ['--bronze-dir', bronze_dir, '--seed', seed], shipments, transportation_costs),
+        Stage('payroll', '受注伝票 → 給与テーブル', 'generate_payroll_data.py',
+              ['--bronze-dir', bronze_dir, '--output', payroll[0], '--seed', seed],
+              orders + bronze('ERP/拠点マスタ'), payroll),
+        Stage('silver', 'Bronze層 → Silver層（受注・出荷・調達の明細ファクト）', 'silver_layer.py',
+              ['--bronze-dir', bronze_dir],
+              orders + shipments + procurement + transportation_costs + bronze('ERP/品目マスタ', 'ERP/条件マスタ'), silver),
+        Stage('gold_kpi', 'Silver層・Bronze層 → Gold層KPI', 'gold_kpi.py',
+              ['--bronze-dir', bronze_dir, '--gold-dir', gold_dir],
+              silver + payroll + bronze('ERP/品目マスタ', 'ERP/条件マスタ', 'WMS/月次在庫履歴'),
+              [gold_dir / f'{name}.csv' for name in GOLD_TABLES]),
+        Stage('order_shipment_validation', '受注伝票 × 出荷伝票の整合性検証', 'validate_order_shipment.py',
+              ['--bronze-dir', bronze_dir, '--report', output_dir / '受注出荷整合性レポート.md'],
+              orders + shipments, [output_dir / '受注出荷整合性レポート.md']),
+        Stage('inventory_sufficiency', '受注伝票 × 月次在庫履歴の在庫充足性検証', 'validate_inventory_sufficiency.py',
+              ['--bronze-dir', bronze_dir, '--report', output_dir / '在庫充足性検証レポート.md'],
+              orders + bronze('WMS/月次在庫履歴'), [output_dir / '在庫充足性検証レポート.md']),
+        Stage('transportation_cost_analysis', '輸送コスト分析レポート', 'analyze_transportation_cost.py',
+              ['--bronze-dir', bronze_dir],
+              silver + bronze('P2P/調達伝票_item') + transportation_costs + payroll,
+              [output_dir / '輸送コスト分析レポート.txt'], stdout=output_dir / '輸送コスト分析レポート.txt'),
+        Stage('forecast', '受注伝票 → 週次需要予測', 'forecast_engine.py',
+              ['--bronze-dir', bronze_dir, '--output', output_dir / FORECAST_PATH.name, '--workers', 1],
+              orders + bronze('ERP/品目マスタ'), [output_dir / FORECAST_PATH.name]),
+        Stage('inventory_policy', '受注伝票・調達伝票 → 在庫方針の最適化', 'inventory_policy_optimizer.py',
+              ['--bronze-dir', bronze_dir, '--output', output_dir / POLICY_PATH.name],
+              orders + procurement + silver + bronze('ERP/品目マスタ', 'ERP/条件マスタ'),
+              [output_dir / POLICY_PATH.name]),
+        Stage('cost_allocation', '間接材・人件費の完成品 × 年月への配賦', 'cost_allocation.py',
+              ['--bronze-dir', bronze_dir, '--output', output_dir / '原価配賦.csv'],
+              silver + payroll + bronze('ERP/品目マスタ', 'ERP/条件マスタ', 'P2P/BOMマスタ'),
+              [output_dir / '原価配賦.csv']),
+    ]
+
+
+# ---------- 依存関係 ----------
+def dependencies(stages):
+    """段階名 → 上流の段階名の集合（入力ファイルを出力する段階）"""
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in producers:
+                raise ValueError(f'{path} を出力する段階が複数あります: {producers[path]}, {stage.name}')
+            producers[path] = stage.name
+    graph = {
+        stage.name: {producers[path] for path in stage.inputs if path in producers and producers[path] != stage.name}
+        for stage in stages
+    }
+    topological_order(graph)
+    return graph
+
+
+def topological_order(graph):
+    """上流から順に並べた段階名（循環があれば ValueError）"""
+    order, visiting, visited = [], set(), set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f'段階の依存関係が循環しています: {name}')
+        visiting.add(name)
+        for upstream in sorted(graph[name]):
+            visit(upstream)
+        visiting.discard(name)
+        visited.add(name)
+        order.append(name)
+
+    for name in graph:
+        visit(name)
+    return order
+
+
+def with_upstream(graph, targets):
+    """targets とその上流の段階名"""
+    selected, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in graph:
+            raise ValueError(f'未定義の段階です: {name}（{", ".join(graph)}）')
+        if name not in selected:
+            selected.add(name)
+            stack.extend(graph[name])
+    return selected
+
+
+def critical_path(graph, seconds):
+    """処理時間の合計が最も長い依存の経路（段階名のリスト）とその処理時間"""
+    longest = {}
+    for name in topological_order(graph):
+        previous = max(
+            (longest[upstream] for upstream in graph[name] if upstream in longest), key=lambda path: path[0], default=(0.0, [])
+        )
+        longest[name] = (previous[0] + seconds.get(name, 0.0), previous[1] + [name])
+    total, path = max(longest.values(), key=lambda path: path[0], default=(0.0, []))
+    return path, total
+
+
+# ---------- 実行の要否 ----------
+def fingerprint(path, previous=None):
+    """ファイルの更新日時・サイズ・ハッシュ（更新日時とサイズが前回と同じならハッシュを計算し直さない）"""
+    stat = path.stat()
+    if previous and previous['mtime_ns'] == stat.st_mtime_ns and previous['size'] == stat.st_size:
+        return previous
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': file_sha256(path)}
+
+
+class PipelineManifest:
+    """段階ごとの前回成功時の入力ファイル・引数の記録"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        else:
+            self.entries = {}
+
+    def input_fingerprints(self, stage):
+        previous = self.entries.get(stage.name, {}).get('inputs', {})
+        return {str(path): fingerprint(path, previous.get(str(path))) for path in stage.inputs}
+
+    def is_up_to_date(self, stage, inputs):
+        entry = self.entries.get(stage.name)
+        if entry is None or entry['signature'] != stage.signature or set(entry['inputs']) != set(inputs):
+            return False
+        if not all(path.exists() for path in stage.outputs):
+            return False
+        return all(entry['inputs'][path]['sha256'] == value['sha256'] for path, value in inputs.items())
+
+    def update_inputs(self, stage, inputs):
+        """内容が同じで更新日時だけが変わった入力の記録を更新する（次回ハッシュを計算し直さないため）"""
+        entry = self.entries[stage.name]
+        if entry['inputs'] != inputs:
+            entry['inputs'] = inputs
+            self.save()
+
+    def record(self, stage, inputs, seconds):
+        self.entries[stage.name] = {
+            'signature': stage.signature,
+            'inputs': inputs,
+            'seconds': seconds,
+            'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+# ---------- 実行 ----------
+def run_script(script, args, log_path):
+    """スクリプトを現在のプロセスで __main__ として実行し、処理時間を返す（ワーカープロセスで呼ばれる）"""
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        sys.argv = [str(script), *args]
+        try:
+            runpy.run_path(str(script), run_name='__main__')
+        except SystemExit as exit_status:
+            if exit_status.code not in (None, 0):
+                raise RuntimeError(f'{Path(script).name} が終了コード {exit_status.code} で終了しました') from None
+    return time.perf_counter() - start
+
+
+class PipelineRunner:
+    """段階の依存関係に従って、依存しない段階をプロセスプールで並列に実行する"""
+
+    def __init__(self, stages, bronze_dir=BRONZE_DIR, output_dir=OUTPUT_DIR, workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.graph = dependencies(stages)
+        self.bronze_dir = Path(bronze_dir)
+        self.output_dir = Path(output_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.manifest = PipelineManifest(self.output_dir / MANIFEST_NAME)
+        self.cache = get_cache(self.bronze_dir)
+
+    def log_path(self, stage):
+        return stage.stdout or self.output_dir / LOG_DIR_NAME / f'{stage.name}.log'
+
+    def _refresh_cache(self, stage=None):
+        """Bronze層のParquetキャッシュを更新する（stage を指定するとその出力のうちBronze層のテーブルだけ）"""
+        if stage is None:
+            self.cache.refresh()
+            return
+        for path in stage.outputs:
+            if path.suffix == '.csv' and path.parent.parent == self.bronze_dir and not self.cache.is_fresh(path.parent.name, path.stem):
+                self.cache.build(path.parent.name, path.stem)
+
+    def plan(self, targets=None, force=False):
+        """段階名 → 実行するか（上流を実行する段階は入力が変わる可能性があるため実行予定とする）"""
+        selected = with_upstream(self.graph, targets or list(self.stages))
+        produced = {path for stage in self.stages.values() for path in stage.outputs}
+        plan = {}
+        for name in topological_order(self.graph):
+            if name not in selected:
+                continue
+            stage = self.stages[name]
+            missing = [path for path in stage.inputs if not path.exists() and path not in produced]
+            if missing:
+                plan[name] = f'入力なし（{missing[0]}）'
+            elif force or any(plan[upstream] == '実行予定' for upstream in self.graph[name]) or any(
+                not path.exists() for path in stage.inputs
+            ) or not self.manifest.is_up_to_date(stage, self.manifest.input_fingerprints(stage)):
+                plan[name] = '実行予定'
+            else:
+                plan[name] = '最新'
+        return plan
+
+    def _submit(self, stage):
+        """段階を1段階専用のワーカープロセスで開始する（段階の間でモジュールのキャッシュなどの状態を共有しない）"""
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=MP_CONTEXT)
+        future = executor.submit(run_script, stage.script, stage.args, self.log_path(stage))
+        executor.shutdown(wait=False)
+        return future
+
+    def run(self, targets=None, force=False):
+        """段階を実行し、段階名 → (状態, 処理時間, 補足) を返す（処理時間はワーカーへの投入から完了まで）"""
+        selected = with_upstream(self.graph, targets or list(self.stages))
+        pending = [name for name in topological_order(self.graph) if name in selected]
+        ready, running, results = [], {}, {}
+        self._refresh_cache()
+
+        while pending or ready or running:
+            for name in list(pending):
+                upstream = [results.get(upstream_name) for upstream_name in self.graph[name]]
+                if any(result is None for result in upstream):
+                    continue
+                pending.remove(name)
+                stage = self.stages[name]
+                if any(result[0] in (FAILED, BLOCKED) for result in upstream):
+                    results[name] = (BLOCKED, 0.0, '上流の段階が失敗')
+                    continue
+                missing = [path for path in stage.inputs if not path.exists()]
+                if missing:
+                    results[name] = (FAILED, 0.0, f'入力がありません: {missing[0]}')
+                    continue
+                inputs = self.manifest.input_fingerprints(stage)
+                if not force and self.manifest.is_up_to_date(stage, inputs):
+                    self.manifest.update_inputs(stage, inputs)
+                    results[name] = (SKIPPED, 0.0, '入力に変更なし')
+                    continue
+                ready.append((stage, inputs))
+
+            while ready and len(running) < self.workers:
+                stage, inputs = ready.pop(0)
+                running[self._submit(stage)] = (stage, inputs, time.perf_counter())
+                print(f'  開始: {stage.name}（{stage.description}）')
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, inputs, submitted = running.pop(future)
+                try:
+                    script_seconds = future.result()
+                except Exception as error:
+                    results[stage.name] = (FAILED, 0.0, f'{type(error).__name__}: {error}（ログ: {self.log_path(stage)}）')
+                    print(f'  失敗: {stage.name}')
+                    continue
+                seconds = time.perf_counter() - submitted
+                self._refresh_cache(stage)
+                self.manifest.record(stage, inputs, seconds)
+                results[stage.name] = (DONE, seconds, f'スクリプト {script_seconds:.2f}秒')
+                print(f'  完了: {stage.name} ({seconds:.2f}秒)')
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bronze層の派生テーブル・検証・分析・Gold層KPIのパイプライン実行（依存しない段階は並列実行）')
+    parser.add_argument('--bronze-dir', type=Path, default=None,
+                        help='Bronze層（既定: data/Bronze。data/Bronze に出力する段階を実行する場合は指定が必要）')
+    parser.add_argument('--gold-dir', type=Path, default=GENERATED_GOLD_DIR, help='Gold層KPIの出力先（既定: data/Generated/Gold）')
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help='レポート・予測・ログ・実行記録の出力先')
+    parser.add_argument('--seed', type=int, default=42, help='輸送コスト・給与テーブル生成の乱数シード')
+    parser.add_argument('--stages', nargs='+', default=None, help='実行する段階（上流の段階も含めて実行。既定: 全段階）')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（既定: CPUコア数）')
+    parser.add_argument('--force', action='store_true', help='入力に変更がない段階も実行する')
+    parser.add_argument('--dry-run', action='store_true', help='実行計画（依存関係と実行の要否）だけを表示する')
+    args = parser.parse_args()
+
+    bronze_dir = args.bronze_dir or BRONZE_DIR
+    stages = build_stages(bronze_dir, args.gold_dir, args.output_dir, args.seed)
+    runner = PipelineRunner(stages, bronze_dir, args.output_dir, args.workers)
+    try:
+        targets = args.stages and sorted(with_upstream(runner.graph, args.stages))
+    except ValueError as error:
+        parser.error(str(error))
+    plan = runner.plan(targets, args.force)
+
+    if args.dry_run:
+        print(f"{'段階':<30} {'上流':<40} 計画")
+        for name, status in plan.items():
+            print(f"{name:<30} {', '.join(sorted(runner.graph[name])) or '-':<40} {status}")
+        raise SystemExit
+
+    # リポジトリの data/Bronze のサンプルCSVは、--bronze-dir で明示しない限り上書きしない
+    overwriting = [
+        name for name, status in plan.items()
+        if status == '実行予定' and any(path.is_relative_to(BRONZE_DIR) for path in runner.stages[name].outputs)
+    ]
+    if args.bronze_dir is None and overwriting:
+        parser.error(f'{", ".join(overwriting)} は data/Bronze のCSVを上書きします。'
+                     f'生成したBronze層を --bronze-dir で指定してください（data/Bronze を更新する場合も明示的に指定）')
+
+    print(f'パイプライン実行 ({runner.workers}プロセス)')
+    start = time.perf_counter()
+    results = runner.run(targets, args.force)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'段階':<30} {'状態':<8} {'処理時間(秒)':>12}  補足")
+    for name, (status, seconds, note) in results.items():
+        print(f'{name:<30} {status:<8} {seconds:>12.2f}  {note}')
+    executed = {name: seconds for name, (status, seconds, _) in results.items() if status == DONE}
+    print(f'\n全体: {elapsed:.2f}秒, 実行した段階の合計: {sum(executed.values()):.2f}秒')
+    if executed:
+        path, path_seconds = critical_path({name: runner.graph[name] & set(executed) for name in executed}, executed)
+        print(f'クリティカルパス: {path_seconds:.2f}秒 ({" → ".join(path)})')
+    raise SystemExit(1 if any(status in (FAILED, BLOCKED) for status, _, _ in results.values()) else 0)
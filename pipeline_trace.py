@@ -0,0 +1,251 @@
+"""
+パイプラインのトレース計測
+環境変数 PIPELINE_TRACE にトレースJSONの出力先を指定して実行すると、読み込み（load）・結合（join）・集計（aggregate）・
+書き出し（write）の区間ごとに処理時間・入出力行数・読み書きしたバイト数・ピークメモリを記録し、終了時に
+Chromeトレース形式のJSON（chrome://tracing / https://ui.perfetto.dev で表示）を書き出して区間別の集計表を表示する
+
+    PIPELINE_TRACE=output/trace.json python gold_kpi.py
+    python pipeline_trace.py output/trace.json    # 保存したトレースの集計表
+
+- 区間は span（with 文）または traced（デコレーター）で囲む。区間は入れ子にでき、集計表の自己時間（self_ms）は
+  内側の区間の時間を除いた時間
+- PIPELINE_TRACE が未設定の場合、traced は関数をそのまま返し、span は何も記録しない共有のオブジェクトを返す
+  （計測しないときのコストは関数呼び出し1回分）
+- ピークメモリは区間終了時点のプロセスの最大常駐メモリ（ru_maxrss）。resource モジュールがない環境では記録しない
+- トレースはメインプロセスの区間だけを記録する（プロセスプールのワーカーは書き出さない）
+"""
+
+import argparse
+import atexit
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_ENV = 'PIPELINE_TRACE'
+TRACE_PATH = os.environ.get(TRACE_ENV) or None
+ENABLED = TRACE_PATH is not None
+
+CATEGORIES = ('load', 'join', 'aggregate', 'write')
+
+# 区間の計測値（Chromeトレースの args）
+METRICS = ('rows_in', 'rows_out', 'bytes_read', 'bytes_written')
+
+_events = []
+_origin_ns = time.perf_counter_ns()
+
+
+def peak_rss_mb():
+    """プロセスの最大常駐メモリ（MB。resource モジュールがない環境では None）"""
+    if resource is None:
+        return None
+    # Linux は KB、macOS はバイト単位
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 ** 2
+
+
+def count_rows(value):
+    """DataFrame・Series・配列・Arrow Table の行数（テーブル名 → DataFrame の dict は合計。それ以外は None）"""
+    if isinstance(value, dict):
+        counts = [count_rows(item) for item in value.values()]
+        return sum(counts) if counts and None not in counts else None
+    num_rows = getattr(value, 'num_rows', None)
+    if isinstance(num_rows, int):
+        return num_rows
+    if hasattr(value, 'shape') and len(getattr(value, 'shape', ())) > 0:
+        return int(value.shape[0])
+    return None
+
+
+# ---------- 区間 ----------
+class Span:
+    """計測する区間（with 文で使う）"""
+
+    __slots__ = ('name', 'category', 'args', '_start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = {key: value for key, value in args.items() if value is not None}
+
+    def set(self, **args):
+        """計測値（rows_in / rows_out / bytes_read / bytes_written など）を記録する"""
+        self.args.update((key, value) for key, value in args.items() if value is not None)
+        return self
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        args = dict(self.args, peak_rss_mb=peak_rss_mb())
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        _events.append({
+            'name': self.name, 'cat': self.category, 'ph': 'X',
+            'ts': (self._start - _origin_ns) / 1000, 'dur': (end - self._start) / 1000,
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args,
+        })
+        return False
+
+
+class _NullSpan:
+    """計測しないときの区間（何も記録しない）"""
+
+    __slots__ = ()
+
+    def set(self, **args):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, category='aggregate', **args):
+    """name の区間を計測するコンテキストマネージャー（args は rows_in などの計測値）"""
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(category='aggregate', name=None):
+    """関数の実行を区間として計測するデコレーター（戻り値の行数を rows_out に記録する）"""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(label, category, {}) as current:
+                result = function(*args, **kwargs)
+                current.set(rows_out=count_rows(result))
+            return result
+        return wrapper
+    return decorate
+
+
+# ---------- 出力 ----------
+def events():
+    """記録済みの区間（Chromeトレースのイベント）"""
+    return list(_events)
+
+
+def write_trace(path, trace_events=None):
+    """Chromeトレース形式のJSONを書き出す"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    trace_events = events() if trace_events is None else trace_events
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': Path(sys.argv[0]).name or 'python'}}]
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [event for event in json.load(f)['traceEvents'] if event.get('ph') == 'X']
+
+
+def self_times(trace_events):
+    """区間ごとの自己時間（直接の内側の区間の時間を除いた時間、マイクロ秒）"""
+    self_us = [event['dur'] for event in trace_events]
+    order = sorted(range(len(trace_events)), key=lambda i: (
+        trace_events[i]['pid'], trace_events[i]['tid'], trace_events[i]['ts'], -trace_events[i]['dur']
+    ))
+    stack = []
+    for i in order:
+        event = trace_events[i]
+        while stack and (
+            (trace_events[stack[-1]]['pid'], trace_events[stack[-1]]['tid']) != (event['pid'], event['tid'])
+            or trace_events[stack[-1]]['ts'] + trace_events[stack[-1]]['dur'] <= event['ts']
+        ):
+            stack.pop()
+        if stack:
+            self_us[stack[-1]] -= event['dur']
+        stack.append(i)
+    return self_us
+
+
+def summarize(trace_events=None):
+    """区間名ごとの呼び出し回数・合計時間・自己時間・入出力行数・読み書きバイト数・ピークメモリ"""
+    trace_events = events() if trace_events is None else trace_events
+    columns = ['category', 'name', 'calls', 'total_ms', 'self_ms', 'max_ms', *METRICS, 'peak_rss_mb']
+    if not trace_events:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame({
+        'category': [event['cat'] for event in trace_events],
+        'name': [event['name'] for event in trace_events],
+        'calls': 1,
+        'total_ms': [event['dur'] / 1000 for event in trace_events],
+        'self_ms': [duration / 1000 for duration in self_times(trace_events)],
+        **{metric: [event['args'].get(metric) for event in trace_events] for metric in METRICS},
+        'peak_rss_mb': [event['args'].get('peak_rss_mb') for event in trace_events],
+    })
+    df[list(METRICS) + ['peak_rss_mb']] = df[list(METRICS) + ['peak_rss_mb']].astype('float64')
+    df['max_ms'] = df['total_ms']
+    summary = df.groupby(['category', 'name'], as_index=False, sort=False).agg(
+        calls=('calls', 'sum'), total_ms=('total_ms', 'sum'), self_ms=('self_ms', 'sum'), max_ms=('max_ms', 'max'),
+        **{metric: (metric, lambda values: values.sum(min_count=1)) for metric in METRICS},
+        peak_rss_mb=('peak_rss_mb', 'max'),
+    )
+    return summary[columns].sort_values('self_ms', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def format_summary(summary):
+    lines = [f"{'区分':<10} {'区間':<40} {'回数':>6} {'合計(ms)':>11} {'自己(ms)':>11} {'入力行':>12} {'出力行':>12} "
+             f"{'読込(MB)':>10} {'書込(MB)':>10} {'ピーク(MB)':>10}"]
+    for row in summary.itertuples():
+        def number(value, scale=1, digits=0):
+            return '-' if pd.isna(value) else f'{value / scale:,.{digits}f}'
+        lines.append(
+            f'{row.category:<10} {row.name:<40} {row.calls:>6,} {row.total_ms:>11,.1f} {row.self_ms:>11,.1f} '
+            f'{number(row.rows_in):>12} {number(row.rows_out):>12} {number(row.bytes_read, 1024 ** 2, 1):>10} '
+            f'{number(row.bytes_written, 1024 ** 2, 1):>10} {number(row.peak_rss_mb):>10}'
+        )
+    return '\n'.join(lines)
+
+
+def _finish():
+    if not _events:
+        return
+    write_trace(TRACE_PATH)
+    print(f'\nトレース: {TRACE_PATH}（{len(_events):,}区間）', file=sys.stderr)
+    print(format_summary(summarize()), file=sys.stderr)
+
+
+if ENABLED and multiprocessing.parent_process() is None:
+    atexit.register(_finish)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='トレースJSONの区間別集計')
+    parser.add_argument('trace', type=Path, help=f'{TRACE_ENV} で書き出したトレースJSON')
+    parser.add_argument('--output', type=Path, default=None, help='集計表のCSV出力先')
+    args = parser.parse_args()
+
+    summary = summarize(load_trace(args.trace))
+    print(format_summary(summary))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        summary.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f'\n集計表: {args.output}')
@@ -0,0 +1,123 @@
+"""
+条件マスタによる販売価格の解決
+(product_id, customer_id) ごとに有効期間をソート済みの区間として索引化し、二分探索で価格を引く
+"""
+
+import numpy as np
+import pandas as pd
+
+from pipeline_trace import span
+
+# 日付（日単位の通し番号）を結合キーの下位ビットに収めるためのオフセットとビット幅
+_DAY_OFFSET = 1 << 22
+_DAY_BITS = 23
+
+
+def to_day_numbers(values):
+    """日付文字列・日時の配列を1970-01-01起点の日数（int64）に変換する"""
+    array = np.asarray(values)
+    if array.dtype.kind != 'M':
+        array = array.astype('datetime64[s]')
+    return array.astype('datetime64[D]').astype(np.int64)
+
+
+def day_keys(codes, days):
+    """キーのコード（int）と日数を、コード順・日付順にソートできる1つの int64 にまとめる"""
+    return (np.asarray(codes).astype(np.int64) << _DAY_BITS) | (days + _DAY_OFFSET)
+
+
+def _flatten_intervals(starts, ends, positions):
+    """重複する有効期間を、条件マスタ上で先に定義された条件を優先して互いに素な区間へ分解する"""
+    bounds = np.unique(np.concatenate([starts, ends + 1]))
+    segment_starts = bounds[:-1]
+    segment_ends = bounds[1:] - 1
+
+    # 区間 × 条件 の被覆行列から、各区間で最も先に定義された条件を選ぶ
+    covers = (starts[None, :] <= segment_starts[:, None]) & (ends[None, :] >= segment_ends[:, None])
+    ranked = np.where(covers, positions[None, :], np.iinfo(np.int64).max)
+    winners = ranked.argmin(axis=1)
+    covered = covers.any(axis=1)
+    return segment_starts[covered], segment_ends[covered], winners[covered]
+
+
+class PriceResolver:
+    """条件マスタから販売価格（税抜）を解決する
+
+    価格参照は product_id, customer_id の一致と valid_from <= pricing_date <= valid_to で行う。
+    有効期間が重複する場合は、従来の get_price() と同じく条件マスタ上で先に現れる条件を採用する。
+    """
+
+    def __init__(self, price_conditions, price_column='selling_price_ex_tax'):
+        conditions = price_conditions.reset_index(drop=True)
+
+        self.keys = pd.MultiIndex.from_frame(conditions[['product_id', 'customer_id']]).unique()
+        codes = self.keys.get_indexer(pd.MultiIndex.from_frame(conditions[['product_id', 'customer_id']]))
+        starts = to_day_numbers(conditions['valid_from'])
+        ends = to_day_numbers(conditions['valid_to'])
+        prices = conditions[price_column].to_numpy(np.float64)
+        positions = np.arange(len(conditions), dtype=np.int64)
+
+        order = np.lexsort((positions, starts, codes))
+        codes, starts, ends, prices, positions = codes[order], starts[order], ends[order], prices[order], positions[order]
+
+        # 同一キー内で有効期間が重複するキーだけを分解し直す
+        same_key = codes[1:] == codes[:-1]
+        overlapping = same_key & (starts[1:] <= ends[:-1])
+        if overlapping.any():
+            overlap_codes = np.unique(codes[1:][overlapping])
+            keep = ~np.isin(codes, overlap_codes)
+            parts = [(codes[keep], starts[keep], ends[keep], prices[keep])]
+            for code in overlap_codes:
+                rows = np.flatnonzero(codes == code)
+                seg_starts, seg_ends, winners = _flatten_intervals(starts[rows], ends[rows], positions[rows])
+                parts.append((np.full(len(seg_starts), code), seg_starts, seg_ends, prices[rows][winners]))
+            codes, starts, ends, prices = (np.concatenate(columns) for columns in zip(*parts))
+            order = np.lexsort((starts, codes))
+            codes, starts, ends, prices = codes[order], starts[order], ends[order], prices[order]
+
+        self._codes = codes
+        self._ends = ends
+        self._prices = prices
+        self._search_keys = day_keys(codes, starts)
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        """条件マスタCSVから作成"""
+        price_conditions = pd.read_csv(path, encoding='utf-8-sig', dtype={'product_id': str, 'customer_id': str})
+        return cls(price_conditions, **kwargs)
+
+    def resolve(self, product_ids, customer_ids, pricing_dates):
+        """明細の配列に対する販売価格を一括で返す（該当条件がない明細は NaN）"""
+        with span('価格参照', 'join', rows_in=len(product_ids)) as current:
+            query = pd.MultiIndex.from_arrays([np.asarray(product_ids), np.asarray(customer_ids)])
+            codes = self.keys.get_indexer(query)
+            days = to_day_numbers(pricing_dates)
+
+            positions = np.searchsorted(self._search_keys, day_keys(codes, days), side='right') - 1
+            candidates = np.clip(positions, 0, None)
+            found = (
+                (codes >= 0)
+                & (positions >= 0)
+                & (self._codes[candidates] == codes)
+                & (days <= self._ends[candidates])
+            )
+            current.set(rows_out=int(found.sum()))
+            return np.where(found, self._prices[candidates], np.nan)
+
+    def get_price(self, product_id, customer_id, pricing_date):
+        """指定された商品・顧客・日付に対する販売価格を取得"""
+        price = self.resolve([product_id], [customer_id], [pricing_date])[0]
+        return None if np.isnan(price) else float(price)
+
+    def price_order_items(self, order_items, order_headers):
+        """受注伝票_itemに customer_id と selling_price_ex_tax を付与して返す
+
+        order_headers は order_id と customer_id を持つ受注伝票_header。ヘッダーが存在しない明細の価格は NaN。
+        """
+        customers = order_headers.drop_duplicates('order_id').set_index('order_id')['customer_id']
+        priced = order_items.copy()
+        priced['customer_id'] = priced['order_id'].map(customers)
+        priced['selling_price_ex_tax'] = self.resolve(
+            priced['product_id'], priced['customer_id'].fillna(''), priced['pricing_date']
+        )
+        return priced
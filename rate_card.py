@@ -0,0 +1,183 @@
+"""
+輸送コストの料金表（レートカード）
+輸送モード（transportation_mode）× 運送会社（carrier_name）× 出荷拠点（location_id）ごとの料金で、
+出荷単位の運賃（freight）と緊急輸送費（expedite）を全出荷まとめて計算する
+
+- 料金は 基本料金（base）+ 1台あたり料金（unit）× 出荷台数、緊急輸送費は 運賃 × 緊急輸送費率（expedite）
+  各料金は下限・上限（*_min / *_max）で持ち、乱数生成器を渡すと範囲内で抽選、渡さなければ中央値で計算する
+  （下限 = 上限 とすれば確定料金の料金表になる）
+- キー列の '*' は任意の値に一致し、複数の行に一致する場合は指定したキー列の多い行を優先する
+  （同数なら transportation_mode → carrier_name → location_id の順に指定がある行を優先）
+- 料金表の参照はキーの一致パターン（最大8通り）ごとに出荷全体を一括で引くため、出荷件数に対して線形時間で動く
+- 料金表はCSVで読み書きでき、新しい料金表での再計算（python rate_card.py --rate-card <CSV>）は
+  出荷伝票を1回読むだけで行う
+"""
+
+import argparse
+import itertools
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR, load_table
+
+WILDCARD = '*'
+KEY_COLUMNS = ['transportation_mode', 'carrier_name', 'location_id']
+RATE_COLUMNS = ['base_min', 'base_max', 'unit_min', 'unit_max', 'expedite_min', 'expedite_max']
+
+# 既定の料金表: 輸送モード別の基本料金範囲（JPY）
+DEFAULT_BASE_RANGES = {
+    'road': (50000, 150000),
+    'sea': (100000, 300000),
+    'air': (200000, 500000)
+}
+# 1台あたりの追加コスト範囲
+DEFAULT_UNIT_RANGE = (20000, 30000)
+# 緊急輸送費率（通常運賃の30～50%）
+DEFAULT_EXPEDITE_RANGE = (0.30, 0.50)
+
+# キーの一致パターン（True は指定あり、False は '*'）を優先順に並べたもの
+MATCH_PATTERNS = sorted(itertools.product([True, False], repeat=len(KEY_COLUMNS)), key=lambda pattern: -sum(pattern))
+
+
+class RateCard:
+    """輸送モード × 運送会社 × 出荷拠点ごとの料金表"""
+
+    def __init__(self, rates):
+        rates = rates.reset_index(drop=True)
+        missing = [column for column in KEY_COLUMNS + RATE_COLUMNS if column not in rates.columns]
+        if missing:
+            raise ValueError(f'料金表に必要な列がありません: {", ".join(missing)}')
+        keys = rates[KEY_COLUMNS].fillna(WILDCARD).astype(str)
+        duplicated = keys.duplicated(keep=False)
+        if duplicated.any():
+            raise ValueError(f'料金表のキーが重複しています: {keys[duplicated].drop_duplicates().to_numpy().tolist()}')
+        values = rates[RATE_COLUMNS].astype(np.float64)
+        for name in ('base', 'unit', 'expedite'):
+            if (values[f'{name}_min'] > values[f'{name}_max']).any():
+                raise ValueError(f'料金表の {name}_min が {name}_max より大きい行があります')
+        self.rates = pd.concat([keys, values], axis=1)
+        self._index = pd.MultiIndex.from_frame(keys)
+
+    @classmethod
+    def from_ranges(cls, base_ranges, unit_range, expedite_range):
+        """輸送モード別の基本料金範囲と全モード共通の1台あたり料金・緊急輸送費率の範囲から作成"""
+        return cls(pd.DataFrame([
+            {
+                'transportation_mode': mode, 'carrier_name': WILDCARD, 'location_id': WILDCARD,
+                'base_min': low, 'base_max': high, 'unit_min': unit_range[0], 'unit_max': unit_range[1],
+                'expedite_min': expedite_range[0], 'expedite_max': expedite_range[1],
+            }
+            for mode, (low, high) in base_ranges.items()
+        ]))
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, encoding='utf-8-sig', dtype={column: str for column in KEY_COLUMNS}))
+
+    def to_csv(self, path):
+        self.rates.to_csv(path, index=False, encoding='utf-8-sig')
+
+    # ---------- 参照 ----------
+    def lookup(self, transportation_modes, carrier_names, location_ids):
+        """出荷ごとに適用する料金表の行位置（優先順位の最も高い行）"""
+        keys = [np.asarray(values, dtype=object) for values in (transportation_modes, carrier_names, location_ids)]
+        size = len(keys[0])
+        wildcard = np.full(size, WILDCARD, dtype=object)
+        positions = np.full(size, -1, dtype=np.int64)
+        for pattern in MATCH_PATTERNS:
+            unresolved = positions < 0
+            if not unresolved.any():
+                break
+            query = pd.MultiIndex.from_arrays([
+                values[unresolved] if specified else wildcard[unresolved] for values, specified in zip(keys, pattern)
+            ])
+            positions[unresolved] = self._index.get_indexer(query)
+        if (positions < 0).any():
+            missing = pd.DataFrame(dict(zip(KEY_COLUMNS, keys)))[positions < 0].drop_duplicates()
+            raise ValueError(f'料金表に該当する行がない出荷があります: {missing.head(5).to_numpy().tolist()}')
+        return positions
+
+    def _draw(self, name, positions, rng, integer):
+        low = self.rates[f'{name}_min'].to_numpy()[positions]
+        high = self.rates[f'{name}_max'].to_numpy()[positions]
+        if rng is None:
+            values = (low + high) / 2
+            return np.floor(values).astype(np.int64) if integer else values
+        if integer:
+            return rng.integers(low.astype(np.int64), high.astype(np.int64) + 1)
+        return rng.uniform(low, high)
+
+    def rate(self, shipments, rng=None):
+        """出荷単位の運賃・緊急輸送費（delivery_status が delayed の出荷のみ、それ以外は0）を返す
+
+        shipments は transportation_mode, carrier_name, location_id, total_quantity, delivery_status 列を持つ出荷の表。
+        乱数は 基本料金 → 1台あたり料金 → 緊急輸送費率（遅延した出荷のみ）の順に出荷全体でまとめて引く。
+        """
+        positions = self.lookup(shipments['transportation_mode'], shipments['carrier_name'], shipments['location_id'])
+        base_cost = self._draw('base', positions, rng, integer=True)
+        unit_cost = self._draw('unit', positions, rng, integer=True)
+        freight = base_cost + shipments['total_quantity'].to_numpy(np.int64) * unit_cost
+
+        delayed = (shipments['delivery_status'] == 'delayed').to_numpy()
+        expedite = np.zeros(len(freight), dtype=np.int64)
+        expedite[delayed] = (freight[delayed] * self._draw('expedite', positions[delayed], rng, integer=False)).astype(np.int64)
+        return freight, expedite
+
+
+DEFAULT_RATE_CARD = RateCard.from_ranges(DEFAULT_BASE_RANGES, DEFAULT_UNIT_RANGE, DEFAULT_EXPEDITE_RANGE)
+
+
+# ---------- 出荷伝票 ----------
+def load_shipments(bronze_dir=BRONZE_DIR, year=None):
+    """出荷伝票（header × item を shipment_id 単位に集約）を読み込む"""
+    # generate_transportation_cost は料金表を参照するため、ここで読み込む
+    from generate_transportation_cost import group_shipment_items
+
+    headers = load_table('MES', '出荷伝票_header', ['shipment_id', 'shipment_timestamp', 'location_id'], bronze_dir)
+    items = load_table('MES', '出荷伝票_item', bronze_dir=bronze_dir)
+    if year is not None:
+        headers = headers[headers['shipment_timestamp'].dt.year == year]
+    return headers.join(group_shipment_items(items), on='shipment_id', how='inner').reset_index(drop=True)
+
+
+def summarize_rating(shipments, freight, expedite, by='transportation_mode'):
+    return pd.DataFrame({
+        by: shipments[by].to_numpy(), 'shipments': 1, 'freight': freight, 'expedite': expedite,
+    }).groupby(by).sum()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='料金表による出荷伝票の輸送コスト再計算')
+    parser.add_argument('--rate-card', type=Path, default=None, help='料金表CSV（省略時は既定の料金表）')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--year', type=int, default=None, help='対象の出荷年（省略時は全期間）')
+    parser.add_argument('--by', choices=KEY_COLUMNS, default='transportation_mode', help='集計の単位')
+    parser.add_argument('--export', type=Path, default=None, help='既定の料金表をCSVに書き出す（料金表の雛形）')
+    args = parser.parse_args()
+
+    if args.export:
+        DEFAULT_RATE_CARD.to_csv(args.export)
+        print(f'既定の料金表: {args.export}')
+        raise SystemExit
+
+    start = time.perf_counter()
+    shipments = load_shipments(args.bronze_dir, args.year)
+    loaded = time.perf_counter()
+    current = summarize_rating(shipments, *DEFAULT_RATE_CARD.rate(shipments), by=args.by)
+    rate_card = RateCard.from_csv(args.rate_card) if args.rate_card else DEFAULT_RATE_CARD
+    revised = summarize_rating(shipments, *rate_card.rate(shipments), by=args.by)
+    elapsed = time.perf_counter() - loaded
+
+    print(f'輸送コスト再計算: {len(shipments):,}出荷 (読み込み {loaded - start:.2f}秒, 計算 {elapsed:.3f}秒)')
+    print('料金は範囲の中央値で計算しています（既定の料金表 → 指定の料金表）')
+    print(f"\n{args.by:<24} {'出荷数':>8} {'運賃':>28} {'緊急輸送費':>26}")
+    for key, row in revised.iterrows():
+        before = current.loc[key]
+        print(f"{key:<24} {int(row['shipments']):>8,} ¥{before['freight']:>12,.0f} → ¥{row['freight']:>12,.0f}"
+              f" ¥{before['expedite']:>10,.0f} → ¥{row['expedite']:>10,.0f}")
+    total_before = current[['freight', 'expedite']].to_numpy().sum()
+    total_after = revised[['freight', 'expedite']].to_numpy().sum()
+    print(f'\n総輸送コスト: ¥{total_before:,.0f} → ¥{total_after:,.0f} ({(total_after / total_before - 1) * 100:+.2f}%)')
@@ -0,0 +1,259 @@
+"""
+Bronze層テーブルのスキーマレジストリ
+data_definition/data_definition_bronze_<システム>.md のテーブル定義から列の型を、CSVの先頭ブロックから
+文字コード・区切り文字・日付書式を求め、テーブルごとに記録する
+
+- 文字コードはBOMがあれば utf-8-sig、なければ先頭ブロックが UTF-8 として読めるかで utf-8 / cp932 を判定する
+  （ERPのCSVはBOM付き、MESのCSVはBOMなし）
+- 定義書にない列は列名の規則（_date / _timestamp / valid_from / valid_to は日付、_id / _code / _number は文字列）と
+  先頭ブロックの値から型を決める
+- 数値列の pandas の型は値によらず定義書の型だけで決める（INTEGER は欠損を許す Int64、DECIMAL は float64）。データの更新で
+  Parquetキャッシュの列の型が変わらないようにする
+- line_number は定義書では VARCHAR だが、全システムで整数の明細番号として結合・並べ替えに使うため INTEGER として扱う
+- 判定結果は元CSVの更新日時・サイズ、定義書の更新日時とともにJSONに保存し、変わったテーブルだけを判定し直す
+"""
+
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+DEFINITION_DIR = Path(__file__).resolve().parent / 'data_definition'
+DEFINITION_PATTERN = 'data_definition_bronze_*.md'
+REGISTRY_NAME = 'schema_registry.json'
+
+# 判定に使う先頭ブロックの大きさ
+SNIFF_BYTES = 1 << 16
+
+# 定義書の型 → 正規化した型
+TYPE_ALIASES = {
+    'VARCHAR': 'VARCHAR', 'CHAR': 'VARCHAR', 'TEXT': 'VARCHAR', 'STRING': 'VARCHAR',
+    'DECIMAL': 'DECIMAL', 'NUMERIC': 'DECIMAL', 'FLOAT': 'DECIMAL', 'DOUBLE': 'DECIMAL',
+    'INTEGER': 'INTEGER', 'INT': 'INTEGER', 'BIGINT': 'INTEGER',
+    'DATE': 'DATE', 'TIMESTAMP': 'TIMESTAMP', 'DATETIME': 'TIMESTAMP',
+}
+# 正規化した型 → pandas の型
+PANDAS_DTYPES = {'INTEGER': 'Int64', 'DECIMAL': 'float64'}
+# 定義書の型より優先する列の型
+TYPE_OVERRIDES = {'line_number': 'INTEGER'}
+
+# 定義書にない列の型を決める列名の規則
+DATE_COLUMNS = {'valid_from', 'valid_to'}
+STRING_SUFFIXES = ('_id', '_code', '_number')
+
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d',
+    '%Y/%m/%d %H:%M:%S', '%Y/%m/%d', '%Y-%m', '%Y/%m',
+]
+DELIMITERS = ',\t;|'
+
+NUMBER_PATTERN = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+# 定義書の表に紛れ込むゼロ幅文字
+INVISIBLE_CHARACTERS = re.compile('[\\u200b-\\u200d\\ufeff]')
+
+
+# ---------- 定義書 ----------
+def parse_definitions(definition_dir=DEFINITION_DIR):
+    """定義書の表を {(システム名, テーブル名): {列名: 型}} にする（型は VARCHAR / DECIMAL / INTEGER / DATE / TIMESTAMP）"""
+    definitions = {}
+    for path in sorted(Path(definition_dir).glob(DEFINITION_PATTERN)):
+        system = path.stem.rsplit('_', 1)[-1]
+        columns = None
+        for line in path.read_text(encoding='utf-8').splitlines():
+            line = INVISIBLE_CHARACTERS.sub('', line).strip()
+            heading = re.match(r'#{2,}\s*(.+?)\s*$', line)
+            if heading:
+                # 見出しは「<テーブル名>テーブル」（給与テーブルは「給与テーブル」がテーブル名）
+                columns = definitions.setdefault((system, heading.group(1)), {})
+                continue
+            if columns is None or not line.startswith('|'):
+                continue
+            cells = [cell.strip() for cell in line.strip('|').split('|')]
+            if len(cells) < 2 or cells[0] in ('', 'カラム名') or set(cells[0]) <= set('-: '):
+                continue
+            data_type = TYPE_ALIASES.get(re.sub(r'\(.*\)', '', cells[1]).strip().upper())
+            if data_type:
+                columns[cells[0]] = data_type
+    return {key: columns for key, columns in definitions.items() if columns}
+
+
+def find_definition(definitions, system, table):
+    """テーブルの定義（見出しの「テーブル」を除いた名前・そのままの名前のどちらでも探す）"""
+    for name in (f'{table}テーブル', table if table.endswith('テーブル') else None):
+        if name and (system, name) in definitions:
+            return definitions[(system, name)]
+    return None
+
+
+# ---------- 判定 ----------
+def sniff_encoding(head):
+    """先頭ブロックのバイト列から文字コードを判定する"""
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # ブロック末尾で途切れた文字は無視する
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp932'
+
+
+def sniff_delimiter(header_line):
+    try:
+        return csv.Sniffer().sniff(header_line, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def sniff_date_format(values):
+    """最初の空でない値に一致する日付書式（一致しなければ None）"""
+    for value in values:
+        if value:
+            for date_format in DATE_FORMATS:
+                try:
+                    datetime.strptime(value, date_format)
+                    return date_format
+                except ValueError:
+                    continue
+            return None
+    return None
+
+
+def guess_type(column, values):
+    """定義書にない列の型を列名と先頭ブロックの値から決める"""
+    if column in DATE_COLUMNS or column.endswith(('_date', '_timestamp')):
+        return 'DATE'
+    if column.endswith(STRING_SUFFIXES):
+        return 'VARCHAR'
+    values = [value for value in values if value]
+    if values and all(NUMBER_PATTERN.fullmatch(value) for value in values):
+        return 'DECIMAL'
+    return 'VARCHAR'
+
+
+class TableSchema:
+    """1テーブルの読み込み方（文字コード・区切り文字・列ごとの型と日付書式）"""
+
+    def __init__(self, encoding, delimiter, columns, defined=False):
+        self.encoding = encoding
+        self.delimiter = delimiter
+        # [(列名, 型, 日付書式)]
+        self.columns = [tuple(column) for column in columns]
+        # 定義書にテーブルの定義があるか
+        self.defined = defined
+
+    @classmethod
+    def sniff(cls, path, definition=None):
+        """CSVの先頭ブロックと定義書の列定義からスキーマを作る"""
+        with open(path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+        encoding = sniff_encoding(head)
+        text = head.decode(encoding, errors='ignore')
+        lines = text.splitlines()
+        if len(head) == SNIFF_BYTES and len(lines) > 1:
+            lines = lines[:-1]
+        delimiter = sniff_delimiter(lines[0] if lines else '')
+        rows = list(csv.reader(io.StringIO('\n'.join(lines)), delimiter=delimiter))
+        header, samples = (rows[0], rows[1:]) if rows else ([], [])
+
+        columns = []
+        for i, column in enumerate(header):
+            values = [row[i] for row in samples if i < len(row)]
+            data_type = TYPE_OVERRIDES.get(column) or (definition or {}).get(column) or guess_type(column, values)
+            date_format = sniff_date_format(values) if data_type in ('DATE', 'TIMESTAMP') else None
+            columns.append((column, data_type, date_format))
+        return cls(encoding, delimiter, columns, definition is not None)
+
+    def dtypes(self):
+        """pandas.read_csv に渡す列ごとの型（INTEGER は欠損を許す Int64、日付は文字列で読み、読み込み後に変換する）"""
+        return {column: PANDAS_DTYPES.get(data_type, str) for column, data_type, _ in self.columns}
+
+    def to_dict(self):
+        return {
+            'encoding': self.encoding, 'delimiter': self.delimiter,
+            'columns': [list(column) for column in self.columns], 'defined': self.defined,
+        }
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry['encoding'], entry['delimiter'], entry['columns'], entry['defined'])
+
+
+# ---------- レジストリ ----------
+class SchemaRegistry:
+    """Bronzeディレクトリ配下のテーブルのスキーマ（path のJSONに保存）"""
+
+    def __init__(self, bronze_dir, path, definition_dir=DEFINITION_DIR):
+        self.bronze_dir = Path(bronze_dir)
+        self.path = Path(path)
+        self.definition_dir = Path(definition_dir)
+        self._entries = None
+        self._definitions = None
+
+    def _definitions_signature(self):
+        return sorted(
+            [path.name, path.stat().st_mtime_ns] for path in self.definition_dir.glob(DEFINITION_PATTERN)
+        )
+
+    @property
+    def definitions(self):
+        if self._definitions is None:
+            self._definitions = parse_definitions(self.definition_dir)
+        return self._definitions
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            saved = {}
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            # 定義書が変わっていれば全テーブルを判定し直す
+            if saved.get('definitions') != self._definitions_signature():
+                saved = {'definitions': self._definitions_signature(), 'tables': {}}
+            self._entries = saved
+        return self._entries
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, system, table):
+        """テーブルのスキーマ（元CSVが変わっていれば判定し直して保存する）"""
+        source = self.bronze_dir / system / f'{table}.csv'
+        stat = source.stat()
+        key = f'{system}/{table}'
+        entry = self.entries['tables'].get(key)
+        if entry is None or entry['source_mtime_ns'] != stat.st_mtime_ns or entry['source_size'] != stat.st_size:
+            schema = TableSchema.sniff(source, find_definition(self.definitions, system, table))
+            entry = dict(schema.to_dict(), source_mtime_ns=stat.st_mtime_ns, source_size=stat.st_size)
+            self.entries['tables'][key] = entry
+            self._save()
+        return TableSchema.from_dict(entry)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from bronze_loader import BRONZE_DIR, get_cache, list_tables
+
+    parser = argparse.ArgumentParser(description='Bronze層テーブルのスキーマ（文字コード・区切り文字・列の型）の一覧')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = get_cache(args.bronze_dir).registry
+    schemas = {(system, table): registry.get(system, table) for system, table in list_tables(args.bronze_dir)}
+    print(f'スキーマ判定: {len(schemas)}テーブル ({time.perf_counter() - start:.2f}秒) → {registry.path}')
+    print(f"{'テーブル':<28} {'文字コード':<10} {'区切り':<6} {'列数':>4} {'定義書にない列'}")
+    for (system, table), schema in schemas.items():
+        undefined = [column for column, _, _ in schema.columns if column not in (find_definition(registry.definitions, system, table) or {})]
+        print(f'{system + "/" + table:<28} {schema.encoding:<10} {schema.delimiter!r:<6} {len(schema.columns):>4} {", ".join(undefined) or "-"}')
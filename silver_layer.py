@@ -0,0 +1,294 @@
+"""
+Silver層（結合済みの明細ファクト）
+Bronze層の伝票を明細単位で結合したファクトを1回だけ作って保存し、Gold層KPIや分析は結合済みのファクトを読む
+
+    python silver_layer.py --bronze-dir data/Generated/SF10/Bronze    # 古くなったファクトだけを作り直す
+
+- 受注明細: 受注伝票_item × 受注伝票_header × 条件マスタ（販売価格・売上）× 品目マスタ（EV・先進安全装置フラグ）
+- 出荷明細: 出荷伝票_item × 出荷伝票_header × 受注明細（受注日時・納期）× 輸送コスト（運賃・緊急輸送費）
+  輸送コストは出荷単位の金額を出荷数量の比で明細に按分する（整数円。端数は出荷の先頭明細に寄せ、出荷ごとの合計は一致する）
+- 調達明細: 調達伝票_item × 調達伝票_header（伝票IDが重複するヘッダーは先頭を採用）
+- 各ファクトは計上月（year_month。出荷明細は受注の計上月）ごとのParquetに分割し、全パーティションで同じ型で保存する
+  読み込み時に年月を指定すると、該当するパーティションのファイルだけを読む
+- マニフェストに元テーブルのハッシュを記録し、元テーブルが変わったファクトだけを読み込み時に作り直す
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from bronze_loader import BRONZE_DIR, get_cache
+from calendar_dimension import to_year_month
+from pipeline_trace import span
+from price_resolver import PriceResolver
+
+SILVER_DIR = Path(__file__).resolve().parent / 'data' / 'Silver'
+MANIFEST_NAME = '_manifest.json'
+SCHEMA_NAME = '_schema.parquet'
+
+# ファクトの作り方を変えたら上げる（既存のファクトを作り直す）
+SILVER_VERSION = 1
+
+PARTITION_COLUMN = 'year_month'
+
+# ファクト名 → 作成メソッド名
+SILVER_FACTS = {
+    '受注明細': '_build_order_lines',
+    '出荷明細': '_build_shipment_lines',
+    '調達明細': '_build_procurement_lines',
+}
+
+# ファクト名 → 元テーブル（出荷明細は受注明細も元にする）
+FACT_SOURCES = {
+    '受注明細': [('ERP', '受注伝票_header'), ('ERP', '受注伝票_item'), ('ERP', '条件マスタ'), ('ERP', '品目マスタ')],
+    '出荷明細': [('MES', '出荷伝票_header'), ('MES', '出荷伝票_item'), ('TMS', '輸送コスト')],
+    '調達明細': [('P2P', '調達伝票_header'), ('P2P', '調達伝票_item')],
+}
+FACT_UPSTREAM = {'出荷明細': '受注明細'}
+
+# 輸送コストの費目 → 出荷明細の列
+COST_COLUMNS = {'freight': 'freight_cost', 'expedite': 'expedite_cost'}
+
+
+def allocate(amounts, weights, groups):
+    """グループごとの金額（各行にグループの金額を持つ配列）を weights の比で行に按分する
+
+    按分額は整数に切り捨て、端数はグループの先頭行に寄せる（グループ内の按分額の合計は金額と一致する）。
+    weights の合計が0のグループは先頭行に全額を寄せる。
+    """
+    amounts = np.asarray(amounts, dtype=np.int64)
+    weights = pd.Series(np.asarray(weights, dtype=np.float64))
+    total_weights = weights.groupby(groups).transform('sum').to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(total_weights > 0, np.floor(amounts * weights.to_numpy() / total_weights), 0).astype(np.int64)
+    remainders = amounts - pd.Series(shares).groupby(groups).transform('sum').to_numpy()
+    first = ~pd.Series(groups).duplicated().to_numpy()
+    shares[first] += remainders[first]
+    return shares
+
+
+class SilverLayer:
+    """Bronze層から作る明細ファクトの保存・読み込み（元テーブルが変わったファクトだけを作り直す）"""
+
+    def __init__(self, bronze_dir=BRONZE_DIR, silver_dir=None):
+        self.bronze_dir = Path(bronze_dir)
+        self.bronze = get_cache(bronze_dir)
+        if silver_dir is None:
+            silver_dir = SILVER_DIR if self.bronze_dir == BRONZE_DIR else self.bronze_dir.parent / 'Silver'
+        self.silver_dir = Path(silver_dir)
+        self.manifest_path = self.silver_dir / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_manifest(self):
+        self.silver_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ---------- パス ----------
+    def fact_dir(self, fact):
+        return self.silver_dir / fact
+
+    def partition_path(self, fact, year_month):
+        return self.fact_dir(fact) / f'{year_month}.parquet'
+
+    # ---------- 鮮度判定 ----------
+    def sources(self, fact):
+        """ファクトの元テーブル（上流のファクトの元テーブルを含む）"""
+        upstream = FACT_UPSTREAM.get(fact)
+        return FACT_SOURCES[fact] + (self.sources(upstream) if upstream else [])
+
+    def source_hashes(self, fact):
+        """元テーブルのハッシュ（Bronze層のキャッシュのマニフェストから引く）"""
+        hashes = {}
+        for system, table in self.sources(fact):
+            if not self.bronze.is_fresh(system, table):
+                self.bronze.build(system, table)
+            hashes[f'{system}/{table}'] = self.bronze.manifest[f'{system}/{table}']['source_sha256']
+        return hashes
+
+    def is_fresh(self, fact):
+        entry = self.manifest.get(fact)
+        if entry is None or entry['version'] != SILVER_VERSION or not (self.fact_dir(fact) / SCHEMA_NAME).exists():
+            return False
+        if any(not self.partition_path(fact, year_month).exists() for year_month in entry['partitions']):
+            return False
+        return entry['sources'] == self.source_hashes(fact)
+
+    # ---------- 作成 ----------
+    def build(self, fact):
+        """ファクトを作ってパーティションごとに保存し、マニフェストを更新する"""
+        if fact not in SILVER_FACTS:
+            raise ValueError(f'未定義のファクトです: {fact}（{", ".join(SILVER_FACTS)}）')
+        hashes = self.source_hashes(fact)
+        df = getattr(self, SILVER_FACTS[fact])()
+        partitions = self._write_partitions(fact, df)
+        self.manifest[fact] = {
+            'version': SILVER_VERSION,
+            'sources': hashes,
+            'rows': len(df),
+            'partitions': partitions,
+        }
+        self._save_manifest()
+        return df
+
+    def _write_partitions(self, fact, df):
+        """計上月ごとのParquetを一時ディレクトリに書いてから入れ替え、年月 → 行数を返す"""
+        fact_dir = self.fact_dir(fact)
+        tmp_dir = fact_dir.with_name(f'{fact_dir.name}.tmp')
+        old_dir = fact_dir.with_name(f'{fact_dir.name}.old')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        # 全パーティションで同じ型にする（一部の月で欠損値だけの列があっても型が変わらないように）
+        schema = pa.Schema.from_pandas(df, preserve_index=False).remove_metadata()
+        pq.write_table(schema.empty_table(), tmp_dir / SCHEMA_NAME)
+        partitions = {}
+        with span(f'Silver書き出し {fact}', 'write', rows_in=len(df)) as current:
+            for year_month, part in df.groupby(PARTITION_COLUMN, sort=True):
+                table = pa.Table.from_pandas(part, schema=schema, preserve_index=False).replace_schema_metadata(None)
+                pq.write_table(table, tmp_dir / f'{year_month}.parquet')
+                partitions[str(year_month)] = len(part)
+            current.set(bytes_written=sum(path.stat().st_size for path in tmp_dir.iterdir()))
+
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if fact_dir.exists():
+            os.replace(fact_dir, old_dir)
+        os.replace(tmp_dir, fact_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return partitions
+
+    def refresh(self, force=False):
+        """古くなったファクトだけを作り直し、作り直したファクト名の一覧を返す"""
+        rebuilt = []
+        for fact in SILVER_FACTS:
+            if force or not self.is_fresh(fact):
+                self.build(fact)
+                rebuilt.append(fact)
+        return rebuilt
+
+    # ---------- 読み込み ----------
+    def load_arrow(self, fact, months=None, columns=None):
+        """ファクトをArrow Tableとして読み込む（months を指定すると該当する年月のパーティションだけ）"""
+        if not self.is_fresh(fact):
+            self.build(fact)
+        months = None if months is None else set(months)
+        paths = [
+            self.partition_path(fact, year_month) for year_month in sorted(self.manifest[fact]['partitions'])
+            if months is None or year_month in months
+        ]
+        with span(f'Silver読み込み {fact}', 'load', bytes_read=sum(path.stat().st_size for path in paths)) as current:
+            if paths:
+                arrow = pa.concat_tables([pq.read_table(path, columns=columns) for path in paths])
+            else:
+                arrow = pq.read_table(self.fact_dir(fact) / SCHEMA_NAME, columns=columns)
+            current.set(rows_out=arrow.num_rows)
+        return arrow
+
+    def load(self, fact, months=None, columns=None):
+        """ファクトをDataFrameとして読み込む"""
+        return self.load_arrow(fact, months, columns).to_pandas()
+
+    # ---------- ファクト ----------
+    def _build_order_lines(self):
+        """受注明細 × 受注ヘッダー × 条件マスタ × 品目マスタ"""
+        items = self.bronze.load('ERP', '受注伝票_item')
+        headers = self.bronze.load('ERP', '受注伝票_header').drop_duplicates('order_id')
+        headers = headers[['order_id', 'order_timestamp', 'location_id', 'customer_id']]
+        headers = headers.assign(year_month=to_year_month(headers['order_timestamp']))
+        lines = items.merge(headers, on='order_id', how='inner')
+
+        price_resolver = PriceResolver(self.bronze.load('ERP', '条件マスタ'))
+        lines['selling_price_ex_tax'] = price_resolver.resolve(lines['product_id'], lines['customer_id'], lines['pricing_date'])
+        lines['revenue'] = lines['quantity'] * np.nan_to_num(lines['selling_price_ex_tax'].to_numpy())
+        products = self.bronze.load('ERP', '品目マスタ').set_index('product_id').reindex(lines['product_id'])
+        lines['is_ev'] = (products['item_hierarchy'] == 'EV').to_numpy(bool)
+        lines['is_safety_equipped'] = (products['detail_category'] == 'safety_equipped').to_numpy(bool)
+        return lines
+
+    def _build_shipment_lines(self):
+        """出荷明細 × 出荷ヘッダー × 受注明細 × 輸送コスト（出荷数量の比で按分）"""
+        items = self.bronze.load('MES', '出荷伝票_item')
+        headers = self.bronze.load('MES', '出荷伝票_header').drop_duplicates('shipment_id')
+        lines = items.merge(
+            headers[['shipment_id', 'shipment_timestamp', 'location_id', 'customer_id']], on='shipment_id', how='left'
+        )
+
+        keys = ['order_id', 'line_number', 'product_id']
+        orders = self.load('受注明細', columns=keys + ['order_timestamp', 'promised_delivery_date'])
+        lines = lines.merge(orders.drop_duplicates(keys), on=keys, how='left')
+        lines['year_month'] = to_year_month(lines['order_timestamp'])
+
+        costs = self.bronze.load('TMS', '輸送コスト', columns=['shipment_id', 'cost_type', 'cost_amount', 'billing_date'])
+        unknown = sorted(set(costs['cost_type'].dropna()) - set(COST_COLUMNS))
+        if unknown:
+            raise ValueError(f'輸送コストに未対応の費目があります: {", ".join(unknown)}')
+        amounts = costs.pivot_table(
+            index='shipment_id', columns='cost_type', values='cost_amount', aggfunc='sum', fill_value=0
+        ).reindex(columns=list(COST_COLUMNS), fill_value=0)
+        shipment_ids = lines['shipment_id']
+        for cost_type, column in COST_COLUMNS.items():
+            totals = shipment_ids.map(amounts[cost_type]).fillna(0).to_numpy(np.int64)
+            lines[column] = allocate(totals, lines['quantity'].to_numpy(), shipment_ids.to_numpy())
+        # 費目で請求日が異なる場合は遅い方（輸送コストのない出荷は欠損値）
+        billing_dates = costs.groupby('shipment_id')['billing_date'].max()
+        lines['billing_date'] = shipment_ids.map(billing_dates)
+        billed = shipment_ids.isin(billing_dates.index)
+        lines['billing_year_month'] = to_year_month(lines['billing_date']).where(billed)
+        return lines
+
+    def _build_procurement_lines(self):
+        """調達明細 × 調達ヘッダー"""
+        items = self.bronze.load('P2P', '調達伝票_item')
+        # 伝票IDが重複するヘッダーは先頭を採用（明細の二重計上を防ぐ）
+        headers = self.bronze.load('P2P', '調達伝票_header').drop_duplicates('purchase_order_id')
+        headers = headers[['purchase_order_id', 'order_date', 'expected_delivery_date', 'supplier_id', 'supplier_name', 'location_id']]
+        headers = headers.assign(year_month=to_year_month(headers['order_date']))
+        lines = items.merge(headers, on='purchase_order_id', how='inner')
+        lines['cost'] = lines['line_subtotal_ex_tax'].astype(np.float64)
+        return lines
+
+
+_default_silver = None
+
+
+def get_silver(bronze_dir=BRONZE_DIR):
+    """既定のBronzeディレクトリに対するSilver層を返す"""
+    global _default_silver
+    if Path(bronze_dir) != BRONZE_DIR:
+        return SilverLayer(bronze_dir)
+    if _default_silver is None:
+        _default_silver = SilverLayer()
+    return _default_silver
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bronze層からのSilver層（結合済みの明細ファクト）の作成')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--silver-dir', type=Path, default=None, help='Silver層の出力先（既定: Bronze層と同じ階層の Silver）')
+    parser.add_argument('--force', action='store_true', help='元テーブルに変更がないファクトも作り直す')
+    args = parser.parse_args()
+
+    silver = SilverLayer(args.bronze_dir, args.silver_dir)
+    start = time.perf_counter()
+    rebuilt = silver.refresh(force=args.force)
+    print(f'Silver層: {silver.silver_dir} ({time.perf_counter() - start:.2f}秒)')
+    for fact in SILVER_FACTS:
+        entry = silver.manifest[fact]
+        status = '作成' if fact in rebuilt else '最新'
+        print(f"  {fact}: {entry['rows']:,}行, {len(entry['partitions'])}パーティション ({status})")
@@ -0,0 +1,231 @@
+"""
+在庫充足性の検証
+data/backup/scripts/validate_inventory_sufficiency.py をpandas/NumPyで書き直したもの（レポートの内容は同じ）
+
+- 受注の年月は受注ヘッダーの order_timestamp から一括で求め、受注明細と結合して (品目, 拠点, 年月) ごとに集計する
+  （受注IDの突き合わせはArrowのハッシュ検索、集計は整数キーの bincount）
+- 月次在庫履歴とは (品目, 拠点, 年月) で結合し、不足量・在庫回転日数は列演算で計算する
+- 一覧の並び順は元スクリプトと同じ（需要は受注明細での初出順、在庫回転日数は月次在庫履歴の行順）
+"""
+
+import argparse
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from bronze_loader import BRONZE_DIR, load_table
+
+REPORT_PATH = Path(__file__).resolve().parent / '在庫充足性検証レポート.md'
+
+DEMAND_KEY = ['product_id', 'location_id', 'year_month']
+
+# レポートに表示する件数
+DETAIL_LIMIT = 20
+SAMPLE_LIMIT = 10
+
+
+def calculate_monthly_demand(order_headers, order_items):
+    """(品目, 拠点, 年月) ごとの受注数量（受注ヘッダーが存在しない明細は除外、受注IDが重複する場合は後のヘッダーを採用）
+
+    受注明細からヘッダーへの対応付けはArrowのハッシュ検索で1回だけ行い、以降は整数コードで集計する。
+    集計結果の並び順は受注明細でのキーの初出順。
+    """
+    # 受注ヘッダーごとの (拠点, 年月) コード
+    location_codes, locations = pd.factorize(order_headers['location_id'], use_na_sentinel=False)
+    # 年月への変換は暦計算を伴うため、日付で一意化してから行う
+    day_codes, days = pd.factorize(order_headers['order_timestamp'].to_numpy().astype('datetime64[D]'), use_na_sentinel=False)
+    month_codes, months = pd.factorize(np.asarray(days, dtype='datetime64[D]').astype('datetime64[M]'), use_na_sentinel=False)
+    n_locations, n_months = len(locations), len(months)
+    header_keys = location_codes * n_months + month_codes[day_codes]
+
+    # 受注明細 → 受注ヘッダー（重複IDは後の行を採用するため逆順のヘッダーから引く。該当なしは -1）
+    position = pc.index_in(pa.array(order_items['order_id']), value_set=pa.array(order_headers['order_id'])[::-1])
+    item_header_keys = np.append(header_keys[::-1], -1)[pc.fill_null(position, -1).to_numpy()]
+
+    # (品目, 拠点, 年月) を1つの整数キーにまとめる
+    product_codes, products = pd.factorize(order_items['product_id'], use_na_sentinel=False)
+    keys = product_codes.astype(np.int64) * (n_locations * n_months) + item_header_keys
+    quantity = order_items['quantity'].to_numpy()
+    matched = item_header_keys >= 0
+    if not matched.all():
+        keys, quantity = keys[matched], quantity[matched]
+
+    key_codes, unique_keys = pd.factorize(keys)
+    demand = np.bincount(key_codes, weights=quantity, minlength=len(unique_keys))
+    return pd.DataFrame({
+        'product_id': np.asarray(products, dtype=object)[unique_keys // (n_locations * n_months)],
+        'location_id': np.asarray(locations, dtype=object)[unique_keys // n_months % n_locations],
+        'year_month': np.datetime_as_string(np.asarray(months, dtype='datetime64[M]')[unique_keys % n_months]),
+        'demand': demand.astype(np.int64),
+    })
+
+
+def validate_inventory_sufficiency(order_headers, order_items, inventory):
+    """受注数量と月次在庫を突き合わせ、検証結果の辞書を返す"""
+    demand = calculate_monthly_demand(order_headers, order_items)
+
+    # 在庫（同じキーの行が複数ある場合は後の行を採用）
+    inventory = inventory[DEMAND_KEY + ['inventory_quantity']].rename(columns={'inventory_quantity': 'inventory'})
+    inventory_index = inventory.drop_duplicates(DEMAND_KEY, keep='last')
+    checks = demand.merge(inventory_index, on=DEMAND_KEY, how='left')
+    checks['shortage'] = checks['demand'] - checks['inventory']
+
+    has_demand = checks['demand'] != 0
+    no_inventory = has_demand & checks['inventory'].isna()
+    insufficient = has_demand & (checks['inventory'] < checks['demand'])
+    sufficient = has_demand & (checks['inventory'] >= checks['demand'])
+
+    # 在庫回転日数 = 在庫量 / 受注量 × 30（受注のある在庫レコードのみ）
+    turnover = inventory.merge(demand, on=DEMAND_KEY, how='left', sort=False)
+    turnover = turnover[turnover['demand'] > 0].astype({'demand': np.int64}).reset_index(drop=True)
+    turnover['turnover_days'] = turnover['inventory'] / turnover['demand'] * 30
+
+    # 拠点 × 車種別の充足月数
+    checked = checks[has_demand]
+    by_product_location = pd.DataFrame({
+        'product_id': checked['product_id'],
+        'location_id': checked['location_id'],
+        'total_months': 1,
+        'sufficient': sufficient[has_demand].astype(np.int64),
+    }).groupby(['product_id', 'location_id'], sort=True).sum().reset_index()
+    by_product_location['insufficient'] = by_product_location['total_months'] - by_product_location['sufficient']
+
+    return {
+        'total_checks': len(checks),
+        'sufficient': int(sufficient.sum()),
+        'insufficient': checks[insufficient].astype({'inventory': np.int64, 'shortage': np.int64}).reset_index(drop=True),
+        'no_inventory_data': checks.loc[no_inventory, DEMAND_KEY + ['demand']].reset_index(drop=True),
+        'zero_demand': int((~has_demand).sum()),
+        'turnover': turnover,
+        'product_location_summary': by_product_location,
+    }
+
+
+def format_quantity(value):
+    """数量を表示用の文字列にする（在庫数量は DECIMAL 型のため、整数値は小数点なしで表示する）"""
+    return f'{value:.15g}'
+
+
+def write_report(results, report_path=REPORT_PATH):
+    """検証結果をMarkdownレポートとして出力"""
+    insufficient = results['insufficient']
+    no_inventory_data = results['no_inventory_data']
+    turnover = results['turnover']
+    if len(turnover):
+        avg_turnover = turnover['turnover_days'].mean()
+        min_turnover = turnover['turnover_days'].min()
+        max_turnover = turnover['turnover_days'].max()
+    else:
+        avg_turnover = min_turnover = max_turnover = 0
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 在庫充足性検証レポート\n\n")
+        f.write(f"**生成日時**: {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}\n\n")
+        f.write("---\n\n")
+
+        # Summary
+        f.write("## 1. 検証結果サマリー\n\n")
+        f.write(f"- **検証対象**: {results['total_checks']:,}件（拠点×車種×月の組み合わせ）\n")
+        f.write(f"- **在庫充足**: {results['sufficient']:,}件\n")
+        f.write(f"- **在庫不足**: {len(insufficient)}件\n")
+        f.write(f"- **在庫データなし**: {len(no_inventory_data)}件\n")
+        f.write(f"- **受注なし（需要ゼロ）**: {results['zero_demand']:,}件\n\n")
+
+        sufficiency_rate = (results['sufficient'] / results['total_checks'] * 100) if results['total_checks'] > 0 else 0
+        f.write(f"### 在庫充足率: {sufficiency_rate:.2f}%\n\n")
+
+        if len(insufficient) == 0 and len(no_inventory_data) == 0:
+            f.write("### ✅ すべての受注に対して在庫が充足しています\n\n")
+        else:
+            f.write("### ⚠️ 一部で在庫不足または在庫データ欠損があります\n\n")
+
+        f.write("---\n\n")
+
+        # Inventory shortage details
+        if len(insufficient):
+            f.write("## 2. 在庫不足の詳細\n\n")
+            f.write(f"在庫不足が発生している組み合わせ: {len(insufficient)}件\n\n")
+            f.write("| 拠点 | 車種 | 年月 | 受注量 | 在庫量 | 不足量 |\n")
+            f.write("|------|------|------|--------|--------|--------|\n")
+
+            for shortage in insufficient.head(DETAIL_LIMIT).itertuples(index=False):
+                f.write(f"| {shortage.location_id} | {shortage.product_id} | {shortage.year_month} | "
+                        f"{shortage.demand} | {format_quantity(shortage.inventory)} | {format_quantity(shortage.shortage)} |\n")
+
+            if len(insufficient) > DETAIL_LIMIT:
+                f.write(f"\n*他 {len(insufficient) - DETAIL_LIMIT}件の在庫不足があります*\n")
+
+            f.write("\n---\n\n")
+
+        # Missing inventory data
+        if len(no_inventory_data):
+            f.write("## 3. 在庫データ欠損の詳細\n\n")
+            f.write(f"在庫データが存在しない組み合わせ: {len(no_inventory_data)}件\n\n")
+            f.write("| 拠点 | 車種 | 年月 | 受注量 |\n")
+            f.write("|------|------|------|--------|\n")
+
+            for missing in no_inventory_data.head(DETAIL_LIMIT).itertuples(index=False):
+                f.write(f"| {missing.location_id} | {missing.product_id} | {missing.year_month} | {missing.demand} |\n")
+
+            if len(no_inventory_data) > DETAIL_LIMIT:
+                f.write(f"\n*他 {len(no_inventory_data) - DETAIL_LIMIT}件の在庫データ欠損があります*\n")
+
+            f.write("\n---\n\n")
+
+        # Inventory turnover statistics
+        f.write("## 4. 在庫回転日数の分析\n\n")
+        f.write(f"- **平均在庫回転日数**: {avg_turnover:.1f}日\n")
+        f.write(f"- **最小在庫回転日数**: {min_turnover:.1f}日\n")
+        f.write(f"- **最大在庫回転日数**: {max_turnover:.1f}日\n")
+        f.write(f"- **目標範囲**: 35～50日\n\n")
+
+        # Sample of turnover statistics
+        f.write(f"### 在庫回転日数サンプル（{SAMPLE_LIMIT}件）\n\n")
+        f.write("| 拠点 | 車種 | 年月 | 在庫量 | 受注量 | 回転日数 |\n")
+        f.write("|------|------|------|--------|--------|----------|\n")
+
+        for stat in turnover.head(SAMPLE_LIMIT).itertuples(index=False):
+            f.write(f"| {stat.location_id} | {stat.product_id} | {stat.year_month} | "
+                    f"{format_quantity(stat.inventory)} | {stat.demand} | {stat.turnover_days:.1f}日 |\n")
+
+        f.write("\n---\n\n")
+
+        # Detailed validation by product and location
+        f.write("## 5. 拠点×車種別の検証結果\n\n")
+        f.write("| 拠点 | 車種 | 総月数 | 充足月数 | 不足月数 | 充足率 |\n")
+        f.write("|------|------|--------|----------|----------|--------|\n")
+
+        for summary in results['product_location_summary'].itertuples(index=False):
+            sufficiency_rate = (summary.sufficient / summary.total_months * 100) if summary.total_months > 0 else 0
+            status = "✅" if summary.insufficient == 0 else "⚠️"
+            f.write(f"| {summary.location_id} | {summary.product_id} | {summary.total_months} | "
+                    f"{summary.sufficient} | {summary.insufficient} | {sufficiency_rate:.1f}% {status} |\n")
+
+        f.write("\n---\n\n")
+        f.write("*このレポートは自動生成されました*\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在庫充足性の検証')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--report', type=Path, default=REPORT_PATH, help='出力するレポートのパス')
+    args = parser.parse_args()
+
+    print('Loading data...')
+    order_headers = load_table('ERP', '受注伝票_header', columns=['order_id', 'order_timestamp', 'location_id'], bronze_dir=args.bronze_dir)
+    order_items = load_table('ERP', '受注伝票_item', columns=['order_id', 'product_id', 'quantity'], bronze_dir=args.bronze_dir)
+    inventory = load_table(
+        'WMS', '月次在庫履歴', columns=['product_id', 'location_id', 'year_month', 'inventory_quantity'], bronze_dir=args.bronze_dir
+    )
+
+    print('Validating inventory sufficiency...')
+    start = time.perf_counter()
+    results = validate_inventory_sufficiency(order_headers, order_items, inventory)
+    write_report(results, args.report)
+    print(f'Report generated: {args.report} ({time.perf_counter() - start:.2f}秒)')
+    print('Validation complete!')
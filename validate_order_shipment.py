@@ -0,0 +1,481 @@
+"""
+受注伝票と出荷伝票の整合性検証（ストリーミング版）
+data/backup/scripts/validate_order_shipment.py と同じ検証を行い、受注出荷整合性レポート.md を出力する
+
+- 各CSVをチャンク単位で読み込み、キーでソートしたランを一時Parquetに書き出す（外部ソート）
+- ソート済みのランを受注ID順にマージしながら、受注ヘッダー・受注明細・出荷明細を突き合わせる（マージ結合）
+- 出荷日時の確認は、出荷明細を出荷IDでソートして出荷ヘッダーとマージ結合したあと、受注ID順に並べ直して突き合わせる
+- 同じキーの行は必ず同じバッチに入るため、明細単位（受注ID, 明細番号, 品目ID）・受注 × 車種単位の集計はバッチ内で完結する
+- メモリ使用量はチャンク行数で決まり、ファイルサイズには依存しない
+  （レポートに表示する不一致の詳細は、元ファイルでの出現順に先頭から上限件数だけ保持する）
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from bronze_loader import BRONZE_DIR
+
+REPORT_PATH = Path(__file__).resolve().parent / '受注出荷整合性レポート.md'
+
+# 1チャンク（ソート済みラン1本、マージ時の1バッチ）あたりの行数
+CHUNK_ROWS = 500_000
+
+# レポートに表示する詳細の最大件数
+DETAIL_LIMIT = 10
+EXAMPLE_LIMIT = 5
+
+LINE_KEY = ['order_id', 'line_number', 'product_id']
+
+
+# ---------- 外部ソート ----------
+def read_chunks(path, columns, chunk_rows):
+    """CSVを文字列のままチャンク単位で読み込む（_row に元ファイルでの行番号を付与）"""
+    reader = pd.read_csv(
+        path, encoding='utf-8-sig', dtype=str, keep_default_na=False, usecols=columns, chunksize=chunk_rows
+    )
+    for chunk in reader:
+        yield chunk[columns].assign(_row=chunk.index.to_numpy(np.int64))
+
+
+def rechunk(frames, chunk_rows):
+    """小さいDataFrameをまとめて chunk_rows 行程度のチャンクにする"""
+    pending, rows = [], 0
+    for df in frames:
+        pending.append(df)
+        rows += len(df)
+        if rows >= chunk_rows:
+            yield pd.concat(pending, ignore_index=True)
+            pending, rows = [], 0
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+
+class SortedRuns:
+    """key（と元の行番号）でソートしたランの集合"""
+
+    def __init__(self, chunks, key, run_dir, name, columns):
+        self.key = key
+        self.paths = []
+        self.columns = columns
+        for number, chunk in enumerate(chunks):
+            path = Path(run_dir) / f'{name}-{number:05d}.parquet'
+            chunk.sort_values([key, '_row'], kind='stable').to_parquet(path, index=False)
+            self.paths.append(path)
+
+    def empty(self):
+        if not self.paths:
+            return pd.DataFrame(columns=self.columns)
+        return pq.read_schema(self.paths[0]).empty_table().to_pandas()
+
+    def batches(self, batch_rows):
+        """ランをマージし、key 昇順のバッチを返す（同じキーの行は同じバッチに入る）
+
+        各ランからは batch_rows をラン数で割った行数ずつ読むため、ラン数が増えてもメモリ使用量は変わらない。
+        """
+        run_rows = max(batch_rows // max(len(self.paths), 1), 1)
+        streams = [iter_parquet(path, run_rows) for path in self.paths]
+        for parts in merge_streams(streams, self.key, [self.empty()] * len(streams)):
+            yield pd.concat(parts, ignore_index=True).sort_values([self.key, '_row'], kind='stable', ignore_index=True)
+
+
+def iter_parquet(path, batch_rows):
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+        yield batch.to_pandas()
+
+
+def merge_streams(streams, key, empties):
+    """key 昇順のDataFrameストリームを突き合わせ、同じキー範囲の部分をストリームごとにまとめて返す
+
+    各ストリームのバッファ末尾のキーの最小値を境界とし、境界より小さいキーの行を全ストリームから切り出す。
+    境界のキーはまだ後続のバッチに続いている可能性があるため、そのストリームは次のバッチを読み足してから進める。
+    """
+    iterators = [iter(stream) for stream in streams]
+    buffers = list(empties)
+    exhausted = [False] * len(iterators)
+
+    def refill(i):
+        while not exhausted[i]:
+            try:
+                chunk = next(iterators[i])
+            except StopIteration:
+                exhausted[i] = True
+                return
+            if len(chunk):
+                buffers[i] = pd.concat([buffers[i], chunk], ignore_index=True) if len(buffers[i]) else chunk
+                return
+
+    for i in range(len(iterators)):
+        refill(i)
+
+    while True:
+        active = [i for i in range(len(iterators)) if not exhausted[i]]
+        if not active:
+            if any(len(buffer) for buffer in buffers):
+                yield buffers
+            return
+
+        bound = min(buffers[i][key].iloc[-1] for i in active)
+        parts = []
+        for i, buffer in enumerate(buffers):
+            position = int(np.searchsorted(buffer[key].to_numpy(dtype=object), bound, side='left'))
+            parts.append(buffer.iloc[:position].reset_index(drop=True))
+            buffers[i] = buffer.iloc[position:].reset_index(drop=True)
+        if any(len(part) for part in parts):
+            yield parts
+
+        for i in active:
+            if buffers[i][key].iloc[-1] == bound:
+                refill(i)
+
+
+# ---------- 上位N件の保持 ----------
+class FirstRows:
+    """元ファイルでの出現順（order_by 列）が小さい行を最大 limit 件だけ保持する"""
+
+    def __init__(self, limit, order_by):
+        self.limit = limit
+        self.order_by = order_by
+        self.count = 0
+        self.rows = None
+
+    def add(self, df):
+        self.count += len(df)
+        if not len(df):
+            return
+        head = df.sort_values(self.order_by, kind='stable').head(self.limit)
+        combined = head if self.rows is None else pd.concat([self.rows, head], ignore_index=True)
+        self.rows = combined.sort_values(self.order_by, kind='stable').head(self.limit).reset_index(drop=True)
+
+    def records(self):
+        return [] if self.rows is None else self.rows.to_dict('records')
+
+
+# ---------- 検証 ----------
+class OrderShipmentValidator:
+    """受注伝票と出荷伝票の整合性をストリーミングで検証する"""
+
+    def __init__(self, bronze_dir=BRONZE_DIR, chunk_rows=CHUNK_ROWS):
+        self.bronze_dir = Path(bronze_dir)
+        self.chunk_rows = chunk_rows
+
+    def _path(self, system, table):
+        return self.bronze_dir / system / f'{table}.csv'
+
+    def _sort(self, system, table, columns, key, run_dir, name=None):
+        return SortedRuns(
+            read_chunks(self._path(system, table), columns, self.chunk_rows), key, run_dir, name or table, columns + ['_row']
+        )
+
+    def _shipment_dates(self, shipment_headers, shipment_pairs, run_dir):
+        """出荷明細の (受注ID, 出荷ID) に出荷日時を付与し、受注ID順のランにする
+
+        出荷IDが重複するヘッダーは後の行を採用し、件数は一意の出荷IDで数える（元スクリプトの dict と同じ）。
+        """
+        self.total_shipments = 0
+
+        def joined():
+            batches = merge_streams(
+                [shipment_headers.batches(self.chunk_rows), shipment_pairs.batches(self.chunk_rows)],
+                'shipment_id',
+                [shipment_headers.empty(), shipment_pairs.empty()],
+            )
+            for headers, pairs in batches:
+                headers = headers.drop_duplicates('shipment_id', keep='last')
+                self.total_shipments += len(headers)
+                pairs = pairs.drop_duplicates(['order_id', 'shipment_id'])
+                yield pairs.merge(headers[['shipment_id', 'shipment_timestamp']], on='shipment_id', how='inner')
+
+        columns = ['shipment_id', 'order_id', '_row', 'shipment_timestamp']
+        return SortedRuns(rechunk(joined(), self.chunk_rows), 'order_id', run_dir, '出荷日時', columns)
+
+    def validate(self):
+        with tempfile.TemporaryDirectory(prefix='validate_order_shipment_') as run_dir:
+            order_headers = self._sort('ERP', '受注伝票_header', ['order_id', 'order_timestamp'], 'order_id', run_dir)
+            order_items = self._sort('ERP', '受注伝票_item', LINE_KEY + ['quantity'], 'order_id', run_dir)
+            shipment_items = self._sort('MES', '出荷伝票_item', LINE_KEY + ['quantity'], 'order_id', run_dir)
+            shipment_headers = self._sort(
+                'MES', '出荷伝票_header', ['shipment_id', 'shipment_timestamp'], 'shipment_id', run_dir
+            )
+            shipment_pairs = self._sort(
+                'MES', '出荷伝票_item', ['shipment_id', 'order_id'], 'shipment_id', run_dir, '出荷伝票_item_出荷ID順'
+            )
+            shipment_dates = self._shipment_dates(shipment_headers, shipment_pairs, run_dir)
+            return self._merge_join(order_headers, order_items, shipment_items, shipment_dates)
+
+    def _merge_join(self, order_headers, order_items, shipment_items, shipment_dates):
+        results = {
+            'total_orders': 0,
+            'total_order_items': 0,
+            'total_shipments': self.total_shipments,
+            'total_shipment_items': 0,
+            'first_order_timestamp': None,
+            'last_order_timestamp': None,
+            'orders_with_shipments': 0,
+        }
+        orders_without_shipments = FirstRows(DETAIL_LIMIT + 1, ['_order_row'])
+        quantity_matches = 0
+        quantity_mismatches = FirstRows(DETAIL_LIMIT, ['_row'])
+        product_matches = 0
+        product_validations = FirstRows(EXAMPLE_LIMIT, ['_order_row', '_row'])
+        product_mismatches = FirstRows(DETAIL_LIMIT, ['_order_row', '_row'])
+        date_valid = 0
+        invalid_dates = FirstRows(DETAIL_LIMIT, ['_order_row', '_row'])
+        date_validations = 0
+
+        streams = [order_headers, order_items, shipment_items, shipment_dates]
+        batches = merge_streams(
+            [runs.batches(self.chunk_rows) for runs in streams], 'order_id', [runs.empty() for runs in streams]
+        )
+        for headers, items, shipped, dates in batches:
+            # 受注ヘッダー（受注IDが重複する場合は出現順は最初の行、値は後の行を採用）
+            headers = headers.groupby('order_id', sort=False).agg(
+                order_timestamp=('order_timestamp', 'last'), _order_row=('_row', 'first')
+            ).reset_index()
+            results['total_orders'] += len(headers)
+            results['total_order_items'] += len(items)
+            results['total_shipment_items'] += len(shipped)
+            if len(headers):
+                first, last = headers['order_timestamp'].min(), headers['order_timestamp'].max()
+                if results['first_order_timestamp'] is None or first < results['first_order_timestamp']:
+                    results['first_order_timestamp'] = first
+                if results['last_order_timestamp'] is None or last > results['last_order_timestamp']:
+                    results['last_order_timestamp'] = last
+
+            # Check 1: 受注に対する出荷の存在
+            has_shipment = headers['order_id'].isin(shipped['order_id']).to_numpy()
+            results['orders_with_shipments'] += int(has_shipment.sum())
+            orders_without_shipments.add(headers.loc[~has_shipment, ['order_id', '_order_row']])
+
+            # Check 2: 明細単位（受注ID, 明細番号, 品目ID）の数量
+            items = items.assign(quantity=items['quantity'].astype(np.int64))
+            shipped = shipped.assign(quantity=shipped['quantity'].astype(np.int64))
+            ordered_lines = items.groupby(LINE_KEY, sort=False).agg(
+                ordered_qty=('quantity', 'sum'), _row=('_row', 'first')
+            ).reset_index()
+            shipped_lines = shipped.groupby(LINE_KEY, sort=False)['quantity'].sum().rename('shipped_qty').reset_index()
+            lines = ordered_lines.merge(shipped_lines, on=LINE_KEY, how='left').fillna({'shipped_qty': 0})
+            lines['shipped_qty'] = lines['shipped_qty'].astype(np.int64)
+            line_match = (lines['ordered_qty'] == lines['shipped_qty']).to_numpy()
+            quantity_matches += int(line_match.sum())
+            quantity_mismatches.add(lines[~line_match])
+
+            # Check 5: 受注ID × 車種の数量（受注ヘッダーが存在する受注のみ）
+            products = items.groupby(['order_id', 'product_id'], sort=False).agg(
+                ordered_qty=('quantity', 'sum'), _row=('_row', 'first')
+            ).reset_index()
+            products = products.merge(headers[['order_id', '_order_row']], on='order_id', how='inner')
+            shipped_products = shipped.groupby(['order_id', 'product_id'], sort=False)['quantity'].sum().rename('shipped_qty')
+            products = products.join(shipped_products, on=['order_id', 'product_id']).fillna({'shipped_qty': 0})
+            products['shipped_qty'] = products['shipped_qty'].astype(np.int64)
+            products['match'] = products['ordered_qty'] == products['shipped_qty']
+            product_matches += int(products['match'].sum())
+            product_validations.add(products)
+            product_mismatches.add(products[~products['match']])
+
+            # Check 3: 出荷日時 ≥ 受注日時
+            dates = dates.merge(headers[['order_id', 'order_timestamp', '_order_row']], on='order_id', how='inner')
+            valid = (
+                pd.to_datetime(dates['shipment_timestamp'], format='%Y-%m-%d %H:%M:%S')
+                >= pd.to_datetime(dates['order_timestamp'], format='%Y-%m-%d %H:%M:%S')
+            ).to_numpy()
+            date_validations += len(dates)
+            date_valid += int(valid.sum())
+            invalid_dates.add(dates[~valid])
+
+        results.update({
+            'orders_without_shipments_count': orders_without_shipments.count,
+            'orders_without_shipments': [row['order_id'] for row in orders_without_shipments.records()],
+            'quantity_matches': quantity_matches,
+            'quantity_mismatch_count': quantity_mismatches.count,
+            'quantity_mismatches': quantity_mismatches.records(),
+            'product_validation_count': product_validations.count,
+            'product_matches': product_matches,
+            'product_mismatch_count': product_mismatches.count,
+            'product_examples': product_validations.records(),
+            'product_mismatches': product_mismatches.records(),
+            'date_validation_count': date_validations,
+            'date_valid_count': date_valid,
+            'invalid_dates': invalid_dates.records(),
+        })
+        return results
+
+
+# ---------- レポート ----------
+def format_japanese_date(timestamp):
+    if not timestamp:
+        return '-'
+    date = datetime.strptime(timestamp[:10], '%Y-%m-%d')
+    return f'{date.year}年{date.month}月{date.day}日'
+
+
+def write_report(results, report_path=REPORT_PATH):
+    """検証結果をMarkdownレポートとして出力"""
+    without_count = results['orders_without_shipments_count']
+    mismatch_count = results['quantity_mismatch_count']
+    product_mismatch_count = results['product_mismatch_count']
+    valid_count = results['date_valid_count']
+    total_validations = results['date_validation_count']
+    invalid_count = total_validations - valid_count
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 受注伝票と出荷伝票の整合性検証レポート\n\n")
+        f.write(f"**生成日時**: {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}\n\n")
+        f.write("---\n\n")
+
+        # Summary
+        f.write("## 1. データ概要\n\n")
+        f.write("### 受注データ\n")
+        f.write(f"- **受注伝票数**: {results['total_orders']:,}件\n")
+        f.write(f"- **受注明細数**: {results['total_order_items']:,}件\n")
+        f.write(
+            f"- **期間**: {format_japanese_date(results['first_order_timestamp'])} 〜 "
+            f"{format_japanese_date(results['last_order_timestamp'])}\n\n"
+        )
+
+        f.write("### 出荷データ\n")
+        f.write(f"- **出荷伝票数**: {results['total_shipments']:,}件\n")
+        f.write(f"- **出荷明細数**: {results['total_shipment_items']:,}件\n\n")
+
+        f.write("---\n\n")
+
+        # Validation results
+        f.write("## 2. 整合性検証結果\n\n")
+
+        # Check 1
+        f.write("### 2.1 受注に対する出荷の存在確認\n\n")
+        coverage_rate = (results['orders_with_shipments'] / results['total_orders'] * 100) if results['total_orders'] > 0 else 0
+        f.write(f"- **出荷データが存在する受注**: {results['orders_with_shipments']:,}件 / {results['total_orders']:,}件\n")
+        f.write(f"- **カバレッジ率**: {coverage_rate:.2f}%\n")
+
+        if without_count:
+            f.write(f"- **⚠️ 出荷データが存在しない受注**: {without_count}件\n")
+            if without_count <= DETAIL_LIMIT:
+                f.write(f"  - 該当受注: {', '.join(results['orders_without_shipments'])}\n")
+        else:
+            f.write("- **✅ 結果**: すべての受注に対して出荷データが存在します\n")
+
+        f.write("\n")
+
+        # Check 2
+        f.write("### 2.2 受注数量と出荷数量の整合性\n\n")
+        total_lines = results['quantity_matches'] + mismatch_count
+        match_rate = (results['quantity_matches'] / total_lines * 100) if total_lines > 0 else 0
+        f.write(f"- **検証対象明細行数**: {total_lines:,}件\n")
+        f.write(f"- **数量が一致**: {results['quantity_matches']:,}件\n")
+        f.write(f"- **数量が不一致**: {mismatch_count}件\n")
+        f.write(f"- **一致率**: {match_rate:.2f}%\n\n")
+
+        if mismatch_count:
+            f.write(f"**⚠️ 数量不一致の詳細（最大{DETAIL_LIMIT}件表示）**:\n\n")
+            f.write("| 受注ID | 明細番号 | 品目ID | 受注数量 | 出荷数量 | 差異 |\n")
+            f.write("|--------|----------|--------|----------|----------|------|\n")
+            for mismatch in results['quantity_mismatches']:
+                diff = mismatch['shipped_qty'] - mismatch['ordered_qty']
+                f.write(f"| {mismatch['order_id']} | {mismatch['line_number']} | {mismatch['product_id']} | {mismatch['ordered_qty']} | {mismatch['shipped_qty']} | {diff:+d} |\n")
+        else:
+            f.write("**✅ 結果**: すべての明細行で受注数量と出荷数量が一致しています\n")
+
+        f.write("\n")
+
+        # Check 3: Product quantity validation
+        f.write("### 2.3 車種別受注数量と出荷数量の整合性\n\n")
+        f.write("各受注ID内で、車種（product_id）ごとの受注数量と出荷数量が一致するかを検証します。\n\n")
+
+        total_product_checks = results['product_validation_count']
+        product_match_rate = (results['product_matches'] / total_product_checks * 100) if total_product_checks > 0 else 0
+
+        f.write(f"- **検証対象**: {total_product_checks:,}件（受注ID × 車種の組み合わせ）\n")
+        f.write(f"- **数量が一致**: {results['product_matches']:,}件\n")
+        f.write(f"- **数量が不一致**: {product_mismatch_count}件\n")
+        f.write(f"- **一致率**: {product_match_rate:.2f}%\n\n")
+
+        if product_mismatch_count == 0:
+            f.write("**✅ 結果**: すべての受注で車種別の数量が一致しています\n\n")
+
+            f.write("#### 検証例\n\n")
+            f.write("| 受注ID | 車種 | 受注数量 | 出荷数量 | 状態 |\n")
+            f.write("|--------|------|----------|----------|------|\n")
+            for validation in results['product_examples']:
+                f.write(f"| {validation['order_id']} | {validation['product_id']} | {validation['ordered_qty']} | {validation['shipped_qty']} | ✅ |\n")
+            f.write("\n")
+        else:
+            f.write("**⚠️ 結果**: 一部の受注で車種別の数量に不一致があります\n\n")
+            f.write(f"#### 不一致の詳細（最大{DETAIL_LIMIT}件表示）\n\n")
+            f.write("| 受注ID | 車種 | 受注数量 | 出荷数量 | 差分 |\n")
+            f.write("|--------|------|----------|----------|------|\n")
+            for mismatch in results['product_mismatches']:
+                diff = mismatch['shipped_qty'] - mismatch['ordered_qty']
+                f.write(f"| {mismatch['order_id']} | {mismatch['product_id']} | {mismatch['ordered_qty']} | {mismatch['shipped_qty']} | {diff:+d} |\n")
+            f.write("\n")
+
+        # Check 4: Date validation
+        f.write("### 2.4 日時の整合性確認（全件）\n\n")
+        f.write("出荷日時が受注日時より後であることを確認します。\n\n")
+
+        date_validation_rate = (valid_count / total_validations * 100) if total_validations > 0 else 0
+
+        f.write(f"- **検証対象出荷数**: {total_validations:,}件\n")
+        f.write(f"- **妥当（出荷日時 ≥ 受注日時）**: {valid_count:,}件\n")
+        f.write(f"- **不正（出荷日時 < 受注日時）**: {invalid_count}件\n")
+        f.write(f"- **妥当性確認率**: {date_validation_rate:.2f}%\n\n")
+
+        if invalid_count > 0:
+            f.write(f"**⚠️ 日時が不正な出荷（最大{DETAIL_LIMIT}件表示）**:\n\n")
+            f.write("| 受注ID | 受注日時 | 出荷ID | 出荷日時 |\n")
+            f.write("|--------|----------|--------|----------|\n")
+            for validation in results['invalid_dates']:
+                f.write(f"| {validation['order_id']} | {validation['order_timestamp']} | {validation['shipment_id']} | {validation['shipment_timestamp']} |\n")
+            f.write("\n")
+        else:
+            f.write("**✅ 結果**: すべての出荷で日時の整合性が確認されました\n\n")
+
+        f.write("---\n\n")
+
+        # Conclusion
+        f.write("## 3. 検証結果サマリー\n\n")
+
+        all_checks_passed = without_count == 0 and mismatch_count == 0 and product_mismatch_count == 0 and invalid_count == 0
+
+        if all_checks_passed:
+            f.write("### ✅ すべての検証項目に合格\n\n")
+            f.write("受注伝票と出荷伝票のデータは整合性が取れており、以下の点が確認されました:\n\n")
+            f.write("1. **完全カバレッジ**: すべての受注に対して出荷データが存在\n")
+            f.write("2. **数量一致**: 受注数量と出荷数量が完全一致\n")
+            f.write("3. **車種別数量一致**: 各受注内で車種ごとの数量が完全一致\n")
+            f.write("4. **時系列整合性**: 出荷日時は受注日時より後\n\n")
+        else:
+            f.write("### ⚠️ 一部の検証項目で問題を検出\n\n")
+            f.write("以下の項目について確認が必要です:\n\n")
+            if without_count:
+                f.write(f"- 出荷データが存在しない受注: {without_count}件\n")
+            if mismatch_count:
+                f.write(f"- 数量が不一致の明細: {mismatch_count}件\n")
+            if product_mismatch_count:
+                f.write(f"- 車種別数量が不一致の受注: {product_mismatch_count}件\n")
+            if invalid_count:
+                f.write(f"- 日時の整合性が取れていない出荷: {invalid_count}件\n")
+
+        f.write("\n---\n\n")
+        f.write("*このレポートは自動生成されました*\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='受注伝票と出荷伝票の整合性検証（ストリーミング版）')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    parser.add_argument('--report', type=Path, default=REPORT_PATH, help='出力するレポートのパス')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='1チャンクあたりの行数（メモリ使用量の上限を決める）')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print('Validating (sorted chunked merge join)...')
+    results = OrderShipmentValidator(args.bronze_dir, args.chunk_rows).validate()
+    write_report(results, args.report)
+    print(f'Report generated: {args.report} ({time.perf_counter() - start:.2f}秒)')
+    print('Validation complete!')
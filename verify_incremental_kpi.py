@@ -0,0 +1,93 @@
+"""
+Gold層KPI差分更新の正当性検証
+Bronze層の一時コピーに変更を加え、差分更新の結果が全件再計算の結果と一致することを確認する
+"""
+
+import argparse
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from bronze_loader import BRONZE_DIR
+from gold_kpi import GOLD_TABLES, SORT_KEYS
+from gold_kpi_incremental import IncrementalGoldRefresh
+
+
+def read_csv(path):
+    return pd.read_csv(path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+
+
+def write_csv(df, path):
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def modify_bronze(bronze_dir):
+    """Bronze層に3種類の変更を加え、影響を受ける年月の集合を返す"""
+    affected = set()
+
+    # 1. 最終月の受注を1件複製して追加（受注伝票_header / 受注伝票_item）
+    headers = read_csv(bronze_dir / 'ERP' / '受注伝票_header.csv')
+    items = read_csv(bronze_dir / 'ERP' / '受注伝票_item.csv')
+    source = headers.iloc[-1]
+    new_header = source.copy()
+    new_header['order_id'] = 'ORD-VERIFY-000001'
+    write_csv(pd.concat([headers, new_header.to_frame().T], ignore_index=True), bronze_dir / 'ERP' / '受注伝票_header.csv')
+    new_items = items[items['order_id'] == source['order_id']].assign(order_id='ORD-VERIFY-000001')
+    write_csv(pd.concat([items, new_items], ignore_index=True), bronze_dir / 'ERP' / '受注伝票_item.csv')
+    affected.add(source['order_timestamp'][:7])
+
+    # 2. 先頭月の給与を1件変更（給与テーブル）
+    payroll = read_csv(bronze_dir / 'HR' / '給与テーブル.csv')
+    payroll.loc[0, 'overtime_pay'] = str(int(payroll.loc[0, 'overtime_pay']) + 12345)
+    write_csv(payroll, bronze_dir / 'HR' / '給与テーブル.csv')
+    affected.add(payroll.loc[0, 'payment_period'])
+
+    # 3. 中間の輸送コストを1件削除（輸送コスト）
+    costs = read_csv(bronze_dir / 'TMS' / '輸送コスト.csv')
+    removed = len(costs) // 2
+    affected.add(costs.loc[removed, 'billing_date'][:7])
+    write_csv(costs.drop(index=removed), bronze_dir / 'TMS' / '輸送コスト.csv')
+
+    return affected
+
+
+def sort_table(df):
+    keys = [key for key in SORT_KEYS if key in df.columns]
+    return df.sort_values(keys, kind='stable').reset_index(drop=True)
+
+
+def verify(bronze_dir):
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        work_bronze = work_dir / 'Bronze'
+        shutil.copytree(bronze_dir, work_bronze)
+
+        incremental = IncrementalGoldRefresh(work_bronze, work_dir / 'incremental')
+        assert incremental.refresh() is None, '初回は全件計算になるはず'
+        assert incremental.refresh() == set(), '変更がなければ再計算対象は空のはず'
+        print('初回全件計算・無変更時のスキップ: OK')
+
+        expected_months = modify_bronze(work_bronze)
+        months = incremental.refresh()
+        assert months == expected_months, f'再計算対象の年月が想定と異なります: {sorted(months)} != {sorted(expected_months)}'
+        print(f'変更検知: OK（{", ".join(sorted(months))}）')
+
+        full = IncrementalGoldRefresh(work_bronze, work_dir / 'full')
+        full.refresh(full=True)
+
+        for name in GOLD_TABLES:
+            pd.testing.assert_frame_equal(
+                sort_table(incremental.read_table(name)), sort_table(full.read_table(name)), check_dtype=False
+            )
+            print(f'  {name}: 差分更新 = 全件再計算 ✓')
+
+    print('検証完了: 差分更新の結果は全件再計算と一致しました')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gold層KPI差分更新の正当性検証')
+    parser.add_argument('--bronze-dir', type=Path, default=BRONZE_DIR)
+    args = parser.parse_args()
+    verify(args.bronze_dir)